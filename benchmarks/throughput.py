@@ -0,0 +1,362 @@
+"""
+CPU Throughput Benchmarks
+
+Measures the hot paths of the pipeline on synthetic data:
+
+- preprocessing: ProteinAtlasPreprocessor.preprocess_image images/sec for
+  single RGB files and four-file RGBY samples
+- data loading: samples/sec of ModelTrainer.load_data's train loader for the
+  legacy .npy (TensorDataset), memory-mapped shard and tar shard formats
+- training: forward/backward/optimizer step time of LightweightCNN, ResNet18
+  and the infrastructure DrugDiscoveryModel across batch sizes
+- inference: ModelInference.predict latency percentiles for single images
+  and throughput for batches
+
+Results are written as JSON and compared against a stored baseline; the run
+fails if a throughput drops (or a latency grows) by more than the tolerance.
+Baselines are only comparable on the same machine type and thread count,
+which are recorded in the results.
+
+    BENCHMARK_SAVE_BASELINE=true python -m benchmarks.throughput   # record
+    python -m benchmarks.throughput                                 # compare
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+from unittest import mock
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+import logging
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.data.sharded_dataset import ShardWriter
+from src.data.tar_shards import TarShardWriter
+from src.inference.inference import ModelInference
+from src.models.models import create_model
+from src.training.train import ModelTrainer
+from src.utils.normalization import Normalizer
+from src.utils.preprocessing import CHANNEL_COLORS, ProteinAtlasPreprocessor
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCHMARK_DIR / 'baseline.json'
+SUITES = ('preprocessing', 'data_loading', 'training', 'inference')
+
+def time_calls(fn: Callable[[], None], repeats: int = 20, warmup: int = 3, min_time: float = 0.0) -> List[float]:
+    """
+    Time repeated calls of a function.
+
+    Args:
+        fn: Function to time
+        repeats: Minimum number of timed calls
+        warmup: Untimed calls before measuring (allocator, lazy initialization)
+        min_time: Keep calling until this many seconds have been measured
+
+    Returns:
+        Duration of each timed call in seconds
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    while len(times) < repeats or sum(times) < min_time:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+def summarize(times: Sequence[float], items_per_call: int = 1) -> Dict[str, float]:
+    """
+    Latency percentiles and throughput of timed calls.
+
+    Args:
+        times: Call durations in seconds
+        items_per_call: Samples processed per call
+
+    Returns:
+        Mean and p50/p90/p99 in milliseconds and items processed per second
+    """
+    ms = np.asarray(times) * 1000.0
+    return {
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'items_per_sec': items_per_call * len(ms) / (ms.sum() / 1000.0)
+    }
+
+def _write_images(image_dir: Path, num_images: int, source_size: int, rng: np.random.Generator) -> List[str]:
+    """Write random RGB PNGs and RGBY channel PNGs; return the sample ids."""
+    image_dir.mkdir(parents=True, exist_ok=True)
+    ids = [f'sample_{i:05d}' for i in range(num_images)]
+    for image_id in ids:
+        cv2.imwrite(str(image_dir / f'{image_id}.png'),
+                    rng.integers(0, 256, (source_size, source_size, 3), dtype=np.uint8))
+        for color in CHANNEL_COLORS:
+            cv2.imwrite(str(image_dir / f'{image_id}_{color}.png'),
+                        rng.integers(0, 256, (source_size, source_size), dtype=np.uint8))
+    return ids
+
+def bench_preprocessing(work_dir: Path, image_size: int, num_images: int = 64,
+                        source_size: int = 512) -> Dict[str, Dict[str, float]]:
+    """Images/sec of preprocess_image for each channel layout and storage dtype."""
+    image_dir = work_dir / 'images'
+    ids = _write_images(image_dir, num_images, source_size, np.random.default_rng(0))
+    results = {}
+    for layout in ('rgb', 'rgby'):
+        for dtype in ('float32', 'uint8'):
+            preprocessor = ProteinAtlasPreprocessor(str(work_dir), image_size=image_size, num_workers=1,
+                                                    channel_layout=layout, storage_dtype=dtype)
+            paths = [str(image_dir / (f'{i}.png' if layout == 'rgb' else i)) for i in ids]
+            times = time_calls(lambda: [preprocessor.preprocess_image(p) for p in paths], repeats=3, warmup=1)
+            results[f'preprocess_{layout}_{dtype}'] = summarize(times, items_per_call=len(paths))
+    return results
+
+def _write_datasets(work_dir: Path, image_size: int, num_samples: int, num_classes: int) -> Dict[str, Path]:
+    """Write the same synthetic RGBY dataset in every format load_data accepts."""
+    rng = np.random.default_rng(0)
+    splits = {'train': num_samples, 'test': max(1, num_samples // 4)}
+    data = {split: (rng.integers(0, 256, (n, image_size, image_size, 4), dtype=np.uint8),
+                    rng.integers(0, 2, (n, num_classes), dtype=np.uint8))
+            for split, n in splits.items()}
+
+    legacy = work_dir / 'legacy'
+    legacy.mkdir(parents=True)
+    for split, (images, labels) in data.items():
+        np.save(legacy / f'X_{split}.npy', images.astype(np.float32) / 255.0)
+        np.save(legacy / f'y_{split}.npy', labels)
+
+    sharded = work_dir / 'sharded'
+    for split, (images, labels) in data.items():
+        with ShardWriter(sharded / split, images.shape[1:], num_classes, dtype='uint8', shard_size=256) as writer:
+            writer.write(images, labels)
+
+    tar = work_dir / 'tar'
+    for split, (images, labels) in data.items():
+        with TarShardWriter(tar / split, max_shard_bytes=16 * 1024 ** 2, num_classes=num_classes) as writer:
+            for i, (image, label) in enumerate(zip(images, labels)):
+                members = {f'{color}.png': cv2.imencode('.png', image[..., c])[1].tobytes()
+                           for c, color in enumerate(CHANNEL_COLORS)}
+                members['cls'] = ' '.join(map(str, np.flatnonzero(label))).encode()
+                writer.write(f'{split}_{i:05d}', members)
+
+    return {'tensor_dataset': legacy, 'sharded': sharded, 'tar_shards': tar}
+
+def bench_data_loading(work_dir: Path, image_size: int, num_samples: int = 256, num_classes: int = 28,
+                       batch_size: int = 32) -> Dict[str, Dict[str, float]]:
+    """Samples/sec of one pass over ModelTrainer's train loader per dataset format."""
+    results = {}
+    for name, data_dir in _write_datasets(work_dir, image_size, num_samples, num_classes).items():
+        trainer = ModelTrainer('lightweight', num_classes, batch_size=batch_size, device='cpu',
+                               input_channels=4, image_size=image_size)
+        train_loader, _ = trainer.load_data(str(data_dir))
+
+        def epoch():
+            for data, target in train_loader:
+                trainer._prepare_batch(data, target)
+
+        # Every pass includes the worker start-up an epoch pays for
+        results[f'loader_{name}'] = summarize(time_calls(epoch, repeats=3, warmup=1), items_per_call=num_samples)
+    return results
+
+def _drug_discovery_model() -> nn.Module:
+    """The autoencoder trained by infrastructure/ml/train_model.py."""
+    # The script imports its helpers relative to its own directory and
+    # creates a metrics emitter at import time; keep that emitter in memory,
+    # without leaving the path or environment changed for the caller
+    script_dir = str(BENCHMARK_DIR.parent / 'infrastructure' / 'ml')
+    with mock.patch.dict(os.environ, {'METRICS_SINK': 'memory'}), \
+            mock.patch.object(sys, 'path', [script_dir, *sys.path]):
+        from train_model import DrugDiscoveryModel
+    return DrugDiscoveryModel()
+
+def _training_models(image_size: int, num_classes: int):
+    """(name, model, batch factory, loss) per benchmarked model."""
+    for name in ('lightweight', 'resnet18'):
+        yield (name, create_model(name, num_classes, input_channels=4, pretrained=False),
+               lambda n: (torch.rand(n, 4, image_size, image_size),
+                          torch.randint(0, 2, (n, num_classes)).float()),
+               nn.BCEWithLogitsLoss())
+
+    # The autoencoder is trained to reconstruct its input
+    def reconstruction_batch(n):
+        inputs = torch.rand(n, 1024)
+        return inputs, inputs
+
+    yield 'drug_discovery', _drug_discovery_model(), reconstruction_batch, nn.MSELoss()
+
+def bench_training(image_size: int, batch_sizes: Sequence[int] = (1, 16, 64),
+                   num_classes: int = 28, min_time: float = 1.0) -> Dict[str, Dict[str, float]]:
+    """Time of a forward/backward/optimizer step per model and batch size."""
+    results = {}
+    for name, model, make_batch, loss_fn in _training_models(image_size, num_classes):
+        model.train()
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+        for batch_size in batch_sizes:
+            inputs, targets = make_batch(batch_size)
+
+            def step():
+                optimizer.zero_grad(set_to_none=True)
+                loss_fn(model(inputs), targets).backward()
+                optimizer.step()
+
+            results[f'train_step_{name}_bs{batch_size}'] = summarize(
+                time_calls(step, repeats=5, warmup=2, min_time=min_time), items_per_call=batch_size)
+    return results
+
+def bench_inference(work_dir: Path, image_size: int, batch_sizes: Sequence[int] = (1, 32),
+                    num_classes: int = 28, min_time: float = 1.0) -> Dict[str, Dict[str, float]]:
+    """Latency percentiles of ModelInference.predict on raw uint8 images, single and batched."""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    results = {}
+    for name in ('lightweight', 'resnet18'):
+        # Load through a checkpoint, like the server, so no pretrained weights are fetched
+        model_path = work_dir / f'{name}.pt'
+        torch.save({
+            'model_state_dict': create_model(name, num_classes, input_channels=4, pretrained=False).state_dict(),
+            'input_channels': 4,
+            'normalization': Normalizer(np.full(4, 0.5), np.full(4, 0.25), image_size=image_size).to_dict()
+        }, model_path)
+        engine = ModelInference(name, num_classes, model_path=str(model_path), device='cpu')
+        for batch_size in batch_sizes:
+            images = rng.integers(0, 256, (batch_size, image_size, image_size, 4), dtype=np.uint8)
+            results[f'predict_{name}_bs{batch_size}'] = summarize(
+                time_calls(lambda: engine.predict(images), repeats=20, warmup=3, min_time=min_time),
+                items_per_call=batch_size)
+    return results
+
+def run_benchmarks(suites: Sequence[str] = SUITES, image_size: int = 224,
+                   num_threads: Optional[int] = None, min_time: float = 1.0) -> Dict:
+    """
+    Run benchmark suites.
+
+    Args:
+        suites: Names of the suites to run
+        image_size: Model input size
+        num_threads: torch intra-op threads (default: torch's choice)
+        min_time: Seconds each training and inference benchmark is timed for at least
+
+    Returns:
+        Dictionary with the run's 'environment' and per-benchmark 'results'
+    """
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark suites: {sorted(unknown)}")
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    torch.manual_seed(0)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        for suite in suites:
+            logger.info(f"Running {suite} benchmarks")
+            start = time.perf_counter()
+            if suite == 'preprocessing':
+                results.update(bench_preprocessing(work_dir / suite, image_size))
+            elif suite == 'data_loading':
+                results.update(bench_data_loading(work_dir / suite, image_size))
+            elif suite == 'training':
+                results.update(bench_training(image_size, min_time=min_time))
+            else:
+                results.update(bench_inference(work_dir / suite, image_size, min_time=min_time))
+            logger.info(f"Finished {suite} benchmarks in {time.perf_counter() - start:.1f}s")
+
+    return {
+        'environment': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'opencv': cv2.__version__,
+            'cpu_count': os.cpu_count(),
+            'torch_threads': torch.get_num_threads(),
+            'image_size': image_size
+        },
+        'results': results
+    }
+
+def compare_results(current: Dict, baseline: Dict, tolerance: float = 0.15) -> List[Dict]:
+    """
+    Find benchmarks that regressed against a baseline.
+
+    A benchmark regresses if its throughput fell, or its p50 or p99 latency
+    rose, by more than the tolerance. Benchmarks missing from either run are
+    not compared.
+
+    Args:
+        current: Output of run_benchmarks
+        baseline: Stored output of an earlier run
+        tolerance: Allowed relative slowdown
+
+    Returns:
+        One entry per regressed metric with the benchmark, metric, both values
+        and the relative change
+    """
+    regressions = []
+    for name, metrics in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        for metric, higher_is_better in (('items_per_sec', True), ('p50_ms', False), ('p99_ms', False)):
+            if metric not in metrics or not reference.get(metric):
+                continue
+            change = metrics[metric] / reference[metric] - 1.0
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({'benchmark': name, 'metric': metric, 'baseline': reference[metric],
+                                    'current': metrics[metric], 'change': change})
+    return regressions
+
+def main():
+    """
+    Run the benchmarks, write the results and check them against the baseline.
+    """
+    logging.basicConfig(level=logging.INFO)
+    suites = [s for s in os.getenv('BENCHMARK_SUITES', ','.join(SUITES)).split(',') if s]
+    output_path = Path(os.getenv('BENCHMARK_OUTPUT', 'benchmark_results.json'))
+    baseline_path = Path(os.getenv('BENCHMARK_BASELINE', str(DEFAULT_BASELINE)))
+
+    report = run_benchmarks(suites,
+                            image_size=int(os.getenv('BENCHMARK_IMAGE_SIZE', '224')),
+                            num_threads=int(os.getenv('BENCHMARK_THREADS', '0')) or None,
+                            min_time=float(os.getenv('BENCHMARK_MIN_TIME', '1.0')))
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {len(report['results'])} benchmark results to {output_path}")
+
+    for name, metrics in report['results'].items():
+        logger.info(f"{name:40s} {metrics['items_per_sec']:10.1f} items/s  "
+                    f"p50 {metrics['p50_ms']:8.2f} ms  p99 {metrics['p99_ms']:8.2f} ms")
+
+    if os.getenv('BENCHMARK_SAVE_BASELINE', 'false').lower() == 'true':
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Saved baseline to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        logger.warning(f"No baseline at {baseline_path}; set BENCHMARK_SAVE_BASELINE=true to record one")
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare_results(report, baseline, tolerance=float(os.getenv('BENCHMARK_TOLERANCE', '0.15')))
+    for regression in regressions:
+        logger.error(f"Regression in {regression['benchmark']} {regression['metric']}: "
+                     f"{regression['baseline']:.2f} -> {regression['current']:.2f} "
+                     f"({regression['change']:+.1%})")
+    if regressions:
+        sys.exit(1)
+    logger.info(f"No regressions against {baseline_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Make the repository root importable (``src.*``, ``scripts.*``) when running pytest."""
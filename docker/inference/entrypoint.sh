@@ -7,6 +7,7 @@ if [ ! -z "$S3_BUCKET" ]; then
     aws s3 sync s3://$S3_BUCKET/models/ $MODEL_DIR/
 fi
 
-# Run the inference service
+# Run the batching inference server, with the Streamlit UI as its client
 echo "Starting inference service..."
-streamlit run src/inference/predict.py
+python3 -m src.inference.server &
+streamlit run src/inference/app.py
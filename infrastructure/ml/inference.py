@@ -2,17 +2,16 @@ import torch
 import torch.nn as nn
 import logging
 import time
-from datetime import datetime
 import os
-import boto3
 from utils.s3_utils import load_model_from_s3, save_inference_images
+from utils.metrics import MetricsEmitter, create_sink
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure CloudWatch metrics
-cw_client = boto3.client('cloudwatch')
+# Configure CloudWatch metrics (buffered and sent from a background thread)
+metrics = MetricsEmitter('DrugDiscovery', sink=create_sink(os.environ.get('METRICS_SINK', 'cloudwatch')))
 
 class DrugDiscoveryModel(nn.Module):
     def __init__(self):
@@ -56,23 +55,8 @@ def run_inference(model, input_data, device):
         output = model(input_data)
         
         # Log inference metrics to CloudWatch
-        cw_client.put_metric_data(
-            Namespace='DrugDiscovery',
-            MetricData=[
-                {
-                    'MetricName': 'GPUMemoryUsed',
-                    'Value': torch.cuda.memory_allocated()/1e9,
-                    'Unit': 'Gigabytes',
-                    'Timestamp': datetime.now()
-                },
-                {
-                    'MetricName': 'InferenceBatchSize',
-                    'Value': len(input_data),
-                    'Unit': 'Count',
-                    'Timestamp': datetime.now()
-                }
-            ]
-        )
+        metrics.put('GPUMemoryUsed', torch.cuda.memory_allocated()/1e9, 'Gigabytes')
+        metrics.put('InferenceBatchSize', len(input_data), 'Count')
         
         return output
 
@@ -89,22 +73,25 @@ def main():
     # In reality, this would be your actual molecule data
     test_data = torch.randn(100, 1024)
     
-    # Run inference in batches
+    # Run inference in batches, keeping only the few predictions saved as images
+    # (src/inference/batch_inference.py scores full datasets shard by shard)
     batch_size = 10
-    all_predictions = []
+    num_samples = 5
+    sample_predictions = []
     
     for i in range(0, len(test_data), batch_size):
         batch = test_data[i:i+batch_size]
         predictions = run_inference(model, batch, device)
-        all_predictions.append(predictions)
+        if len(sample_predictions) < num_samples:
+            sample_predictions.extend(predictions[:num_samples - len(sample_predictions)].cpu())
         logger.info(f"Processed batch {i//batch_size + 1}")
     
-    # Combine all predictions
-    all_predictions = torch.cat(all_predictions, dim=0)
-    
     # Save inference results
-    save_inference_images(all_predictions)
+    save_inference_images(sample_predictions, num_samples=num_samples)
     logger.info("Saved inference results to S3")
+    
+    # Send the remaining metrics
+    metrics.close()
 
 if __name__ == "__main__":
     main()
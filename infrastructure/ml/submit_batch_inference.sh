@@ -0,0 +1,24 @@
+#!/bin/bash
+#SBATCH --job-name=drug_discovery_batch_inference
+#SBATCH --output=batch_inference_%A_%a.log
+#SBATCH --error=batch_inference_%A_%a.err
+#SBATCH --nodes=1
+#SBATCH --gres=gpu:1
+#SBATCH --array=0-3       # Input shards are split round-robin across the array tasks
+#SBATCH --constraint=spot  # Request spot instances; finished shards are skipped on requeue
+#SBATCH --requeue
+#SBATCH --time=4:00:00   # Max runtime of 4 hours
+
+# Load environment
+module load cuda/11.7
+module load python/3.8
+
+# Install requirements
+pip3 install torch torchvision --index-url https://download.pytorch.org/whl/cu117
+
+# Score the sharded split; each shard's predictions land in PREDICTIONS_DIR
+export INPUT_SPLIT_DIR=${INPUT_SPLIT_DIR:-/shared/data/preprocessing/test}
+export PREDICTIONS_DIR=${PREDICTIONS_DIR:-/shared/predictions/$SLURM_ARRAY_JOB_ID}
+
+cd /shared
+python3 -m src.inference.batch_inference
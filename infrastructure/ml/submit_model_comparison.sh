@@ -0,0 +1,31 @@
+#!/bin/bash
+# Compare the candidate models as independent Slurm jobs: one array task per
+# model trains it and saves its results, then a dependent job gathers them
+# into the comparison plots and report.
+#
+# Usage: bash submit_model_comparison.sh
+
+NUM_MODELS=2  # "Lightweight CNN" and "ResNet"
+export EVALUATION_DIR=${EVALUATION_DIR:-/shared/evaluation/$(date +%Y%m%d_%H%M%S)}
+SETUP="module load python/3.8 && cd /shared"
+
+TRAIN_JOB=$(sbatch --parsable \
+    --job-name=drug_discovery_compare_train \
+    --output=compare_train_%A_%a.log \
+    --error=compare_train_%A_%a.err \
+    --nodes=1 \
+    --array=0-$((NUM_MODELS - 1)) \
+    --time=4:00:00 \
+    --export=ALL,COMPARE_STAGE=train \
+    --wrap="$SETUP && python3 -m src.evaluation.compare_models")
+
+sbatch --dependency=afterok:$TRAIN_JOB \
+    --job-name=drug_discovery_compare_report \
+    --output=compare_report_%j.log \
+    --error=compare_report_%j.err \
+    --nodes=1 \
+    --time=0:30:00 \
+    --export=ALL,COMPARE_STAGE=report \
+    --wrap="$SETUP && python3 -m src.evaluation.compare_models"
+
+echo "Submitted comparison array job $TRAIN_JOB; report will be written to $EVALUATION_DIR"
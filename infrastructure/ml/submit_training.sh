@@ -6,6 +6,8 @@
 #SBATCH --gres=gpu:1
 #SBATCH --constraint=spot  # Request spot instances
 #SBATCH --time=12:00:00   # Max runtime of 12 hours
+#SBATCH --requeue         # Requeue after a spot interruption
+#SBATCH --signal=TERM@120 # Checkpoint before the time limit
 
 # Load environment
 module load cuda/11.7
@@ -14,5 +16,11 @@ module load python/3.8
 # Install requirements
 pip3 install torch torchvision --index-url https://download.pytorch.org/whl/cu117
 
-# Run training
-python3 /shared/ml/train_model.py
+# Checkpoints live on the shared file system, keyed by model and job, so a
+# requeued job (which keeps its job id) resumes from the latest one
+export MODEL_NAME=${MODEL_NAME:-lightweight}
+export CHECKPOINT_DIR=${CHECKPOINT_DIR:-/shared/checkpoints/${MODEL_NAME}_$SLURM_JOB_ID}
+
+# Run the resumable trainer
+cd /shared
+python3 -m src.training.train
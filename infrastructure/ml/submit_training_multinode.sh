@@ -0,0 +1,33 @@
+#!/bin/bash
+#SBATCH --job-name=drug_discovery_training_ddp
+#SBATCH --output=training_ddp_%j.log
+#SBATCH --error=training_ddp_%j.err
+#SBATCH --nodes=2
+#SBATCH --ntasks-per-node=1
+#SBATCH --gres=gpu:1
+#SBATCH --constraint=spot  # Request spot instances
+#SBATCH --time=12:00:00   # Max runtime of 12 hours
+#SBATCH --requeue         # Requeue after a spot interruption
+#SBATCH --signal=TERM@120 # Checkpoint before the time limit
+
+# Load environment
+module load cuda/11.7
+module load python/3.8
+
+# Install requirements
+pip3 install torch torchvision --index-url https://download.pytorch.org/whl/cu117
+
+# Rendezvous on the first node of the allocation; every task reads its
+# rank from SLURM_PROCID/SLURM_NTASKS/SLURM_LOCALID
+export MASTER_ADDR=$(scontrol show hostnames "$SLURM_JOB_NODELIST" | head -n 1)
+export MASTER_PORT=29500
+export DISTRIBUTED=true
+
+# Checkpoints live on the shared file system, keyed by model and job, so a
+# requeued job (which keeps its job id) resumes from the latest one
+export MODEL_NAME=${MODEL_NAME:-lightweight}
+export CHECKPOINT_DIR=${CHECKPOINT_DIR:-/shared/checkpoints/${MODEL_NAME}_$SLURM_JOB_ID}
+
+# Run one data-parallel replica per task
+cd /shared
+srun python3 -m src.training.train
@@ -6,16 +6,15 @@ import numpy as np
 import os
 import logging
 import time
-from datetime import datetime
-import boto3
 from utils.s3_utils import save_model_to_s3, save_training_sample_images
+from utils.metrics import MetricsEmitter, create_sink
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure CloudWatch metrics
-cw_client = boto3.client('cloudwatch')
+# Configure CloudWatch metrics (buffered and sent from a background thread)
+metrics = MetricsEmitter('DrugDiscovery', sink=create_sink(os.environ.get('METRICS_SINK', 'cloudwatch')))
 
 class DrugDiscoveryModel(nn.Module):
     def __init__(self):
@@ -67,23 +66,8 @@ def train_model(model, train_loader, optimizer, criterion, device, epoch):
             logger.info(f'Epoch [{epoch}], Step [{i}], Loss: {loss.item():.4f}')
             
             # Log metrics to CloudWatch
-            cw_client.put_metric_data(
-                Namespace='DrugDiscovery',
-                MetricData=[
-                    {
-                        'MetricName': 'TrainingLoss',
-                        'Value': loss.item(),
-                        'Unit': 'None',
-                        'Timestamp': datetime.now()
-                    },
-                    {
-                        'MetricName': 'GPUMemoryUsed',
-                        'Value': torch.cuda.memory_allocated()/1e9,
-                        'Unit': 'Gigabytes',
-                        'Timestamp': datetime.now()
-                    }
-                ]
-            )
+            metrics.put('TrainingLoss', loss.item())
+            metrics.put('GPUMemoryUsed', torch.cuda.memory_allocated()/1e9, 'Gigabytes')
             
             # Save sample images every 50 batches
             if i % 50 == 0:
@@ -125,6 +109,9 @@ def main():
                 'drug_discovery'
             )
             logger.info(f"Checkpoint saved to S3: epoch {epoch+1}")
+    
+    # Send the remaining metrics
+    metrics.close()
 
 if __name__ == "__main__":
     main()
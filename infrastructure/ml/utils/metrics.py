@@ -0,0 +1,201 @@
+"""
+Asynchronous, batched CloudWatch metrics.
+
+put_metric_data is a blocking network round-trip, so calling it from a
+training step or an inference batch puts AWS latency on the hot path.
+MetricsEmitter.put() only enqueues a datapoint; a background thread
+aggregates the datapoints of each interval into StatisticValues and hands
+them to a pluggable sink in batches of up to 1000 metrics.
+"""
+
+import json
+import queue
+import threading
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# PutMetricData accepts at most this many metrics per request
+MAX_METRICS_PER_REQUEST = 1000
+
+class MetricSink(ABC):
+    """Destination for aggregated metric data."""
+
+    @abstractmethod
+    def write(self, namespace: str, metric_data: List[Dict]):
+        """
+        Write a batch of metric data in PutMetricData format.
+
+        Args:
+            namespace: Metric namespace
+            metric_data: At most MAX_METRICS_PER_REQUEST metric entries
+        """
+
+class CloudWatchSink(MetricSink):
+    """Send metric data to CloudWatch."""
+
+    def __init__(self, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client('cloudwatch')
+        self.client = client
+
+    def write(self, namespace: str, metric_data: List[Dict]):
+        self.client.put_metric_data(Namespace=namespace, MetricData=metric_data)
+
+class InMemorySink(MetricSink):
+    """Keep metric data in a list, for tests and local runs."""
+
+    def __init__(self):
+        self.batches: List[Dict] = []
+
+    def write(self, namespace: str, metric_data: List[Dict]):
+        self.batches.append({'Namespace': namespace, 'MetricData': metric_data})
+
+    @property
+    def metric_data(self) -> List[Dict]:
+        """All metric entries written so far."""
+        return [entry for batch in self.batches for entry in batch['MetricData']]
+
+class FileSink(MetricSink):
+    """Append metric data to a JSON lines file, one batch per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, namespace: str, metric_data: List[Dict]):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'Namespace': namespace, 'MetricData': metric_data}, default=str) + '\n')
+
+def create_sink(spec: str = 'cloudwatch') -> MetricSink:
+    """
+    Create a sink from a short specification.
+
+    Args:
+        spec: 'cloudwatch', 'memory', or 'file:<path>'
+
+    Returns:
+        The metric sink
+    """
+    if spec == 'cloudwatch':
+        return CloudWatchSink()
+    if spec == 'memory':
+        return InMemorySink()
+    if spec.startswith('file:'):
+        return FileSink(spec[len('file:'):])
+    raise ValueError(f"Unknown metrics sink: {spec}")
+
+class MetricsEmitter:
+    """
+    Buffer, aggregate and flush metrics from a background thread.
+
+    Datapoints go through a bounded queue; when it is full, new datapoints
+    are dropped and counted instead of blocking the caller. Each flush
+    aggregates the queued datapoints per metric (name, unit and dimensions)
+    into SampleCount/Sum/Minimum/Maximum statistics.
+    """
+
+    def __init__(self,
+                 namespace: str,
+                 sink: Optional[MetricSink] = None,
+                 flush_interval: float = 60.0,
+                 max_queue_size: int = 10000):
+        """
+        Initialize the emitter and start its flush thread.
+
+        Args:
+            namespace: Metric namespace
+            sink: Destination of the metric data (default: CloudWatch)
+            flush_interval: Seconds between flushes
+            max_queue_size: Datapoints buffered before new ones are dropped
+        """
+        self.namespace = namespace
+        self.sink = sink if sink is not None else CloudWatchSink()
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        # Counters of datapoints; dropped is updated by every producer thread
+        self._dropped_lock = threading.Lock()
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name='metrics-emitter', daemon=True)
+        self._thread.start()
+
+    def put(self,
+            name: str,
+            value: float,
+            unit: str = 'None',
+            dimensions: Optional[Dict[str, str]] = None):
+        """
+        Record a datapoint without blocking.
+
+        Args:
+            name: Metric name
+            value: Datapoint value
+            unit: CloudWatch unit
+            dimensions: Metric dimensions
+        """
+        key = (name, unit, tuple(sorted((dimensions or {}).items())))
+        try:
+            self._queue.put_nowait((key, float(value)))
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def flush(self):
+        """Aggregate the queued datapoints and write them to the sink."""
+        with self._flush_lock:
+            stats = defaultdict(lambda: {'SampleCount': 0, 'Sum': 0.0,
+                                         'Minimum': float('inf'), 'Maximum': float('-inf')})
+            num_datapoints = 0
+            while True:
+                try:
+                    key, value = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                entry = stats[key]
+                entry['SampleCount'] += 1
+                entry['Sum'] += value
+                entry['Minimum'] = min(entry['Minimum'], value)
+                entry['Maximum'] = max(entry['Maximum'], value)
+                num_datapoints += 1
+            if not stats:
+                return
+
+            timestamp = datetime.now(timezone.utc)
+            metric_data = []
+            for (name, unit, dimensions), values in stats.items():
+                entry = {'MetricName': name, 'Timestamp': timestamp, 'Unit': unit,
+                         'StatisticValues': values}
+                if dimensions:
+                    entry['Dimensions'] = [{'Name': k, 'Value': v} for k, v in dimensions]
+                metric_data.append(entry)
+
+            try:
+                for i in range(0, len(metric_data), MAX_METRICS_PER_REQUEST):
+                    self.sink.write(self.namespace, metric_data[i:i + MAX_METRICS_PER_REQUEST])
+                self.sent += num_datapoints
+            except Exception as e:
+                self.failed += num_datapoints
+                logger.warning(f"Failed to write {num_datapoints} datapoints: {e}")
+
+    def close(self):
+        """Stop the flush thread and write the remaining datapoints."""
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        if self.dropped or self.failed:
+            logger.warning(f"Metrics emitter dropped {self.dropped} and failed to send "
+                           f"{self.failed} datapoints")
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
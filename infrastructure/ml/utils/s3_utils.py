@@ -8,6 +8,7 @@ import numpy as np
 
 s3_client = boto3.client('s3')
 bucket_name = os.environ.get('S3_BUCKET')
+model_cache_dir = os.environ.get('MODEL_CACHE_DIR', '/tmp/model_cache')
 
 def save_model_to_s3(model_state, optimizer_state, epoch, loss, model_name):
     """Save model checkpoint to S3"""
@@ -29,7 +30,7 @@ def save_model_to_s3(model_state, optimizer_state, epoch, loss, model_name):
     )
 
 def load_model_from_s3(model_name):
-    """Load latest model from S3"""
+    """Load latest model from S3, downloading each checkpoint version only once"""
     response = s3_client.list_objects_v2(
         Bucket=bucket_name,
         Prefix=f'models/trained/{model_name}'
@@ -41,12 +42,16 @@ def load_model_from_s3(model_name):
     # Get the latest model file
     latest_model = max(response['Contents'], key=lambda x: x['LastModified'])
     
-    # Download the model file
-    buffer = io.BytesIO()
-    s3_client.download_fileobj(bucket_name, latest_model['Key'], buffer)
-    buffer.seek(0)
+    # Download the model file unless this version is already cached on local disk
+    etag = latest_model['ETag'].strip('"')
+    local_path = os.path.join(model_cache_dir, f"{os.path.basename(latest_model['Key'])}.{etag}")
+    if not os.path.exists(local_path):
+        os.makedirs(model_cache_dir, exist_ok=True)
+        s3_client.download_file(bucket_name, latest_model['Key'], local_path + '.tmp')
+        os.replace(local_path + '.tmp', local_path)
     
-    return torch.load(buffer)
+    # Memory-map the weights so processes on the node share the page cache
+    return torch.load(local_path, map_location='cpu', mmap=True)
 
 def save_molecule_image(image_tensor, filename, folder='training_samples'):
     """Save molecule visualization to S3"""
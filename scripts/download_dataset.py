@@ -1,11 +1,14 @@
 import os
 import subprocess
 import pandas as pd
-import boto3
+import sys
 from pathlib import Path
 import kaggle
 from kaggle.api.kaggle_api_extended import KaggleApi
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.utils.s3_transfer import S3TransferManager
+
 def setup_kaggle():
     """Setup Kaggle API"""
     api = KaggleApi()
@@ -96,22 +99,13 @@ def download_subset_images(api, image_ids, dataset_name='mathilde-rousseau/human
 
 def upload_to_s3(bucket_name='hpc-drug-discovery-data-2025'):
     """Upload the subset to S3"""
-    s3 = boto3.client('s3')
-    
-    # Upload the CSV file
-    s3.upload_file(
-        'data/subset/train_subset.csv',
-        bucket_name,
-        'human_protein_atlas/train_subset.csv'
-    )
+    files = [('data/subset/train_subset.csv', 'human_protein_atlas/train_subset.csv')]
+    files += [(str(img_file), f'human_protein_atlas/train/{img_file.name}')
+              for img_file in Path('data/subset/train').glob('*.png')]
     
-    # Upload all images
-    for img_file in Path('data/subset/train').glob('*.png'):
-        s3.upload_file(
-            str(img_file),
-            bucket_name,
-            f'human_protein_atlas/train/{img_file.name}'
-        )
+    # Upload the metadata and all images concurrently, skipping unchanged files
+    with S3TransferManager() as transfer:
+        return transfer.upload_files(files, bucket_name)
 
 def main():
     print("Setting up Kaggle API...")
@@ -1,10 +1,13 @@
 import os
 import shutil
 import pandas as pd
-import boto3
+import sys
 from pathlib import Path
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.utils.s3_transfer import S3TransferManager
+
 # Configuration
 SOURCE_DIR = r"C:\Users\darli\Downloads\human-protein-atlas-image-classification"
 SUBSET_DIR = "data/subset"
@@ -57,25 +60,13 @@ def create_balanced_subset(fraction=0.01):
 def upload_to_s3():
     """Upload the subset to S3"""
     print("\nUploading to S3...")
-    s3 = boto3.client('s3')
-    
-    # Upload the CSV file
-    print("Uploading metadata...")
-    s3.upload_file(
-        os.path.join(SUBSET_DIR, "train_subset.csv"),
-        S3_BUCKET,
-        'human_protein_atlas/train_subset.csv'
-    )
+    files = [(os.path.join(SUBSET_DIR, "train_subset.csv"), 'human_protein_atlas/train_subset.csv')]
+    files += [(str(img_file), f'human_protein_atlas/train/{img_file.name}')
+              for img_file in Path(os.path.join(SUBSET_DIR, "train")).glob("*.png")]
     
-    # Upload all images
-    print("Uploading images...")
-    image_files = list(Path(os.path.join(SUBSET_DIR, "train")).glob("*.png"))
-    for img_file in tqdm(image_files):
-        s3.upload_file(
-            str(img_file),
-            S3_BUCKET,
-            f'human_protein_atlas/train/{img_file.name}'
-        )
+    # Upload the metadata and all images concurrently, skipping unchanged files
+    with S3TransferManager() as transfer, tqdm(total=len(files)) as progress:
+        transfer.upload_files(files, S3_BUCKET, callback=lambda key, status: progress.update())
 
 def main():
     # Install tqdm if not present
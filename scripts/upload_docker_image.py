@@ -1,6 +1,10 @@
 import os
+import sys
 import subprocess
-import boto3
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.utils.s3_transfer import S3TransferManager
 
 def save_docker_image(image_name: str, output_file: str) -> bool:
     """Save Docker image to a tar file."""
@@ -12,11 +16,10 @@ def save_docker_image(image_name: str, output_file: str) -> bool:
         return False
 
 def upload_to_s3(file_path: str, bucket: str, s3_key: str) -> bool:
-    """Upload file to S3."""
+    """Upload file to S3 as a parallel multipart upload, unless it is unchanged."""
     try:
-        s3_client = boto3.client('s3')
-        s3_client.upload_file(file_path, bucket, s3_key)
-        return True
+        with S3TransferManager() as transfer:
+            return transfer.upload_file(file_path, bucket, s3_key)
     except Exception as e:
         print(f"Error uploading to S3: {e}")
         return False
@@ -1,40 +1,28 @@
-import os
-import boto3
+import sys
 from pathlib import Path
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.utils.s3_transfer import S3TransferManager, create_client
+
 def upload_directory_to_s3(local_dir, bucket_name, s3_prefix):
-    """Upload a directory to S3 directly"""
-    # Initialize S3 client with credentials
-    s3 = boto3.client(
-        's3',
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-        region_name='us-east-1'
-    )
-    
-    local_dir = Path(local_dir)
-    
-    # Get all files
-    all_files = list(local_dir.rglob("*"))
-    files_to_upload = [f for f in all_files if f.is_file()]
-    
+    """Upload a directory to S3, skipping files that are already up to date"""
+    files_to_upload = [f for f in Path(local_dir).rglob("*") if f.is_file()]
     print(f"Found {len(files_to_upload)} files to upload")
     
-    # Upload each file
-    for file_path in tqdm(files_to_upload):
-        # Calculate S3 key
-        relative_path = file_path.relative_to(local_dir)
-        s3_key = f"{s3_prefix}/{relative_path}".replace("\\", "/")
-        
-        try:
-            s3.upload_file(
-                str(file_path),
-                bucket_name,
-                s3_key
-            )
-        except Exception as e:
-            print(f"Error uploading {file_path}: {e}")
+    # Upload concurrently over one pooled client
+    with S3TransferManager(create_client(region_name='us-east-1')) as transfer, \
+            tqdm(total=len(files_to_upload)) as progress:
+        result = transfer.upload_directory(
+            local_dir,
+            bucket_name,
+            s3_prefix,
+            callback=lambda key, status: progress.update()
+        )
+    
+    print(f"Uploaded {result['transferred']} files, {result['skipped']} unchanged, "
+          f"{result['failed']} failed")
+    return result
 
 if __name__ == "__main__":
     # Upload the subset directory
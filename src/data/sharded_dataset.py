@@ -0,0 +1,265 @@
+"""
+Sharded, Memory-Mapped Dataset Format for Preprocessed Images
+
+Preprocessed samples are stored per split as fixed-size ``.npy`` shards plus
+an ``index.json`` file describing them:
+
+    <split>/
+        index.json
+        shard_00000_x.npy   # (shard_size, H, W, C) samples
+        shard_00000_y.npy   # (shard_size, num_classes) multi-hot labels
+        ...
+
+``ShardWriter`` appends samples incrementally so the full split never has to
+fit in memory, and ``ShardedDataset`` reads samples back zero-copy through
+memory maps.
+"""
+
+import os
+import json
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+FORMAT_VERSION = 1
+
+class ShardWriter:
+    """
+    Incrementally write samples and labels into fixed-size memory-mapped shards.
+    """
+
+    def __init__(self,
+                 output_dir: str,
+                 sample_shape: Tuple[int, ...],
+                 num_classes: int,
+                 dtype: str = 'float32',
+                 shard_size: int = 1024):
+        """
+        Initialize the shard writer.
+
+        Args:
+            output_dir: Directory the shards and index are written to
+            sample_shape: Shape of a single sample, e.g. (H, W, C)
+            num_classes: Number of label classes
+            dtype: Storage dtype of the samples
+            shard_size: Number of samples per shard
+        """
+        self.output_dir = Path(output_dir)
+        self.sample_shape = tuple(sample_shape)
+        self.num_classes = num_classes
+        self.dtype = np.dtype(dtype)
+        self.shard_size = shard_size
+
+        self.shards: List[Dict] = []
+        self.metadata: Dict = {}
+        self.num_samples = 0
+        self._x = None
+        self._y = None
+        self._filled = 0
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self) -> 'ShardWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def _open_shard(self):
+        """Create the memory-mapped files for the next shard."""
+        name = f'shard_{len(self.shards):05d}'
+        self._x_name = f'{name}_x.npy'
+        self._y_name = f'{name}_y.npy'
+        self._x = np.lib.format.open_memmap(
+            self.output_dir / self._x_name, mode='w+', dtype=self.dtype,
+            shape=(self.shard_size, *self.sample_shape))
+        self._y = np.lib.format.open_memmap(
+            self.output_dir / self._y_name, mode='w+', dtype=np.uint8,
+            shape=(self.shard_size, self.num_classes))
+        self._filled = 0
+
+    def _close_shard(self):
+        """Flush the current shard, truncating it if it is only partially filled."""
+        if self._x is None:
+            return
+
+        if self._filled < self.shard_size:
+            for attr, name in (('_x', self._x_name), ('_y', self._y_name)):
+                full = getattr(self, attr)
+                tmp_path = self.output_dir / f'{name}.tmp'
+                trimmed = np.lib.format.open_memmap(
+                    tmp_path, mode='w+', dtype=full.dtype,
+                    shape=(self._filled, *full.shape[1:]))
+                trimmed[:] = full[:self._filled]
+                trimmed.flush()
+                del trimmed
+                del full
+                setattr(self, attr, None)
+                os.replace(tmp_path, self.output_dir / name)
+        else:
+            self._x.flush()
+            self._y.flush()
+
+        self.shards.append({
+            'x': self._x_name,
+            'y': self._y_name,
+            'num_samples': self._filled
+        })
+        self._x = None
+        self._y = None
+
+    def write(self, samples: np.ndarray, labels: np.ndarray):
+        """
+        Append a batch of samples and their labels.
+
+        Args:
+            samples: Array of shape (n, *sample_shape)
+            labels: Multi-hot array of shape (n, num_classes)
+        """
+        if samples.shape[1:] != self.sample_shape:
+            raise ValueError(f"Expected samples of shape {self.sample_shape}, "
+                             f"got {samples.shape[1:]}")
+        if len(samples) != len(labels):
+            raise ValueError(f"Got {len(samples)} samples but {len(labels)} labels")
+
+        written = 0
+        while written < len(samples):
+            if self._x is None:
+                self._open_shard()
+
+            n = min(len(samples) - written, self.shard_size - self._filled)
+            self._x[self._filled:self._filled + n] = samples[written:written + n]
+            self._y[self._filled:self._filled + n] = labels[written:written + n]
+            self._filled += n
+            written += n
+
+            if self._filled == self.shard_size:
+                self._close_shard()
+
+        self.num_samples += len(samples)
+
+    def close(self):
+        """Flush the last shard and write the index file."""
+        if self._x is not None and self._filled > 0:
+            self._close_shard()
+
+        index = {
+            'format_version': FORMAT_VERSION,
+            'sample_shape': list(self.sample_shape),
+            'dtype': self.dtype.name,
+            'num_classes': self.num_classes,
+            'shard_size': self.shard_size,
+            'num_samples': self.num_samples,
+            'shards': self.shards,
+            **self.metadata
+        }
+        write_index(self.output_dir, index)
+        logger.info(f"Wrote {self.num_samples} samples in {len(self.shards)} shards "
+                    f"to {self.output_dir}")
+
+def write_index(split_dir: str, index: Dict):
+    """Atomically write the index file of a split."""
+    tmp_path = Path(split_dir) / f'{INDEX_FILE}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, Path(split_dir) / INDEX_FILE)
+
+def read_index(split_dir: str) -> Dict:
+    """Read the index file of a split."""
+    with open(Path(split_dir) / INDEX_FILE) as f:
+        index = json.load(f)
+
+    if index.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported dataset format version: {index.get('format_version')}")
+
+    return index
+
+def is_sharded_dataset(split_dir: str) -> bool:
+    """Check whether a directory contains a sharded dataset split."""
+    return (Path(split_dir) / INDEX_FILE).exists()
+
+def iter_shards(split_dir: str,
+                mmap_mode: str = 'r') -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Iterate over the memory-mapped shards of a split.
+
+    Args:
+        split_dir: Directory containing the split
+        mmap_mode: Memory-map mode ('r' to read, 'r+' to update in place)
+
+    Yields:
+        Tuples of (samples, labels) memory maps
+    """
+    index = read_index(split_dir)
+    for shard in index['shards']:
+        yield (np.load(Path(split_dir) / shard['x'], mmap_mode=mmap_mode),
+               np.load(Path(split_dir) / shard['y'], mmap_mode=mmap_mode))
+
+class ShardedDataset(Dataset):
+    """
+    PyTorch dataset reading samples zero-copy from memory-mapped shards.
+
+    Samples are returned channel-first (C, H, W) as views on the memory map;
+    nothing is materialized until the DataLoader collates a batch.
+    """
+
+    def __init__(self, split_dir: str):
+        """
+        Initialize the dataset.
+
+        Args:
+            split_dir: Directory containing the split's shards and index
+        """
+        self.split_dir = Path(split_dir)
+        self.index = read_index(split_dir)
+        self.sample_shape = tuple(self.index['sample_shape'])
+        self.num_classes = self.index['num_classes']
+
+        counts = [shard['num_samples'] for shard in self.index['shards']]
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._shards: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def _open(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Open the shard memory maps lazily, once per process."""
+        if self._shards is None:
+            # Copy-on-write maps are writable views, which lets torch wrap them without copying
+            self._shards = list(iter_shards(self.split_dir, mmap_mode='c'))
+        return self._shards
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state['_shards'] = None
+        return state
+
+    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Index {idx} out of range for dataset of size {len(self)}")
+
+        shard_idx = int(np.searchsorted(self._offsets, idx, side='right')) - 1
+        samples, labels = self._open()[shard_idx]
+        local_idx = idx - self._offsets[shard_idx]
+
+        x = torch.from_numpy(samples[local_idx])
+        if x.dim() == 3:
+            x = x.permute(2, 0, 1)
+        y = torch.from_numpy(labels[local_idx]).float()
+
+        return x, y
+
+    def labels(self) -> np.ndarray:
+        """Load all labels of the split, (num_samples, num_classes) uint8."""
+        if len(self) == 0:
+            return np.zeros((0, self.num_classes), dtype=np.uint8)
+        return np.concatenate([np.asarray(y) for _, y in self._open()])
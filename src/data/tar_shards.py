@@ -0,0 +1,499 @@
+"""
+Packed Tar Shards for Sequential Reads from S3 and FSx
+
+The raw dataset is hundreds of thousands of small per-stain PNGs, so reads
+from S3 or Lustre are dominated by per-file requests and metadata lookups.
+This module packs whole samples into large WebDataset-style tar shards:
+
+    <split>/
+        shards.json           # index: shard names, sizes and sample counts
+        shard_000000.tar      # ~256 MB each
+        shard_000001.tar
+        ...
+
+Each sample is stored as consecutive tar members sharing a key:
+
+    <id>.red.png  <id>.green.png  <id>.blue.png  <id>.yellow.png  <id>.cls
+
+where ``.cls`` holds the space-separated target classes. The PNGs are copied
+byte for byte. Training samples are additionally decoded once, resized like
+the preprocessor does, to accumulate the normalization statistics saved to
+normalization.json next to the splits.
+
+``TarShardDataset`` streams the shards of a local directory or an S3 prefix
+front to back. Randomness comes from shuffling the shard order every epoch
+and mixing samples in a bounded shuffle buffer, so every read is large and
+sequential.
+"""
+
+import io
+import os
+import copy
+import json
+import random
+import tarfile
+import cv2
+import numpy as np
+import pandas as pd
+import torch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from torch.utils.data import IterableDataset, get_worker_info
+from sklearn.model_selection import train_test_split
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+from src.utils.normalization import NORMALIZATION_FILE, NORMALIZATION_MODES, Normalizer, RunningStats, load_normalizer
+from src.utils.preprocessing import CHANNEL_COLORS, encode_targets, resize_image
+
+logger = logging.getLogger(__name__)
+
+SHARD_INDEX_FILE = 'shards.json'
+SHARD_FORMAT_VERSION = 1
+
+def is_tar_dataset(split_dir: str) -> bool:
+    """Check whether a local directory contains a packed tar split."""
+    return (Path(split_dir) / SHARD_INDEX_FILE).exists()
+
+class TarShardWriter:
+    """
+    Append samples to tar shards, starting a new shard once one reaches its size bound.
+    """
+
+    def __init__(self,
+                 output_dir: str,
+                 max_shard_bytes: int = 256 * 1024 ** 2,
+                 num_classes: int = 28):
+        """
+        Initialize the writer.
+
+        Args:
+            output_dir: Directory the shards and index are written to
+            max_shard_bytes: Size at which a shard is closed
+            num_classes: Number of label classes
+        """
+        self.output_dir = Path(output_dir)
+        self.max_shard_bytes = max_shard_bytes
+        self.num_classes = num_classes
+
+        self.shards: List[Dict] = []
+        self.num_samples = 0
+        self._tar = None
+        self._name = None
+        self._count = 0
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self) -> 'TarShardWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def _open_shard(self):
+        self._name = f'shard_{len(self.shards):06d}.tar'
+        self._tar = tarfile.open(self.output_dir / f'{self._name}.tmp', mode='w')
+        self._count = 0
+
+    def _close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        tmp_path = self.output_dir / f'{self._name}.tmp'
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, self.output_dir / self._name)
+        self.shards.append({'name': self._name, 'num_samples': self._count, 'num_bytes': size})
+        self._tar = None
+
+    def write(self, key: str, members: Dict[str, bytes]):
+        """
+        Append one sample.
+
+        Args:
+            key: Sample key, e.g. the HPA image id
+            members: Payload per member extension, e.g. {'red.png': ..., 'cls': b'16 0'}
+        """
+        if self._tar is None:
+            self._open_shard()
+
+        for extension, payload in members.items():
+            info = tarfile.TarInfo(f'{key}.{extension}')
+            info.size = len(payload)
+            self._tar.addfile(info, io.BytesIO(payload))
+        self._count += 1
+        self.num_samples += 1
+
+        # fileobj.tell() is the shard size so far, without waiting for the close
+        if self._tar.fileobj.tell() >= self.max_shard_bytes:
+            self._close_shard()
+
+    def close(self):
+        """Close the last shard and write the index."""
+        self._close_shard()
+        index = {
+            'format_version': SHARD_FORMAT_VERSION,
+            'num_classes': self.num_classes,
+            'channels': list(CHANNEL_COLORS),
+            'num_samples': self.num_samples,
+            'shards': self.shards
+        }
+        tmp_path = self.output_dir / f'{SHARD_INDEX_FILE}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.output_dir / SHARD_INDEX_FILE)
+        logger.info(f"Wrote {self.num_samples} samples in {len(self.shards)} shards to {self.output_dir}")
+
+def _read_sample(image_dir: Path, image_id: str, target: str) -> Dict[str, bytes]:
+    """Read the raw channel PNGs and label of one sample."""
+    members = {}
+    for color in CHANNEL_COLORS:
+        with open(image_dir / f'{image_id}_{color}.png', 'rb') as f:
+            members[f'{color}.png'] = f.read()
+    members['cls'] = str(target).encode()
+    return members
+
+def decode_sample(members: Dict[str, bytes], image_size: int) -> np.ndarray:
+    """
+    Decode the channel PNGs of a sample into a resized uint8 image.
+
+    Args:
+        members: Payload per member extension
+        image_size: Size the channels are resized to
+
+    Returns:
+        Array of shape (len(CHANNEL_COLORS), image_size, image_size)
+    """
+    image = np.empty((len(CHANNEL_COLORS), image_size, image_size), dtype=np.uint8)
+    for channel, color in enumerate(CHANNEL_COLORS):
+        plane = cv2.imdecode(np.frombuffer(members[f'{color}.png'], dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if plane is None:
+            raise ValueError(f"Could not decode the {color} channel")
+        image[channel] = resize_image(plane, image_size)
+    return image
+
+def _read_and_measure(image_dir: Path, image_id: str, target: str,
+                      image_size: int) -> Tuple[Dict[str, bytes], np.ndarray]:
+    """Read a sample and decode it, channels last, for the normalization statistics."""
+    members = _read_sample(image_dir, image_id, target)
+    return members, decode_sample(members, image_size).transpose(1, 2, 0)
+
+def pack_dataset(data_dir: str,
+                 output_dir: str,
+                 num_classes: int = 28,
+                 max_shard_bytes: int = 256 * 1024 ** 2,
+                 test_size: float = 0.2,
+                 num_threads: int = 16,
+                 image_size: int = 224,
+                 normalization_mode: str = 'channel') -> Dict[str, int]:
+    """
+    Pack the per-stain PNGs of the HPA dataset into train and test tar shards.
+
+    Samples are split as in preprocessing (random_state=42) and written in
+    shuffled order, so consecutive samples of a shard are unrelated and
+    shard-level shuffling is enough to decorrelate batches. Normalization
+    statistics of the train split at the training image size are saved to
+    normalization.json in output_dir, as ProteinAtlasPreprocessor.write_dataset does.
+
+    Args:
+        data_dir: Directory with train.csv and train/{id}_{color}.png
+        output_dir: Directory to write the 'train' and 'test' splits to
+        num_classes: Number of label classes
+        max_shard_bytes: Target shard size
+        test_size: Fraction of samples in the test split
+        num_threads: Threads reading the source files ahead of the writer
+        image_size: Image size the normalization statistics are computed at
+        normalization_mode: 'channel' for per-channel or 'feature' for
+            per-pixel mean/std statistics
+
+    Returns:
+        Dictionary with the number of samples written per split
+    """
+    if normalization_mode not in NORMALIZATION_MODES:
+        raise ValueError(f"Unknown normalization mode: {normalization_mode}")
+    df = pd.read_csv(Path(data_dir) / 'train.csv')
+    train_df, test_df = train_test_split(df, test_size=test_size, random_state=42)
+    image_dir = Path(data_dir) / 'train'
+    num_channels = len(CHANNEL_COLORS)
+    stats = RunningStats((num_channels,) if normalization_mode == 'channel'
+                         else (image_size, image_size, num_channels))
+
+    counts = {}
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for split, split_df in [('train', train_df), ('test', test_df)]:
+            def write(image_id: str, future):
+                if split == 'train':
+                    members, pixels = future.result()
+                    stats.update(pixels[np.newaxis])
+                else:
+                    members = future.result()
+                writer.write(image_id, members)
+
+            with TarShardWriter(Path(output_dir) / split, max_shard_bytes, num_classes) as writer:
+                # Read ahead a bounded window of samples, writing them in order
+                pending = deque()
+                for image_id, target in zip(split_df['Id'], split_df['Target']):
+                    if split == 'train':
+                        future = executor.submit(_read_and_measure, image_dir, image_id, target, image_size)
+                    else:
+                        future = executor.submit(_read_sample, image_dir, image_id, target)
+                    pending.append((image_id, future))
+                    if len(pending) >= 4 * num_threads:
+                        write(*pending.popleft())
+                for image_id, future in pending:
+                    write(image_id, future)
+            counts[split] = writer.num_samples
+
+    # Same statistics and format as the preprocessor saves for uint8 storage
+    Normalizer(stats.mean / 255.0, stats.std / 255.0, mode=normalization_mode, count=stats.count,
+               image_size=image_size, channel_layout='rgby', storage_dtype='uint8').save(output_dir)
+    logger.info(f"Saved {normalization_mode} normalization statistics to {output_dir}")
+
+    return counts
+
+def _parse_s3_url(url: str) -> Tuple[str, str]:
+    bucket, _, prefix = url[len('s3://'):].partition('/')
+    return bucket, prefix.rstrip('/')
+
+def iter_tar_samples(fileobj) -> Iterator[Tuple[str, Dict[str, bytes]]]:
+    """
+    Group the members of a streamed tar file into samples.
+
+    Args:
+        fileobj: Readable binary stream of a shard
+
+    Yields:
+        Tuples of (key, payload per member extension)
+    """
+    key, members = None, {}
+    with tarfile.open(fileobj=fileobj, mode='r|') as tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            member_key, _, extension = info.name.partition('.')
+            if member_key != key and members:
+                yield key, members
+                members = {}
+            key = member_key
+            members[extension] = tar.extractfile(info).read()
+    if members:
+        yield key, members
+
+class TarShardDataset(IterableDataset):
+    """
+    Stream samples from tar shards in a local directory or under an S3 prefix.
+
+    Each epoch the shard order is shuffled with the same seed on every
+    replica and the shards are dealt round-robin to the (replica, loader
+    worker) slots. Samples are mixed in a per-worker shuffle buffer. In
+    distributed training every slot yields the same number of samples, so
+    all replicas run the same number of steps; num_workers must then match
+    the loader's, so that len() counts what this replica's workers yield.
+    Call set_epoch() before each epoch.
+
+    Samples are returned like ShardedDataset: uint8 (C, H, W) images and
+    float multi-hot labels.
+    """
+
+    def __init__(self,
+                 location: str,
+                 image_size: int = 224,
+                 shuffle: bool = True,
+                 shuffle_buffer: int = 1000,
+                 seed: int = 42,
+                 rank: int = 0,
+                 world_size: int = 1,
+                 num_workers: int = 1):
+        """
+        Initialize the dataset.
+
+        Args:
+            location: Split directory or s3://bucket/prefix
+            image_size: Size the channels are resized to
+            shuffle: Shuffle shard order and samples
+            shuffle_buffer: Number of samples mixed in the shuffle buffer
+            seed: Base seed; the order of an epoch depends only on seed and epoch
+            rank: Rank of this replica
+            world_size: Number of distributed replicas
+            num_workers: Number of loader workers reading this replica's share
+                (0 and 1 both mean the loading process itself)
+        """
+        self.location = str(location)
+        self.image_size = image_size
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.num_workers = max(1, num_workers)
+        self.epoch = 0
+        self.skip_batches = 0
+        self.batch_size = 1
+        self._client = None
+
+        with self._open(SHARD_INDEX_FILE) as f:
+            self.index = json.load(f)
+        if self.index.get('format_version') != SHARD_FORMAT_VERSION:
+            raise ValueError(f"Unsupported shard format version: {self.index.get('format_version')}")
+        self.num_classes = self.index['num_classes']
+
+        num_slots = world_size * self.num_workers
+        if world_size > 1 and len(self.index['shards']) < num_slots:
+            raise ValueError(f"{len(self.index['shards'])} shards cannot be split across {world_size} replicas "
+                             f"with {self.num_workers} loader workers each; repack with smaller shards")
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state['_client'] = None
+        return state
+
+    def _open(self, name: str):
+        """Open a file of the split for streaming."""
+        if not self.location.startswith('s3://'):
+            return open(Path(self.location) / name, 'rb')
+        if self._client is None:
+            from src.utils.s3_transfer import create_client
+            self._client = create_client()
+        bucket, prefix = _parse_s3_url(self.location)
+        key = f'{prefix}/{name}' if prefix else name
+        return self._client.get_object(Bucket=bucket, Key=key)['Body']
+
+    def set_epoch(self, epoch: int):
+        """Set the epoch the shard order and shuffle buffer are seeded with."""
+        self.epoch = epoch
+
+    def resume(self, skip_batches: int, batch_size: int) -> 'TarShardDataset':
+        """
+        Return a copy that skips the batches of this epoch already trained.
+
+        Args:
+            skip_batches: Number of batches of the epoch already trained
+            batch_size: Batch size of the loader
+        """
+        dataset = copy.copy(self)
+        dataset.skip_batches = skip_batches
+        dataset.batch_size = batch_size
+        return dataset
+
+    def _shard_order(self) -> List[Dict]:
+        shards = list(self.index['shards'])
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(shards)
+        return shards
+
+    def _slot_quota(self, shards: List[Dict], num_slots: int) -> Optional[int]:
+        """Samples per slot that every slot can provide, when replicas must stay in step."""
+        if self.world_size == 1:
+            return None
+        return min(sum(s['num_samples'] for s in shards[slot::num_slots]) for slot in range(num_slots))
+
+    def __len__(self) -> int:
+        """Samples this replica yields per epoch, over all of its loader workers."""
+        if self.world_size == 1:
+            return self.index['num_samples']
+        num_slots = self.world_size * self.num_workers
+        return self.num_workers * (self._slot_quota(self._shard_order(), num_slots) or 0)
+
+    def _decode(self, members: Dict[str, bytes]) -> Tuple[torch.Tensor, torch.Tensor]:
+        image = decode_sample(members, self.image_size)
+        label = encode_targets([members['cls'].decode()], self.num_classes)[0]
+        return torch.from_numpy(image), torch.from_numpy(label).float()
+
+    def _iter_samples(self, shards: List[Dict]) -> Iterator[Dict[str, bytes]]:
+        for shard in shards:
+            with self._open(shard['name']) as f:
+                for _, members in iter_tar_samples(f):
+                    yield members
+
+    def __iter__(self) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker is not None else (0, 1)
+        if self.world_size > 1 and num_workers != self.num_workers:
+            raise ValueError(f"Dataset is split for {self.num_workers} loader workers per replica, "
+                             f"but is read by {num_workers}")
+        # A resumed loader starts its round-robin over the workers at worker 0,
+        # so the workers take over the streams in the order the epoch left them
+        worker_id = (worker_id + self.skip_batches) % num_workers
+        num_slots = self.world_size * num_workers
+        slot = self.rank * num_workers + worker_id
+
+        shards = self._shard_order()
+        quota = self._slot_quota(shards, num_slots)
+        rng = random.Random((self.seed + self.epoch) * 1000003 + slot)
+        if quota == 0:
+            raise ValueError(f"Not enough shards for {num_slots} replica and loader worker slots")
+
+        # The loader takes batches from its workers round-robin, so this
+        # stream produced every num_workers-th of the batches to skip
+        skip = len(range(worker_id, self.skip_batches, num_workers)) * self.batch_size
+        mix = self.shuffle and self.shuffle_buffer > 0
+
+        buffer = []
+        produced = 0
+        for members in self._iter_samples(shards[slot::num_slots]):
+            if quota is not None and produced >= quota:
+                break
+            produced += 1
+            if mix and len(buffer) < self.shuffle_buffer:
+                buffer.append(members)
+                continue
+            if mix:
+                i = rng.randrange(len(buffer))
+                buffer[i], members = members, buffer[i]
+            if skip:
+                skip -= 1
+                continue
+            yield self._decode(members)
+
+        # Drain the shuffle buffer
+        rng.shuffle(buffer)
+        for members in buffer[skip:]:
+            yield self._decode(members)
+
+def load_tar_normalizer(location: str) -> Optional[Normalizer]:
+    """
+    Load the normalizer saved next to packed splits in a local directory or under an S3 prefix.
+
+    Args:
+        location: Directory or s3://bucket/prefix containing the splits
+
+    Returns:
+        The normalizer, or None if the dataset has no saved statistics
+    """
+    if not location.startswith('s3://'):
+        return load_normalizer(location)
+    from botocore.exceptions import ClientError
+    from src.utils.s3_transfer import create_client
+    bucket, prefix = _parse_s3_url(location)
+    key = f'{prefix}/{NORMALIZATION_FILE}' if prefix else NORMALIZATION_FILE
+    try:
+        body = create_client().get_object(Bucket=bucket, Key=key)['Body'].read()
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return Normalizer.from_dict(json.loads(body))
+
+def main():
+    """Pack the raw dataset into tar shards, optionally uploading them to S3."""
+    logging.basicConfig(level=logging.INFO)
+    output_dir = os.getenv('SHARD_OUTPUT_DIR', 'data/shards')
+    counts = pack_dataset(
+        os.getenv('RAW_DATA_DIR', 'data/raw'),
+        output_dir,
+        num_classes=int(os.getenv('NUM_CLASSES', '28')),
+        max_shard_bytes=int(os.getenv('MAX_SHARD_MB', '256')) * 1024 ** 2,
+        image_size=int(os.getenv('IMAGE_SIZE', '224')),
+        normalization_mode=os.getenv('NORMALIZATION_MODE', 'channel')
+    )
+    logger.info(f"Packed {counts['train']} train and {counts['test']} test samples")
+
+    bucket = os.getenv('S3_BUCKET')
+    if bucket:
+        from src.utils.s3_transfer import S3TransferManager
+        with S3TransferManager() as transfer:
+            transfer.upload_directory(output_dir, bucket, os.getenv('S3_SHARD_PREFIX', 'human_protein_atlas/shards'))
+
+if __name__ == "__main__":
+    main()
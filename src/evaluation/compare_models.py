@@ -5,7 +5,10 @@ This script demonstrates enterprise-grade deep learning model evaluation with co
 
 import os
 import time
+import pickle
 import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -14,13 +17,15 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import Dataset, DataLoader
-from sklearn.metrics import f1_score, accuracy_score, precision_score, recall_score, confusion_matrix
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-import mlflow
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 
+from src.evaluation.metrics import MultiLabelMetrics
+from src.training.early_stopping import BestStateTracker, EarlyStopping
+from src.utils.tracking import BufferedMLflowLogger
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +33,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _init_worker(num_threads: int):
+    """Give each comparison worker its own share of the node's cores."""
+    torch.set_num_threads(num_threads)
+
+def result_path(output_dir: str, name: str) -> Path:
+    """Path of the saved results of one candidate model."""
+    return Path(output_dir) / f"results_{name.lower().replace(' ', '_')}.pkl"
+
+def save_result(output_dir: str, name: str, metrics: Dict[str, Any]) -> None:
+    """
+    Save the results of one candidate, e.g. from a Slurm array task.
+    Args:
+        output_dir: Directory shared by the comparison tasks
+        name: Name of the model
+        metrics: Final metrics of the model
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with open(result_path(output_dir, name), 'wb') as f:
+        pickle.dump(metrics, f)
+
+def gather_results(output_dir: str, names: List[str]) -> Dict[str, Any]:
+    """
+    Collect the results saved by save_result.
+    Args:
+        output_dir: Directory shared by the comparison tasks
+        names: Names of the candidate models
+    Returns:
+        Dictionary of results, in the order of names
+    """
+    missing = [name for name in names if not result_path(output_dir, name).exists()]
+    if missing:
+        raise FileNotFoundError(f"No results for {missing} in {output_dir}")
+    
+    results = {}
+    for name in names:
+        with open(result_path(output_dir, name), 'rb') as f:
+            results[name] = pickle.load(f)
+    return results
+
 class ProteinDataset(Dataset):
     """
     Custom dataset for protein data.
@@ -42,6 +86,30 @@ class ProteinDataset(Dataset):
     def __getitem__(self, idx):
         return self.features[idx], self.labels[idx]
 
+class LightweightCNN(nn.Module):
+    """
+    Lightweight 1D CNN baseline for protein feature vectors.
+    """
+    def __init__(self, input_size, num_classes):
+        super(LightweightCNN, self).__init__()
+        self.features = nn.Sequential(
+            nn.Conv1d(1, 32, kernel_size=5, padding=2),
+            nn.BatchNorm1d(32),
+            nn.ReLU(inplace=True),
+            nn.MaxPool1d(kernel_size=2),
+            nn.Conv1d(32, 64, kernel_size=3, padding=1),
+            nn.BatchNorm1d(64),
+            nn.ReLU(inplace=True),
+            nn.AdaptiveAvgPool1d(1)
+        )
+        self.dropout = nn.Dropout(0.5)
+        self.fc = nn.Linear(64, num_classes)
+    
+    def forward(self, x):
+        # Add channel dimension
+        out = self.features(x.unsqueeze(1)).flatten(1)
+        return self.fc(self.dropout(out))
+
 class ResBlock(nn.Module):
     """
     Residual block for ResNet architecture.
@@ -132,23 +200,37 @@ class ModelEvaluator:
     Enterprise-grade model evaluator with comprehensive metrics and visualization.
     """
     
-    def __init__(self, input_size: int, num_classes: int, device: torch.device):
+    def __init__(self, input_size: int, num_classes: int, device: torch.device,
+                 max_epochs: int = 50, patience: int = 8, lr_patience: int = 3,
+                 min_delta: float = 1e-4, checkpoint_dir: Optional[str] = None):
         """
         Initialize the evaluator with models to compare.
         Args:
             input_size: Size of input features
             num_classes: Number of classes
             device: PyTorch device (CPU/GPU)
+            max_epochs: Maximum number of epochs per model
+            patience: Epochs without a validation F1 improvement before stopping
+            lr_patience: Epochs without improvement before the learning rate is halved
+            min_delta: Minimum F1 change that counts as an improvement
+            checkpoint_dir: Directory the best weights are written to once
+                training ends (None keeps them in memory only)
         """
         self.device = device
+        self.num_classes = num_classes
+        self.max_epochs = max_epochs
+        self.patience = patience
+        self.lr_patience = lr_patience
+        self.min_delta = min_delta
+        self.checkpoint_dir = checkpoint_dir
         self.models = {
             "Lightweight CNN": LightweightCNN(input_size, num_classes).to(device),
             "ResNet": ResNet(input_size, num_classes).to(device)
         }
-        self.scaler = StandardScaler()
         self.results = {}
     
-    def load_data(self, data_dir: str = "data/raw") -> Tuple[np.ndarray, np.ndarray]:
+    @staticmethod
+    def load_data(data_dir: str = "data/raw") -> Tuple[np.ndarray, np.ndarray]:
         """
         Load the Human Protein Atlas dataset.
         Args:
@@ -173,7 +255,7 @@ class ModelEvaluator:
             y = data["target"]
             
             # Scale features
-            X = self.scaler.fit_transform(X)
+            X = StandardScaler().fit_transform(X)
             
             logger.info(f"Loaded {len(X)} samples with {X.shape[1]} features")
             
@@ -183,115 +265,160 @@ class ModelEvaluator:
             logger.error(f"Error loading data: {str(e)}")
             raise
     
-    def train_and_evaluate(self, X_train: np.ndarray, X_test: np.ndarray, 
-                          y_train: np.ndarray, y_test: np.ndarray) -> Dict[str, Any]:
+    def evaluate(self, model: nn.Module, loader: DataLoader) -> Dict[str, Any]:
         """
-        Train and evaluate all models.
+        Evaluate a model, accumulating classification counts on the device.
         Args:
+            model: Model to evaluate
+            loader: Loader yielding (features, labels) batches
+        Returns:
+            Support-weighted F1, precision and recall, accuracy, macro and
+            micro F1, and per-class confusion matrices
+        """
+        model.eval()
+        counts = MultiLabelMetrics(self.num_classes, device=self.device)
+        with torch.no_grad():
+            for batch_features, batch_labels in loader:
+                outputs = model(batch_features.to(self.device, non_blocking=True))
+                counts.update(outputs, batch_labels.to(self.device, non_blocking=True))
+        
+        scores = counts.compute()
+        return {
+            "f1_score": scores["f1_weighted"],
+            "accuracy": scores["accuracy"],
+            "precision": scores["precision_weighted"],
+            "recall": scores["recall_weighted"],
+            "f1_macro": scores["f1_macro"],
+            "f1_micro": scores["f1_micro"],
+            "confusion_matrix": counts.confusion_matrices()
+        }
+    
+    def train_model(self, name: str, X_train: np.ndarray, X_test: np.ndarray,
+                    y_train: np.ndarray, y_test: np.ndarray) -> Dict[str, Any]:
+        """
+        Train and evaluate one candidate model.
+        Args:
+            name: Key of the model in self.models
             X_train: Training features
             X_test: Test features
             y_train: Training labels
             y_test: Test labels
         Returns:
-            Dictionary of results
+            Final metrics of the model
         """
-        results = {}
+        model = self.models[name]
+        train_loader = DataLoader(ProteinDataset(X_train, y_train), batch_size=32, shuffle=True)
+        test_loader = DataLoader(ProteinDataset(X_test, y_test), batch_size=32)
         
-        # Create data loaders
-        train_dataset = ProteinDataset(X_train, y_train)
-        test_dataset = ProteinDataset(X_test, y_test)
-        train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-        test_loader = DataLoader(test_dataset, batch_size=32)
+        logger.info(f"Training {name}...")
         
-        for name, model in self.models.items():
-            logger.info(f"Training {name}...")
-            
-            # Initialize optimizer and criterion
-            optimizer = optim.Adam(model.parameters(), lr=0.001)
-            criterion = nn.CrossEntropyLoss()
+        # Initialize optimizer and criterion
+        optimizer = optim.Adam(model.parameters(), lr=0.001)
+        criterion = nn.CrossEntropyLoss()
+        
+        # One MLflow run per model; metrics are logged per epoch in the background
+        tracker = BufferedMLflowLogger(run_name=f"model_comparison_{name}")
+        tracker.log_params({"model_type": name})
+        
+        # Halve the learning rate when validation F1 plateaus, stop when it stays flat
+        scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', factor=0.5,
+                                                         patience=self.lr_patience, threshold=self.min_delta,
+                                                         threshold_mode='abs')
+        best = BestStateTracker(mode='max', min_delta=self.min_delta)
+        stopper = EarlyStopping(patience=self.patience, mode='max', min_delta=self.min_delta)
+        
+        # Training loop
+        best_metrics = {}
+        training_time = 0
+        epochs_run = 0
+        for epoch in range(self.max_epochs):
+            epoch_start = time.time()
             
-            # Training loop
-            best_f1 = 0
-            training_time = 0
-            for epoch in range(50):
-                epoch_start = time.time()
-                
-                # Training phase
-                model.train()
-                for batch_features, batch_labels in train_loader:
-                    batch_features, batch_labels = batch_features.to(self.device), batch_labels.to(self.device)
-                    
-                    optimizer.zero_grad()
-                    outputs = model(batch_features)
-                    loss = criterion(outputs, batch_labels)
-                    loss.backward()
-                    optimizer.step()
-                
-                # Evaluation phase
-                model.eval()
-                all_preds = []
-                all_labels = []
-                with torch.no_grad():
-                    for batch_features, batch_labels in test_loader:
-                        batch_features = batch_features.to(self.device)
-                        outputs = model(batch_features)
-                        _, preds = torch.max(outputs, 1)
-                        all_preds.extend(preds.cpu().numpy())
-                        all_labels.extend(batch_labels.numpy())
-                
-                # Calculate metrics
-                metrics = {
-                    "f1_score": f1_score(all_labels, all_preds, average='weighted'),
-                    "accuracy": accuracy_score(all_labels, all_preds),
-                    "precision": precision_score(all_labels, all_preds, average='weighted'),
-                    "recall": recall_score(all_labels, all_preds, average='weighted'),
-                    "confusion_matrix": confusion_matrix(all_labels, all_preds)
-                }
-                
-                epoch_time = time.time() - epoch_start
-                training_time += epoch_time
-                
-                # Log metrics to MLflow
-                with mlflow.start_run(run_name=f"model_comparison_{name}_epoch_{epoch}"):
-                    for metric_name, value in metrics.items():
-                        if metric_name != "confusion_matrix":
-                            mlflow.log_metric(metric_name, value)
-                    mlflow.log_metric("loss", loss.item())
-                    mlflow.log_param("model_type", name)
-                    mlflow.log_param("epoch", epoch)
-                
-                logger.info(f"Epoch {epoch+1}/50 - F1: {metrics['f1_score']:.4f} - Accuracy: {metrics['accuracy']:.4f} - Time: {epoch_time:.2f}s")
+            # Training phase
+            model.train()
+            for batch_features, batch_labels in train_loader:
+                batch_features, batch_labels = batch_features.to(self.device), batch_labels.to(self.device)
                 
-                # Save best model
-                if metrics['f1_score'] > best_f1:
-                    best_f1 = metrics['f1_score']
-                    torch.save(model.state_dict(), f"best_model_{name.lower().replace(' ', '_')}.pth")
+                optimizer.zero_grad()
+                outputs = model(batch_features)
+                loss = criterion(outputs, batch_labels)
+                loss.backward()
+                optimizer.step()
             
-            # Load best model
-            model.load_state_dict(torch.load(f"best_model_{name.lower().replace(' ', '_')}.pth"))
+            # Evaluation phase
+            metrics = self.evaluate(model, test_loader)
             
-            # Final evaluation
-            model.eval()
-            all_preds = []
-            all_labels = []
-            with torch.no_grad():
-                for batch_features, batch_labels in test_loader:
-                    batch_features = batch_features.to(self.device)
-                    outputs = model(batch_features)
-                    _, preds = torch.max(outputs, 1)
-                    all_preds.extend(preds.cpu().numpy())
-                    all_labels.extend(batch_labels.numpy())
+            epoch_time = time.time() - epoch_start
+            training_time += epoch_time
+            epochs_run = epoch + 1
             
-            final_metrics = {
-                "f1_score": f1_score(all_labels, all_preds, average='weighted'),
-                "accuracy": accuracy_score(all_labels, all_preds),
-                "precision": precision_score(all_labels, all_preds, average='weighted'),
-                "recall": recall_score(all_labels, all_preds, average='weighted'),
-                "training_time": training_time,
-                "confusion_matrix": confusion_matrix(all_labels, all_preds)
-            }
+            # Log metrics to MLflow
+            tracker.log_metrics({
+                **{k: v for k, v in metrics.items() if k != "confusion_matrix"},
+                "loss": loss.item(),
+                "learning_rate": optimizer.param_groups[0]['lr']
+            }, step=epoch)
             
-            results[name] = final_metrics
+            logger.info(f"Epoch {epochs_run}/{self.max_epochs} - F1: {metrics['f1_score']:.4f} - Accuracy: {metrics['accuracy']:.4f} - Time: {epoch_time:.2f}s")
+            
+            # Keep a host copy of the best weights; nothing is written per epoch
+            if best.update(model, metrics['f1_score'], epochs_run):
+                best_metrics = metrics
+            scheduler.step(metrics['f1_score'])
+            if stopper.step(metrics['f1_score']):
+                logger.info(f"Stopping {name} after {epochs_run} epochs: F1 has not improved "
+                            f"for {self.patience} epochs (best {best.best_score:.4f} at epoch {best.best_epoch})")
+                break
+        
+        tracker.close()
+        
+        # Load best model, and write it once if requested
+        best.restore(model)
+        if self.checkpoint_dir:
+            best.save(os.path.join(self.checkpoint_dir, f"best_model_{name.lower().replace(' ', '_')}.pth"))
+        
+        # The best epoch's evaluation is the final evaluation of the restored weights
+        final_metrics = dict(best_metrics)
+        final_metrics["training_time"] = training_time
+        final_metrics["best_epoch"] = best.best_epoch
+        final_metrics["epochs_run"] = epochs_run
+        final_metrics["epochs_saved"] = self.max_epochs - epochs_run
+        
+        return final_metrics
+    
+    def train_and_evaluate(self, X_train: np.ndarray, X_test: np.ndarray, 
+                          y_train: np.ndarray, y_test: np.ndarray,
+                          max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Train and evaluate all models, each candidate in its own worker process.
+        
+        The node's cores are partitioned between the workers with
+        torch.set_num_threads, so the comparison takes about as long as the
+        slowest model rather than the sum of all of them.
+        Args:
+            X_train: Training features
+            X_test: Test features
+            y_train: Training labels
+            y_test: Test labels
+            max_workers: Number of candidates trained at once (1 trains them
+                one after another in this process; default: all at once)
+        Returns:
+            Dictionary of results
+        """
+        names = list(self.models)
+        max_workers = min(max_workers or len(names), len(names))
+        if max_workers <= 1:
+            return {name: self.train_model(name, X_train, X_test, y_train, y_test) for name in names}
+        
+        num_threads = max(1, (os.cpu_count() or 1) // max_workers)
+        logger.info(f"Training {len(names)} models in {max_workers} processes with {num_threads} threads each")
+        
+        # Spawned workers do not inherit CUDA or OpenMP state from this process
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(num_threads,)) as executor:
+            futures = {name: executor.submit(self.train_model, name, X_train, X_test, y_train, y_test)
+                       for name in names}
+            results = {name: future.result() for name, future in futures.items()}
         
         return results
     
@@ -330,13 +457,15 @@ class ModelEvaluator:
         plt.savefig(os.path.join(output_dir, 'training_time_comparison.png'))
         plt.close()
         
-        # Plot confusion matrices
+        # Plot per-class confusion matrices, one row of TN/FP/FN/TP counts per class
         for name, metrics in results.items():
-            plt.figure(figsize=(8, 6))
-            sns.heatmap(metrics['confusion_matrix'], annot=True, fmt='d', cmap='Blues')
+            matrices = metrics['confusion_matrix']
+            plt.figure(figsize=(8, max(6, 0.3 * len(matrices))))
+            sns.heatmap(matrices.reshape(len(matrices), 4), annot=True, fmt='d', cmap='Blues',
+                        xticklabels=['TN', 'FP', 'FN', 'TP'])
             plt.title(f'Confusion Matrix - {name}')
-            plt.ylabel('True Label')
-            plt.xlabel('Predicted Label')
+            plt.ylabel('Class')
+            plt.xlabel('Outcome')
             plt.tight_layout()
             plt.savefig(os.path.join(output_dir, f'confusion_matrix_{name.lower().replace(" ", "_")}.png'))
             plt.close()
@@ -368,6 +497,8 @@ class ModelEvaluator:
         report.append(f"- **Best Performing Model**: {best_model}")
         report.append(f"- **F1 Score**: {results[best_model]['f1_score']:.4f}")
         report.append(f"- **Training Time**: {results[best_model]['training_time']:.2f} seconds")
+        report.append(f"- **Epochs Saved by Early Stopping**: "
+                      f"{sum(metrics.get('epochs_saved', 0) for metrics in results.values())} across all models")
         
         # Add model-specific insights
         report.append("\n## Model-Specific Insights\n")
@@ -375,6 +506,9 @@ class ModelEvaluator:
             report.append(f"\n### {name}\n")
             report.append(f"- F1 Score: {metrics['f1_score']:.4f}")
             report.append(f"- Training Time: {metrics['training_time']:.2f} seconds")
+            if 'epochs_run' in metrics:
+                report.append(f"- Epochs Run: {metrics['epochs_run']} (best at epoch {metrics['best_epoch']}, "
+                              f"{metrics['epochs_saved']} epochs saved by early stopping)")
             report.append(f"- Confusion Matrix: See visualization in `confusion_matrix_{name.lower().replace(' ', '_')}.png`")
         
         # Save report
@@ -384,16 +518,23 @@ class ModelEvaluator:
 def main():
     """
     Main evaluation pipeline with proper error handling.
+    
+    COMPARE_STAGE selects how the candidates are run: 'all' (default)
+    trains them in parallel worker processes and writes the report; as a
+    Slurm array, 'train' trains the candidate of this array task and saves
+    its results, and a final 'report' task gathers them into the report.
     """
     try:
         logger.info("Starting model evaluation pipeline...")
+        stage = os.getenv('COMPARE_STAGE', 'all')
+        output_dir = os.getenv('EVALUATION_DIR', 'evaluation')
         
         # Set device
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Using device: {device}")
         
         # Load data
-        X, y = evaluator.load_data()
+        X, y = ModelEvaluator.load_data(os.getenv('COMPARE_DATA_DIR', 'data/raw'))
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
@@ -405,14 +546,31 @@ def main():
         logger.info(f"Number of classes: {num_classes}")
         
         # Initialize evaluator
-        evaluator = ModelEvaluator(X_train.shape[1], num_classes, device)
+        evaluator = ModelEvaluator(
+            X_train.shape[1], num_classes, device,
+            max_epochs=int(os.getenv('MAX_EPOCHS', '50')),
+            patience=int(os.getenv('EARLY_STOPPING_PATIENCE', '8')),
+            checkpoint_dir=os.getenv('COMPARE_CHECKPOINT_DIR')
+        )
+        names = list(evaluator.models)
         
         # Train and evaluate models
-        results = evaluator.train_and_evaluate(X_train, X_test, y_train, y_test)
+        if stage == 'train':
+            task_id = int(os.getenv('SLURM_ARRAY_TASK_ID', '0')) - int(os.getenv('SLURM_ARRAY_TASK_MIN', '0'))
+            name = names[task_id]
+            save_result(output_dir, name, evaluator.train_model(name, X_train, X_test, y_train, y_test))
+            logger.info(f"Saved results of {name} to {result_path(output_dir, name)}")
+            return
+        if stage == 'report':
+            results = gather_results(output_dir, names)
+        else:
+            max_workers = os.getenv('COMPARE_WORKERS')
+            results = evaluator.train_and_evaluate(X_train, X_test, y_train, y_test,
+                                                   max_workers=int(max_workers) if max_workers else None)
         
         # Generate visualizations and report
-        evaluator.plot_results(results)
-        evaluator.generate_report(results)
+        evaluator.plot_results(results, output_dir)
+        evaluator.generate_report(results, output_dir)
         
         logger.info("Evaluation pipeline completed successfully")
         
@@ -421,4 +579,4 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
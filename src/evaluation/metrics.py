@@ -0,0 +1,144 @@
+"""
+Streaming Multi-Label Classification Metrics
+
+Per-class true positive, false positive and false negative counts are
+accumulated on the model's device batch by batch, so evaluation never
+copies predictions back to the host or keeps them in Python lists. At the
+end of an epoch precision, recall and F1 (macro, micro and support-weighted
+averages), exact-match accuracy and per-class confusion matrices are
+derived from the counts in O(num_classes).
+"""
+
+import math
+import numpy as np
+import torch
+from typing import Dict
+
+from src.training.distributed import all_reduce_sum
+
+AVERAGES = ('macro', 'micro', 'weighted')
+
+def _safe_divide(numerator: torch.Tensor, denominator: torch.Tensor) -> torch.Tensor:
+    """Elementwise division that is 0 where the denominator is 0, like sklearn's zero_division=0."""
+    return torch.where(denominator > 0, numerator / denominator.clamp(min=1), torch.zeros_like(numerator))
+
+def _rates(tp: torch.Tensor, fp: torch.Tensor, fn: torch.Tensor) -> Dict[str, torch.Tensor]:
+    """Precision, recall and F1 from (per-class or pooled) counts."""
+    return {
+        'precision': _safe_divide(tp, tp + fp),
+        'recall': _safe_divide(tp, tp + fn),
+        'f1': _safe_divide(2 * tp, 2 * tp + fp + fn)
+    }
+
+class MultiLabelMetrics:
+    """
+    Accumulate multi-label classification counts on-device.
+
+    Targets may be multi-hot (N, num_classes) or, for single-label tasks,
+    class indices (N,); the latter are scored on the argmax prediction.
+    """
+
+    def __init__(self, num_classes: int, threshold: float = 0.5, device: str = 'cpu'):
+        """
+        Initialize the accumulator.
+
+        Args:
+            num_classes: Number of label classes
+            threshold: Probability above which a class is predicted
+            device: Device the counts are kept on (the device of the model outputs)
+        """
+        self.num_classes = num_classes
+        self.threshold = threshold
+        # Thresholding logits avoids a sigmoid per batch
+        self.logit_threshold = math.log(threshold / (1 - threshold))
+        self.device = device
+        self.reset()
+
+    def reset(self):
+        """Zero the counts."""
+        # Rows: true positives, false positives, false negatives
+        self.counts = torch.zeros((3, self.num_classes), dtype=torch.long, device=self.device)
+        # Exact matches, samples
+        self.totals = torch.zeros(2, dtype=torch.long, device=self.device)
+
+    @torch.no_grad()
+    def update(self, output: torch.Tensor, target: torch.Tensor):
+        """
+        Add a batch.
+
+        Args:
+            output: Logits of shape (N, num_classes)
+            target: Multi-hot targets (N, num_classes) or class indices (N,)
+        """
+        if target.dim() == 1:
+            predicted = torch.zeros_like(output, dtype=torch.bool)
+            predicted.scatter_(1, output.argmax(dim=1, keepdim=True), True)
+            target = torch.nn.functional.one_hot(target.long(), self.num_classes).bool()
+        else:
+            predicted = output > self.logit_threshold
+            target = target.bool()
+
+        self.counts[0] += (predicted & target).sum(dim=0)
+        self.counts[1] += (predicted & ~target).sum(dim=0)
+        self.counts[2] += (~predicted & target).sum(dim=0)
+        self.totals[0] += (predicted == target).all(dim=1).sum()
+        self.totals[1] += target.size(0)
+
+    def all_reduce(self):
+        """Sum the counts of all distributed replicas (a no-op without a process group)."""
+        reduced = all_reduce_sum(torch.cat([self.counts.flatten(), self.totals]))
+        self.counts = reduced[:-2].view(3, self.num_classes)
+        self.totals = reduced[-2:]
+
+    def compute(self) -> Dict[str, float]:
+        """
+        Derive the metrics from the counts.
+
+        Returns:
+            Exact-match accuracy and precision, recall and F1 under each of
+            the macro, micro and weighted averages, e.g. 'f1_macro'
+        """
+        counts = self.counts.double()
+        tp, fp, fn = counts
+        per_class = _rates(tp, fp, fn)
+        micro = _rates(*counts.sum(dim=1))
+        support = tp + fn
+        weights = _safe_divide(support, support.sum())
+
+        # One device-to-host transfer for all metrics
+        averaged = {
+            'macro': [v.mean() for v in per_class.values()],
+            'micro': list(micro.values()),
+            'weighted': [(v * weights).sum() for v in per_class.values()]
+        }
+        values = torch.stack([self.totals[0].double() / self.totals[1].clamp(min=1)]
+                             + [v for average in AVERAGES for v in averaged[average]]).tolist()
+
+        metrics = {'accuracy': values[0]}
+        for i, average in enumerate(AVERAGES):
+            for j, name in enumerate(per_class):
+                metrics[f'{name}_{average}'] = values[1 + 3 * i + j]
+        return metrics
+
+    def per_class(self) -> Dict[str, np.ndarray]:
+        """
+        Per-class precision, recall, F1 and support.
+
+        Returns:
+            Dictionary of (num_classes,) arrays
+        """
+        tp, fp, fn = self.counts.double()
+        rates = {name: v.cpu().numpy() for name, v in _rates(tp, fp, fn).items()}
+        rates['support'] = self.counts[0].add(self.counts[2]).cpu().numpy()
+        return rates
+
+    def confusion_matrices(self) -> np.ndarray:
+        """
+        Per-class binary confusion matrices, laid out like sklearn's multilabel_confusion_matrix.
+
+        Returns:
+            Array of shape (num_classes, 2, 2) with [[TN, FP], [FN, TP]] per class
+        """
+        tp, fp, fn = self.counts.cpu().numpy()
+        tn = int(self.totals[1]) - tp - fp - fn
+        return np.stack([tn, fp, fn, tp], axis=1).reshape(-1, 2, 2)
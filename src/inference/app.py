@@ -2,20 +2,22 @@
 Streamlit Interface for Protein Atlas Classification
 
 This module provides a web interface for model inference using Streamlit.
+It is a thin client: predictions are served by the batching inference
+server in src/inference/server.py.
 """
 
+import io
 import os
+import requests
 import streamlit as st
 import numpy as np
 import cv2
 from PIL import Image
 import plotly.express as px
-from typing import Tuple, List
+from typing import Dict, Tuple, List
 import mlflow
 from pathlib import Path
 
-from src.inference.inference import ModelInference
-
 # Set page config
 st.set_page_config(
     page_title="Protein Atlas Classifier",
@@ -23,26 +25,35 @@ st.set_page_config(
     layout="wide"
 )
 
+# Address of the inference server
+INFERENCE_URL = os.getenv('INFERENCE_URL', 'http://localhost:8080')
+
 # Initialize session state
-if 'model' not in st.session_state:
-    st.session_state.model = None
 if 'predictions' not in st.session_state:
     st.session_state.predictions = None
 
-def load_model() -> ModelInference:
-    """Load the model for inference."""
-    if st.session_state.model is None:
-        model_name = os.getenv('MODEL_NAME', 'lightweight')
-        num_classes = int(os.getenv('NUM_CLASSES', '28'))
-        model_path = os.getenv('MODEL_PATH')
-        
-        st.session_state.model = ModelInference(
-            model_name=model_name,
-            num_classes=num_classes,
-            model_path=model_path
-        )
+def get_model_info() -> Dict:
+    """Fetch the model name, number of classes and device from the inference server."""
+    response = requests.get(f"{INFERENCE_URL}/info", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def predict(image_array: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Send an image to the inference server.
     
-    return st.session_state.model
+    Args:
+        image_array: Image of shape (H, W, C)
+        
+    Returns:
+        Tuple of (most likely class per image, per-class probabilities)
+    """
+    buffer = io.BytesIO()
+    np.save(buffer, image_array)
+    response = requests.post(f"{INFERENCE_URL}/predict", data=buffer.getvalue(), timeout=60)
+    response.raise_for_status()
+    result = response.json()
+    return np.array(result['predicted_class']), np.array(result['probabilities'])
 
 def process_image(image: Image.Image) -> np.ndarray:
     """
@@ -103,10 +114,13 @@ def main():
     # Sidebar
     with st.sidebar:
         st.header("Model Information")
-        model = load_model()
-        st.write(f"Model: {model.model_name}")
-        st.write(f"Number of classes: {model.num_classes}")
-        st.write(f"Device: {model.device}")
+        try:
+            info = get_model_info()
+            st.write(f"Model: {info['model_name']}")
+            st.write(f"Number of classes: {info['num_classes']}")
+            st.write(f"Device: {info['device']}")
+        except requests.RequestException as e:
+            st.error(f"Inference server unavailable at {INFERENCE_URL}: {str(e)}")
         
         # MLflow experiment viewer
         st.header("MLflow Experiments")
@@ -139,7 +153,7 @@ def main():
             # Make prediction
             if st.button("Classify"):
                 with st.spinner("Processing..."):
-                    predicted_class, probabilities = model.predict(image_array)
+                    predicted_class, probabilities = predict(image_array)
                     
                     # Store predictions in session state
                     st.session_state.predictions = {
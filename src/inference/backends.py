@@ -0,0 +1,107 @@
+"""
+Inference Backends
+
+A backend maps a preprocessed input batch to logits. The eager backend
+runs the PyTorch module as-is; the TorchScript backend runs the frozen
+graph exported by src.models.export; the ONNX Runtime backend runs the
+ONNX export with all graph optimizations enabled, which is the fastest
+fp32 option on CPU-only nodes; the int8 backend runs the statically
+quantized TorchScript model from src.models.quantization on CPU. The
+backend is chosen per deployment with the INFERENCE_BACKEND environment
+variable.
+"""
+
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('eager', 'torchscript', 'onnx', 'int8')
+
+class EagerBackend:
+    """Run the PyTorch module directly."""
+
+    def __init__(self, model: nn.Module):
+        self.model = model
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.model(batch)
+
+class TorchScriptBackend:
+    """Run a frozen TorchScript module."""
+
+    def __init__(self, path: str, device: str = 'cpu'):
+        """
+        Load the TorchScript module.
+
+        Args:
+            path: File written by export_torchscript
+            device: Device to run on
+        """
+        self.device = device
+        self.module = torch.jit.load(str(path), map_location=device)
+        self.module.eval()
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.module(batch.to(self.device))
+
+class OnnxRuntimeBackend:
+    """Run an ONNX model on the ONNX Runtime CPU execution provider."""
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        """
+        Create an inference session with all graph optimizations enabled.
+
+        Args:
+            path: File written by export_onnx
+            num_threads: Intra-op threads (default: ONNX Runtime's choice)
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The 'onnx' inference backend requires the onnxruntime package")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        inputs = batch.detach().cpu().numpy().astype(np.float32, copy=False)
+        logits, = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(logits)
+
+def create_backend(name: str,
+                   model: nn.Module,
+                   artifact_path: Optional[str] = None,
+                   device: str = 'cpu'):
+    """
+    Create an inference backend.
+
+    Args:
+        name: 'eager', 'torchscript', 'onnx' or 'int8'
+        model: Eager model, used by the eager backend
+        artifact_path: Exported model, used by the other backends
+        device: Device to run on (the ONNX and INT8 backends always run on CPU)
+
+    Returns:
+        Callable mapping an input batch to logits
+    """
+    if name == 'eager':
+        return EagerBackend(model)
+    if name == 'torchscript':
+        return TorchScriptBackend(artifact_path, device=device)
+    if name == 'int8':
+        return TorchScriptBackend(artifact_path, device='cpu')
+    if name == 'onnx':
+        threads = os.getenv('ONNX_NUM_THREADS')
+        return OnnxRuntimeBackend(artifact_path, num_threads=int(threads) if threads else None)
+    raise ValueError(f"Unknown inference backend: {name} (expected one of {BACKENDS})")
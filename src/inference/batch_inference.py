@@ -0,0 +1,160 @@
+"""
+Batch Inference Over Sharded Datasets
+
+Scores a sharded, memory-mapped dataset split shard by shard. Each input
+shard is read lazily through a prefetching DataLoader, scored in large
+batches, and its probabilities are written incrementally into a matching
+output shard:
+
+    <output_dir>/
+        predictions_00000.npy   # (num_samples, num_classes) float32
+        predictions_00001.npy
+        ...
+
+An output shard only appears once it is complete (it is written under a
+temporary name and renamed), so a rerun skips finished shards and resumes
+at the first missing one. Shards can also be split across the tasks of a
+Slurm job array, so millions of samples are scored in bounded memory.
+"""
+
+import os
+import numpy as np
+from torch.utils.data import DataLoader, Subset
+from pathlib import Path
+from typing import Iterator, List, Optional
+import logging
+
+from src.data.sharded_dataset import ShardedDataset
+from src.inference.inference import ModelInference
+from src.inference.registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+def output_shard_path(output_dir: str, shard_idx: int) -> Path:
+    """Path of the predictions for an input shard."""
+    return Path(output_dir) / f'predictions_{shard_idx:05d}.npy'
+
+def assigned_shards(num_shards: int,
+                    task_id: int = 0,
+                    num_tasks: int = 1,
+                    start_shard: int = 0,
+                    end_shard: Optional[int] = None) -> List[int]:
+    """
+    Shards of [start_shard, end_shard) scored by one task of a job array.
+
+    Args:
+        num_shards: Number of input shards
+        task_id: Index of this task
+        num_tasks: Number of tasks sharing the shards round-robin
+        start_shard: First shard to consider
+        end_shard: Shard to stop before (default: all)
+
+    Returns:
+        Indices of the shards assigned to this task
+    """
+    end_shard = num_shards if end_shard is None else min(end_shard, num_shards)
+    return [i for i in range(start_shard, end_shard) if i % num_tasks == task_id]
+
+def score_shards(engine: ModelInference,
+                 split_dir: str,
+                 output_dir: str,
+                 shards: Optional[List[int]] = None,
+                 batch_size: int = 256,
+                 num_workers: int = 4) -> int:
+    """
+    Score shards of a dataset split, skipping shards already scored.
+
+    Args:
+        engine: Model used for scoring
+        split_dir: Directory of the sharded split
+        output_dir: Directory the prediction shards are written to
+        shards: Input shard indices to score (default: all)
+        batch_size: Batch size of the forward passes
+        num_workers: DataLoader worker processes prefetching batches
+
+    Returns:
+        Number of samples scored by this call
+    """
+    dataset = ShardedDataset(split_dir)
+    offsets = np.concatenate([[0], np.cumsum([s['num_samples'] for s in dataset.index['shards']])])
+    shards = range(len(dataset.index['shards'])) if shards is None else shards
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    scored = 0
+    for shard_idx in shards:
+        path = output_shard_path(output_dir, shard_idx)
+        if path.exists():
+            logger.info(f"Skipping shard {shard_idx}, already scored")
+            continue
+
+        start, end = int(offsets[shard_idx]), int(offsets[shard_idx + 1])
+        loader = DataLoader(
+            Subset(dataset, range(start, end)),
+            batch_size=batch_size,
+            num_workers=num_workers,
+            pin_memory=str(engine.device).startswith('cuda')
+        )
+
+        # Append each batch's probabilities to a memory-mapped output shard
+        tmp_path = path.with_name(path.name + '.tmp')
+        predictions = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                                shape=(end - start, engine.num_classes))
+        filled = 0
+        for images, _ in loader:
+            probabilities = engine.predict_batch(engine.normalize(images))
+            predictions[filled:filled + len(probabilities)] = probabilities
+            filled += len(probabilities)
+        predictions.flush()
+        del predictions
+        os.replace(tmp_path, path)
+
+        scored += end - start
+        logger.info(f"Scored shard {shard_idx}: {end - start} samples")
+
+    return scored
+
+def iter_predictions(output_dir: str, mmap_mode: str = 'r') -> Iterator[np.ndarray]:
+    """
+    Iterate over the prediction shards in shard order.
+
+    Args:
+        output_dir: Directory written by score_shards
+        mmap_mode: Memory-map mode
+
+    Yields:
+        Memory-mapped (num_samples, num_classes) probability arrays
+    """
+    for path in sorted(Path(output_dir).glob('predictions_*.npy')):
+        yield np.load(path, mmap_mode=mmap_mode)
+
+def main():
+    """Score a sharded split, with shards split across the tasks of a Slurm job array."""
+    logging.basicConfig(level=logging.INFO)
+    split_dir = os.getenv('INPUT_SPLIT_DIR', 'data/preprocessing/test')
+
+    engine = get_registry().get(
+        model_name=os.getenv('MODEL_NAME', 'lightweight'),
+        num_classes=int(os.getenv('NUM_CLASSES', '28')),
+        model_path=os.getenv('MODEL_PATH'),
+        backend=os.getenv('INFERENCE_BACKEND', 'eager')
+    )
+    end_shard = os.getenv('END_SHARD')
+    shards = assigned_shards(
+        len(ShardedDataset(split_dir).index['shards']),
+        task_id=int(os.getenv('SLURM_ARRAY_TASK_ID', '0')) - int(os.getenv('SLURM_ARRAY_TASK_MIN', '0')),
+        num_tasks=int(os.getenv('SLURM_ARRAY_TASK_COUNT', '1')),
+        start_shard=int(os.getenv('START_SHARD', '0')),
+        end_shard=int(end_shard) if end_shard else None
+    )
+    scored = score_shards(
+        engine,
+        split_dir,
+        os.getenv('PREDICTIONS_DIR', 'data/predictions'),
+        shards=shards,
+        batch_size=int(os.getenv('BATCH_SIZE', '256')),
+        num_workers=int(os.getenv('NUM_WORKERS', '4'))
+    )
+    logger.info(f"Scored {scored} samples in {len(shards)} assigned shards")
+
+if __name__ == "__main__":
+    main()
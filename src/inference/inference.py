@@ -1 +1,170 @@
- 
\ No newline at end of file
+"""
+Model Inference Module for Protein Atlas Classification
+
+This module loads checkpoints saved by ModelTrainer and runs predictions
+with the same input normalization that was used during training.
+"""
+
+import numpy as np
+import torch
+from typing import Optional, Tuple
+import logging
+
+from src.inference.backends import create_backend
+from src.models.export import EXPORTERS, artifact_path, export_model
+from src.models.models import create_model
+from src.utils.normalization import Normalizer
+from src.utils.preprocessing import resize_image
+
+logger = logging.getLogger(__name__)
+
+class ModelInference:
+    """
+    Run protein atlas classification on raw images.
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 num_classes: int,
+                 model_path: Optional[str] = None,
+                 device: Optional[str] = None,
+                 input_channels: int = 4,
+                 image_size: int = 224,
+                 backend: str = 'eager'):
+        """
+        Initialize the inference engine.
+
+        Args:
+            model_name: Name of the model architecture ('lightweight' or 'resnet18')
+            num_classes: Number of output classes
+            model_path: Path to a checkpoint saved by ModelTrainer.save_model
+            device: Device to run inference on ('cuda' or 'cpu')
+            input_channels: Number of input channels, if not stored in the checkpoint
+            image_size: Input image size, if not stored with the normalization statistics
+            backend: 'eager', 'torchscript' (frozen), 'onnx' (ONNX Runtime on
+                CPU) or 'int8' (quantized, CPU); missing TorchScript and ONNX
+                artifacts are exported next to the checkpoint
+        """
+        self.model_name = model_name
+        self.num_classes = num_classes
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+
+        checkpoint = {}
+        if model_path:
+            logger.info(f"Loading model from {model_path}")
+            # Memory-map the file instead of reading it into a private buffer
+            checkpoint = torch.load(model_path, map_location='cpu', mmap=True)
+
+        self.input_channels = checkpoint.get('input_channels', input_channels)
+        self.model = create_model(model_name, num_classes, input_channels=self.input_channels,
+                                  pretrained='model_state_dict' not in checkpoint)
+        if 'model_state_dict' in checkpoint:
+            self.model.load_state_dict(checkpoint['model_state_dict'])
+        self.model.eval()
+
+        # Reproduce the training-time input normalization
+        self.normalizer = None
+        if checkpoint.get('normalization'):
+            self.normalizer = Normalizer.from_dict(checkpoint['normalization']).to(self.device)
+            image_size = self.normalizer.metadata.get('image_size', image_size)
+        else:
+            logger.warning("Checkpoint has no normalization statistics, scaling pixels to [0, 1] only")
+        self.image_size = image_size
+
+        # Export the graph for the compiled backends on first use
+        self.backend_name = backend
+        artifact = None
+        if backend != 'eager':
+            if not model_path:
+                raise ValueError(f"The '{backend}' backend needs a model_path to export next to")
+            artifact = artifact_path(model_path, backend)
+            if not artifact.exists():
+                if backend not in EXPORTERS:
+                    raise FileNotFoundError(f"{artifact} not found; create it with src.models.quantization")
+                export_model(self.model, model_path, (self.input_channels, image_size, image_size), [backend])
+        self.model.to(self.device)
+        self.backend = create_backend(backend, self.model, artifact, device=self.device)
+
+    def preprocess(self, images: np.ndarray) -> torch.Tensor:
+        """
+        Convert raw images into a normalized model input batch.
+
+        Args:
+            images: Grayscale image (H, W), image (H, W, C) or batch (N, H, W, C)
+
+        Returns:
+            Tensor of shape (N, input_channels, image_size, image_size)
+        """
+        if images.ndim == 2:
+            images = images[..., np.newaxis]
+        if images.ndim == 3:
+            images = images[np.newaxis]
+        if images.shape[-1] > self.input_channels:
+            raise ValueError(f"Expected images with up to {self.input_channels} channels, "
+                             f"got shape {images.shape}")
+
+        batch = np.zeros((len(images), self.image_size, self.image_size, self.input_channels),
+                         dtype=images.dtype)
+        channels = images.shape[-1]
+        for i, image in enumerate(images):
+            image = resize_image(image, self.image_size)
+            # Missing channels (e.g. RGB uploads for an RGBY model) stay zero
+            batch[i, ..., :channels] = image.reshape(self.image_size, self.image_size, channels)
+
+        return self.normalize(torch.from_numpy(batch).permute(0, 3, 1, 2))
+
+    def normalize(self, batch: torch.Tensor) -> torch.Tensor:
+        """
+        Move a channel-first batch at the model's input size to the device and normalize it.
+
+        Args:
+            batch: Tensor of shape (N, input_channels, image_size, image_size),
+                e.g. a batch read from a sharded dataset
+
+        Returns:
+            Normalized float tensor on the device
+        """
+        batch = batch.to(self.device, non_blocking=True)
+        if self.normalizer is not None:
+            return self.normalizer(batch)
+        if batch.dtype == torch.uint8:
+            return batch.float().div_(255.0)
+        return batch.float()
+
+    def warmup(self, batch_size: int = 1):
+        """
+        Run a forward pass on a dummy batch so the first request does not pay
+        for lazy initialization (allocator, kernel selection).
+
+        Args:
+            batch_size: Size of the dummy batch
+        """
+        images = np.zeros((batch_size, self.image_size, self.image_size, self.input_channels), dtype=np.uint8)
+        self.predict_batch(self.preprocess(images))
+
+    def predict_batch(self, batch: torch.Tensor) -> np.ndarray:
+        """
+        Run one forward pass over a preprocessed batch.
+
+        Args:
+            batch: Model input from preprocess(), possibly several requests concatenated
+
+        Returns:
+            Per-class probabilities of shape (N, num_classes)
+        """
+        with torch.inference_mode():
+            return torch.sigmoid(self.backend(batch)).cpu().numpy()
+
+    def predict(self, images: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict class probabilities for one image or a batch of images.
+
+        Args:
+            images: Image of shape (H, W, C) or batch of shape (N, H, W, C)
+
+        Returns:
+            Tuple of (most likely class per image, per-class probabilities)
+        """
+        probabilities = self.predict_batch(self.preprocess(images))
+
+        return probabilities.argmax(axis=1), probabilities
@@ -8,9 +8,10 @@ import time
 import logging
 import numpy as np
 import pandas as pd
-import joblib
-from typing import Dict, Any, List
-import mlflow
+from typing import Dict, Any, Iterator, List, Optional
+
+from src.inference.registry import get_registry
+from src.utils.tracking import BufferedMLflowLogger
 
 # Configure logging
 logging.basicConfig(
@@ -24,23 +25,33 @@ class DrugDiscoveryPredictor:
     Enterprise-grade predictor class with proper error handling and monitoring.
     """
     
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, tracker: Optional[BufferedMLflowLogger] = None):
         """
         Initialize the predictor.
         Args:
             model_path: Path to the trained model
+            tracker: MLflow logger for inference metrics (default: one
+                buffered "inference" run, disabled by MLFLOW_TRACKING=false)
         """
         self.model_path = model_path
         self.model = None
+        self.tracker = tracker or BufferedMLflowLogger(
+            run_name="inference",
+            enabled=os.getenv('MLFLOW_TRACKING', 'true').lower() == 'true'
+        )
+        self.batches_served = 0
         self.load_model()
         
     def load_model(self) -> None:
         """
         Load the trained model with error handling.
+        
+        The model is loaded once per process through the model registry, so
+        further predictors for the same file reuse it.
         """
         try:
             logger.info(f"Loading model from {self.model_path}")
-            self.model = joblib.load(self.model_path)
+            self.model = get_registry().get_joblib(self.model_path)
             logger.info("Model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
@@ -91,10 +102,12 @@ class DrugDiscoveryPredictor:
             # Calculate inference time
             inference_time = time.time() - start_time
             
-            # Log metrics
-            with mlflow.start_run(run_name="inference"):
-                mlflow.log_metric("inference_time", inference_time)
-                mlflow.log_metric("batch_size", len(predictions))
+            # Log metrics (queued; written to MLflow in the background)
+            self.tracker.log_metrics({
+                "inference_time": inference_time,
+                "batch_size": len(predictions)
+            }, step=self.batches_served)
+            self.batches_served += 1
             
             return {
                 "predictions": predictions.tolist(),
@@ -107,31 +120,44 @@ class DrugDiscoveryPredictor:
             logger.error(f"Error during prediction: {str(e)}")
             raise
     
-    def batch_predict(self, input_data: np.ndarray, batch_size: int = 100) -> List[Dict[str, Any]]:
+    def iter_predict(self, input_data: np.ndarray, batch_size: int = 100) -> Iterator[Dict[str, Any]]:
         """
-        Make batch predictions with monitoring.
+        Make batch predictions lazily, one result per batch.
         Args:
-            input_data: Input features
+            input_data: Input features (may be a memory-mapped array)
             batch_size: Size of each batch
-        Returns:
-            List of prediction results
+        Yields:
+            Prediction results of each batch
         """
         try:
-            results = []
             n_samples = len(input_data)
             
             for i in range(0, n_samples, batch_size):
                 batch = input_data[i:i + batch_size]
-                batch_result = self.predict(batch)
-                results.append(batch_result)
+                yield self.predict(batch)
                 
                 logger.info(f"Processed batch {i//batch_size + 1}/{(n_samples + batch_size - 1)//batch_size}")
             
-            return results
-            
         except Exception as e:
             logger.error(f"Error during batch prediction: {str(e)}")
             raise
+    
+    def batch_predict(self, input_data: np.ndarray, batch_size: int = 100) -> List[Dict[str, Any]]:
+        """
+        Make batch predictions with monitoring.
+        Args:
+            input_data: Input features
+            batch_size: Size of each batch
+        Returns:
+            List of prediction results
+        """
+        return list(self.iter_predict(input_data, batch_size))
+    
+    def close(self) -> None:
+        """
+        Flush pending inference metrics and end the tracking run.
+        """
+        self.tracker.close()
 
 def main():
     """
@@ -150,7 +176,10 @@ def main():
         sample_data = np.random.randn(n_samples, n_features)
         
         # Make predictions
-        results = predictor.batch_predict(sample_data)
+        try:
+            results = predictor.batch_predict(sample_data)
+        finally:
+            predictor.close()
         
         # Log summary
         total_time = sum(r["inference_time"] for r in results)
@@ -0,0 +1,122 @@
+"""
+Warm Model Registry Shared Across Inference Workers
+
+Loading a checkpoint per session or per worker process repeats the disk
+(or S3) read, the deserialization and the first slow forward pass, and
+gives every worker a private copy of the weights. ModelRegistry loads each
+model once per process, moves CPU weights into shared memory and warms the
+model up. Preloading in the parent before forking workers lets all of
+them use the same physical weight pages.
+"""
+
+import os
+import threading
+import joblib
+from typing import Any, Dict, Iterable, Optional, Tuple
+import logging
+
+from src.inference.inference import ModelInference
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """
+    Process-wide cache of warm inference models.
+    """
+
+    def __init__(self, device: Optional[str] = None):
+        """
+        Initialize the registry.
+
+        Args:
+            device: Device models are placed on (default: cuda if available)
+        """
+        self.device = device
+        self._models: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self,
+            model_name: str,
+            num_classes: int,
+            model_path: Optional[str] = None,
+            **kwargs) -> ModelInference:
+        """
+        Return the warm inference engine for a checkpoint, loading it on first use.
+
+        Args:
+            model_name: Name of the model architecture
+            num_classes: Number of output classes
+            model_path: Checkpoint saved by ModelTrainer.save_model
+            **kwargs: Further ModelInference arguments
+
+        Returns:
+            Shared ModelInference instance
+        """
+        key = ('torch', model_name, num_classes, self._file_key(model_path), tuple(sorted(kwargs.items())))
+        return self._get_or_load(key, lambda: self._load_engine(model_name, num_classes, model_path, **kwargs))
+
+    def get_joblib(self, path: str) -> Any:
+        """
+        Return a joblib-serialized model, loading it on first use.
+
+        Numpy arrays are memory-mapped read-only, so processes loading the
+        same file share its pages.
+
+        Args:
+            path: Path to the joblib file
+
+        Returns:
+            The deserialized model
+        """
+        key = ('joblib', self._file_key(path))
+        return self._get_or_load(key, lambda: joblib.load(path, mmap_mode='r'))
+
+    def preload(self, specs: Iterable[Dict[str, Any]]):
+        """
+        Load models ahead of time, e.g. in a parent process before forking workers.
+
+        Args:
+            specs: get() keyword arguments, one dict per model
+        """
+        for spec in specs:
+            self.get(**spec)
+
+    def clear(self):
+        """Drop all loaded models."""
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def _get_or_load(self, key: Tuple, load) -> Any:
+        # Loading under the lock keeps concurrent first requests from loading twice
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = load()
+            return self._models[key]
+
+    def _load_engine(self, model_name: str, num_classes: int, model_path: Optional[str], **kwargs) -> ModelInference:
+        engine = ModelInference(model_name, num_classes, model_path=model_path, device=self.device, **kwargs)
+        if engine.device == 'cpu':
+            # Shared memory pages are not copied on write by forked workers
+            engine.model.share_memory()
+        engine.warmup()
+        logger.info(f"Registered warm {model_name} model from {model_path or 'random initialization'}")
+        return engine
+
+    @staticmethod
+    def _file_key(path: Optional[str]) -> Optional[Tuple]:
+        """Identify a file by path and modification time, so a replaced checkpoint is reloaded."""
+        if path is None:
+            return None
+        return (os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+_registry: Optional[ModelRegistry] = None
+
+def get_registry() -> ModelRegistry:
+    """Return the process-wide model registry."""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,412 @@
+"""
+Dynamic Micro-Batching Inference Server
+
+An asyncio HTTP server in front of ModelInference. Concurrent requests are
+queued and collected into one batch until the batch is full or the oldest
+request has waited max_wait_ms; the batch runs as a single forward pass
+and the results are scattered back to the waiting requests.
+
+Endpoints:
+    POST /predict   body: image(s) serialized with np.save; returns JSON
+                    with the most likely class and the probabilities per image
+    GET  /stats     latency percentiles and throughput counters
+    GET  /info      model name, number of classes and device
+    GET  /health    liveness probe
+
+With INFERENCE_WORKERS > 1 the model is loaded once into shared memory and
+the server forks that many worker processes accepting on one listening
+socket; the workers share the parent's weight pages instead of each
+loading a copy.
+"""
+
+import io
+import os
+import json
+import time
+import signal
+import socket
+import asyncio
+import numpy as np
+import torch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from src.inference.inference import ModelInference
+from src.inference.registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024 ** 2
+
+class LatencyStats:
+    """
+    Request latency percentiles and throughput counters.
+
+    Percentiles are computed over a sliding window of recent requests so
+    the memory use stays bounded on a long-running server.
+    """
+
+    def __init__(self, window: int = 10000):
+        """
+        Initialize the counters.
+
+        Args:
+            window: Number of most recent request latencies kept
+        """
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.samples = 0
+        self.batches = 0
+        self.start_time = time.perf_counter()
+
+    def record_batch(self, num_samples: int):
+        """Count one forward pass over num_samples samples."""
+        self.batches += 1
+        self.samples += num_samples
+
+    def record_request(self, latency: float):
+        """Count one completed request and its latency in seconds."""
+        self.requests += 1
+        self.latencies.append(latency)
+
+    def summary(self) -> Dict[str, float]:
+        """Latency percentiles (ms) and throughput since start."""
+        elapsed = time.perf_counter() - self.start_time
+        latencies = np.asarray(self.latencies) * 1000.0
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'samples': self.samples,
+            'mean_batch_size': self.samples / self.batches if self.batches else 0.0,
+            'p50_latency_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            'p99_latency_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            'requests_per_sec': self.requests / elapsed if elapsed > 0 else 0.0,
+            'samples_per_sec': self.samples / elapsed if elapsed > 0 else 0.0
+        }
+
+class DynamicBatcher:
+    """
+    Collect concurrent requests into batches for one forward pass each.
+
+    Each request is validated and preprocessed on its own, on a small
+    preprocessing pool, before it is queued, so a malformed request fails
+    alone instead of failing the batch it would have joined. The forward
+    passes run on a single worker thread, so the event loop keeps accepting
+    requests while a batch is computed.
+    """
+
+    def __init__(self,
+                 engine: ModelInference,
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0,
+                 preprocess_workers: int = 2):
+        """
+        Initialize the batcher.
+
+        Args:
+            engine: Model used for the forward passes
+            max_batch_size: Maximum number of images per forward pass
+            max_wait_ms: Maximum time the first request of a batch waits for more
+            preprocess_workers: Threads validating and preprocessing requests
+        """
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = LatencyStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self._preprocess_executor = ThreadPoolExecutor(max_workers=preprocess_workers,
+                                                       thread_name_prefix='preprocess')
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown()
+        self._preprocess_executor.shutdown()
+
+    async def submit(self, images: np.ndarray) -> np.ndarray:
+        """
+        Queue images for the next batch and wait for their probabilities.
+
+        Args:
+            images: Image of shape (H, W, C) or batch of shape (N, H, W, C)
+
+        Returns:
+            Per-class probabilities of shape (N, num_classes)
+
+        Raises:
+            ValueError: If the images cannot be preprocessed for the model
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        inputs = await loop.run_in_executor(self._preprocess_executor, self._preprocess, images)
+        future = loop.create_future()
+        await self._queue.put((inputs, future))
+        probabilities = await future
+        self.stats.record_request(time.perf_counter() - start)
+        return probabilities
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            num_images = len(requests[0][0])
+            deadline = loop.time() + self.max_wait
+
+            # Gather more requests until the batch is full or the first one has waited long enough
+            while num_images < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                num_images += len(request[0])
+
+            try:
+                results = await loop.run_in_executor(self._executor, self._forward,
+                                                     [inputs for inputs, _ in requests])
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), probabilities in zip(requests, results):
+                if not future.done():
+                    future.set_result(probabilities)
+
+    def _preprocess(self, images: np.ndarray) -> torch.Tensor:
+        """Validate one request and turn it into a float32 model input of its own."""
+        if not isinstance(images, np.ndarray) or images.ndim not in (2, 3, 4) or images.size == 0:
+            raise ValueError(f"Expected an image (H, W[, C]) or a batch (N, H, W, C), "
+                             f"got shape {getattr(images, 'shape', None)}")
+        if not (np.issubdtype(images.dtype, np.number) or images.dtype == np.bool_):
+            raise ValueError(f"Expected numeric pixels, got dtype {images.dtype}")
+        try:
+            inputs = self.engine.preprocess(images)
+        except Exception as e:
+            raise ValueError(f"Could not preprocess images of shape {images.shape}: {e}") from e
+        # Inputs of every request must concatenate into one batch of the model's dtype
+        return inputs.to(torch.float32)
+
+    def _forward(self, inputs: List[torch.Tensor]) -> List[np.ndarray]:
+        sizes = [len(batch) for batch in inputs]
+        probabilities = self.engine.predict_batch(torch.cat(inputs))
+        self.stats.record_batch(len(probabilities))
+        return np.split(probabilities, np.cumsum(sizes)[:-1])
+
+class InferenceServer:
+    """
+    Minimal asyncio HTTP/1.1 server exposing a DynamicBatcher.
+    """
+
+    def __init__(self,
+                 batcher: DynamicBatcher,
+                 host: str = '0.0.0.0',
+                 port: int = 8080,
+                 sock: Optional[socket.socket] = None):
+        """
+        Initialize the server.
+
+        Args:
+            batcher: Batcher serving the predictions
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            sock: Already listening socket to accept on instead, e.g. one
+                shared by pre-forked workers
+        """
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self.sock = sock
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """Start the batcher and begin accepting connections."""
+        self.batcher.start()
+        if self.sock is not None:
+            self._server = await asyncio.start_server(self._handle, sock=self.sock)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Inference server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """Stop accepting connections and stop the batcher."""
+        self._server.close()
+        await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        """Start the server and serve until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await self._read_request(reader)
+            status, payload = await self._route(method, path, body)
+        except ValueError as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception as e:
+            logger.error(f"Error handling request: {str(e)}")
+            status, payload = 500, {'error': str(e)}
+
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            raise ValueError("Malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', '0'))
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body exceeds {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return request_line[0].upper(), request_line[1], body
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        if method == 'POST' and path == '/predict':
+            images = np.load(io.BytesIO(body), allow_pickle=False)
+            probabilities = await self.batcher.submit(images)
+            return 200, {
+                'predicted_class': probabilities.argmax(axis=1).tolist(),
+                'probabilities': probabilities.tolist()
+            }
+        if method == 'GET' and path == '/stats':
+            return 200, self.batcher.stats.summary()
+        if method == 'GET' and path == '/info':
+            engine = self.batcher.engine
+            return 200, {'model_name': engine.model_name, 'num_classes': engine.num_classes,
+                         'device': str(engine.device)}
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        return 404, {'error': f"No route for {method} {path}"}
+
+def listen_socket(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    """Create a non-blocking listening TCP socket."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+def serve_prefork(engine: ModelInference,
+                  num_workers: int,
+                  host: str = '0.0.0.0',
+                  port: int = 8080,
+                  **batcher_kwargs):
+    """
+    Serve from forked worker processes sharing one loaded model and one listening socket.
+
+    The engine must be loaded (and its CPU weights moved to shared memory,
+    as ModelRegistry does) before calling, so every worker uses the parent's
+    weight pages. Each worker runs its own batcher and event loop.
+
+    Args:
+        engine: Warm CPU inference engine
+        num_workers: Number of worker processes
+        host: Interface to listen on
+        port: Port to listen on
+        **batcher_kwargs: DynamicBatcher arguments
+    """
+    if engine.device != 'cpu':
+        raise ValueError("Pre-fork workers need a CPU model; CUDA cannot be used across fork()")
+    sock = listen_socket(host, port)
+    num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+    pids = []
+    for _ in range(num_workers):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                torch.set_num_threads(num_threads)
+                server = InferenceServer(DynamicBatcher(engine, **batcher_kwargs), sock=sock)
+                asyncio.run(server.serve_forever())
+            except KeyboardInterrupt:
+                pass
+            except Exception:
+                logger.exception("Inference worker failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        pids.append(pid)
+    logger.info(f"Started {num_workers} inference workers on {host}:{port}")
+
+    def stop(signum, frame):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+def main():
+    """Main function to run the inference server."""
+    logging.basicConfig(level=logging.INFO)
+    spec = {
+        'model_name': os.getenv('MODEL_NAME', 'lightweight'),
+        'num_classes': int(os.getenv('NUM_CLASSES', '28')),
+        'model_path': os.getenv('MODEL_PATH'),
+        'backend': os.getenv('INFERENCE_BACKEND', 'eager')
+    }
+    batcher_kwargs = {
+        'max_batch_size': int(os.getenv('MAX_BATCH_SIZE', '32')),
+        'max_wait_ms': float(os.getenv('MAX_WAIT_MS', '5'))
+    }
+    port = int(os.getenv('INFERENCE_PORT', '8080'))
+    num_workers = int(os.getenv('INFERENCE_WORKERS', '1'))
+
+    # Load (and warm up) the model once, before any worker is forked
+    registry = get_registry()
+    registry.preload([spec])
+    engine = registry.get(**spec)
+
+    if num_workers > 1:
+        serve_prefork(engine, num_workers, port=port, **batcher_kwargs)
+        return
+    server = InferenceServer(DynamicBatcher(engine, **batcher_kwargs), port=port)
+    asyncio.run(server.serve_forever())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Export Trained Models for Deployment
+
+This module converts checkpoints saved by ModelTrainer.save_model into
+TorchScript (traced and frozen) and ONNX artifacts, written next to the
+checkpoint:
+
+    models/
+        lightweight_20240101_120000.pt        # training checkpoint
+        lightweight_20240101_120000.ts        # frozen TorchScript
+        lightweight_20240101_120000.onnx      # ONNX, dynamic batch size
+        lightweight_20240101_120000.int8.ts   # INT8 TorchScript (src.models.quantization)
+"""
+
+import sys
+import torch
+import torch.nn as nn
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+import logging
+
+from src.models.models import create_model
+
+logger = logging.getLogger(__name__)
+
+# Export format -> artifact file suffix
+EXPORT_SUFFIXES = {'torchscript': '.ts', 'onnx': '.onnx', 'int8': '.int8.ts'}
+
+ONNX_OPSET = 17
+
+def artifact_path(checkpoint_path: str, export_format: str) -> Path:
+    """
+    Path of the artifact exported from a checkpoint.
+
+    Args:
+        checkpoint_path: Path to the training checkpoint
+        export_format: 'torchscript', 'onnx' or 'int8'
+
+    Returns:
+        Artifact path next to the checkpoint
+    """
+    if export_format not in EXPORT_SUFFIXES:
+        raise ValueError(f"Unknown export format: {export_format}")
+    return Path(checkpoint_path).with_suffix(EXPORT_SUFFIXES[export_format])
+
+def export_torchscript(model: nn.Module, example: torch.Tensor, path: str):
+    """
+    Trace, freeze and save a model as TorchScript.
+
+    Freezing inlines the weights as constants, which lets the JIT fold
+    batch norms into convolutions and drop training-only code.
+
+    Args:
+        model: Model in eval mode
+        example: Example input batch
+        path: Output file
+    """
+    with torch.no_grad():
+        traced = torch.jit.trace(model.eval(), example)
+        frozen = torch.jit.freeze(traced)
+    torch.jit.save(frozen, str(path))
+    logger.info(f"Exported TorchScript model to {path}")
+
+def export_onnx(model: nn.Module, example: torch.Tensor, path: str):
+    """
+    Save a model as ONNX with a dynamic batch dimension.
+
+    Args:
+        model: Model in eval mode
+        example: Example input batch
+        path: Output file
+    """
+    with torch.no_grad():
+        torch.onnx.export(
+            model.eval(),
+            example,
+            str(path),
+            input_names=['input'],
+            output_names=['logits'],
+            dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=ONNX_OPSET,
+            dynamo=False
+        )
+    logger.info(f"Exported ONNX model to {path}")
+
+EXPORTERS = {'torchscript': export_torchscript, 'onnx': export_onnx}
+
+def export_model(model: nn.Module,
+                 checkpoint_path: str,
+                 input_shape: Tuple[int, int, int],
+                 formats: Iterable[str] = ('torchscript', 'onnx')) -> Dict[str, Path]:
+    """
+    Export a model to the artifacts belonging to its checkpoint.
+
+    Args:
+        model: Model loaded from the checkpoint
+        checkpoint_path: Path to the training checkpoint
+        input_shape: Shape of one input sample (channels, height, width)
+        formats: Export formats
+
+    Returns:
+        Artifact path per format
+    """
+    model = model.cpu().eval()
+    example = torch.zeros(1, *input_shape)
+    paths = {}
+    for export_format in formats:
+        paths[export_format] = artifact_path(checkpoint_path, export_format)
+        EXPORTERS[export_format](model, example, paths[export_format])
+    return paths
+
+def export_checkpoint(checkpoint_path: str,
+                      formats: Iterable[str] = ('torchscript', 'onnx'),
+                      image_size: int = 224) -> Dict[str, Path]:
+    """
+    Export a checkpoint saved by ModelTrainer.save_model.
+
+    Args:
+        checkpoint_path: Path to the training checkpoint
+        formats: Export formats
+        image_size: Input image size, if not stored with the normalization statistics
+
+    Returns:
+        Artifact path per format
+    """
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    model = create_model(checkpoint['model_name'], checkpoint['num_classes'],
+                         input_channels=checkpoint['input_channels'], pretrained=False)
+    model.load_state_dict(checkpoint['model_state_dict'])
+
+    if checkpoint.get('normalization'):
+        image_size = checkpoint['normalization'].get('image_size', image_size)
+
+    return export_model(model, checkpoint_path, (checkpoint['input_channels'], image_size, image_size), formats)
+
+def main():
+    """Export the checkpoints given on the command line to TorchScript and ONNX."""
+    logging.basicConfig(level=logging.INFO)
+    for checkpoint_path in sys.argv[1:]:
+        export_checkpoint(checkpoint_path)
+
+if __name__ == "__main__":
+    main()
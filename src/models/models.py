@@ -26,7 +26,8 @@ class LightweightCNN(nn.Module):
         
         Args:
             num_classes: Number of output classes
-            input_channels: Number of input channels (default: 3 for RGB)
+            input_channels: Number of input channels (3 for RGB, 4 for the
+                red/green/blue/yellow HPA stains)
             dropout_rate: Dropout rate for regularization
         """
         super(LightweightCNN, self).__init__()
@@ -106,13 +107,16 @@ class LightweightCNN(nn.Module):
         
         return x
 
-def get_resnet18(num_classes: int, pretrained: bool = True) -> nn.Module:
+def get_resnet18(num_classes: int,
+                 pretrained: bool = True,
+                 input_channels: int = 3) -> nn.Module:
     """
     Get a ResNet18 model with modified final layer for protein atlas classification.
     
     Args:
         num_classes: Number of output classes
         pretrained: Whether to use pretrained weights
+        input_channels: Number of input channels
         
     Returns:
         Modified ResNet18 model
@@ -120,6 +124,22 @@ def get_resnet18(num_classes: int, pretrained: bool = True) -> nn.Module:
     # Load pretrained ResNet18
     model = models.resnet18(pretrained=pretrained)
     
+    # Adapt the stem to the number of input channels
+    if input_channels != 3:
+        rgb_conv = model.conv1
+        model.conv1 = nn.Conv2d(input_channels, rgb_conv.out_channels,
+                                kernel_size=rgb_conv.kernel_size,
+                                stride=rgb_conv.stride,
+                                padding=rgb_conv.padding,
+                                bias=False)
+        if pretrained:
+            # Reuse the RGB filters and initialize extra channels with their mean
+            with torch.no_grad():
+                n = min(input_channels, 3)
+                model.conv1.weight[:, :n] = rgb_conv.weight[:, :n]
+                if input_channels > 3:
+                    model.conv1.weight[:, 3:] = rgb_conv.weight.mean(dim=1, keepdim=True)
+    
     # Modify the final layer
     num_features = model.fc.in_features
     model.fc = nn.Sequential(
@@ -131,7 +151,8 @@ def get_resnet18(num_classes: int, pretrained: bool = True) -> nn.Module:
 
 def create_model(model_name: str, 
                 num_classes: int,
-                input_channels: int = 3) -> nn.Module:
+                input_channels: int = 3,
+                pretrained: bool = True) -> nn.Module:
     """
     Create a model instance based on the specified name.
     
@@ -139,6 +160,8 @@ def create_model(model_name: str,
         model_name: Name of the model to create ('lightweight' or 'resnet18')
         num_classes: Number of output classes
         input_channels: Number of input channels
+        pretrained: Start ResNet18 from ImageNet weights; pass False when a
+            checkpoint is loaded right after, so no weights are downloaded
         
     Returns:
         Model instance
@@ -149,6 +172,6 @@ def create_model(model_name: str,
             input_channels=input_channels
         )
     elif model_name.lower() == 'resnet18':
-        return get_resnet18(num_classes=num_classes)
+        return get_resnet18(num_classes=num_classes, pretrained=pretrained, input_channels=input_channels)
     else:
         raise ValueError(f"Unknown model name: {model_name}") 
\ No newline at end of file
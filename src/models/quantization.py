@@ -0,0 +1,260 @@
+"""
+Post-Training INT8 Quantization
+
+Static quantization for CPU inference nodes. The model is fused
+(conv + batch norm + ReLU), observers are calibrated on a sample of the
+preprocessed dataset, and the result is converted to INT8 kernels of the
+x86/fbgemm backend. FX graph mode is used so the residual additions in
+ResNet18 are quantized. ResNets are fused explicitly in eager mode first:
+torchvision's BasicBlock applies one ReLU module twice, which FX fusion
+handles differently across torch versions, so each use gets its own ReLU.
+
+The quantized model is saved as TorchScript next to its checkpoint
+(``<name>.int8.ts``) together with an accuracy report (``<name>.int8.json``)
+comparing it against the fp32 model.
+"""
+
+import io
+import os
+import copy
+import json
+import time
+import torch
+import torch.nn as nn
+from torch.ao.quantization import fuse_modules, get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, fuse_fx, prepare_fx
+from torch.utils.data import DataLoader, Subset
+from torchvision.models.resnet import BasicBlock, ResNet
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import logging
+
+from src.data.sharded_dataset import ShardedDataset
+from src.models.export import artifact_path
+from src.models.models import create_model
+from src.utils.normalization import Normalizer
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_BACKENDS = ('x86', 'fbgemm')
+
+class _FusableBasicBlock(nn.Module):
+    """A torchvision BasicBlock with a separate ReLU module for each use."""
+
+    def __init__(self, block: BasicBlock):
+        super().__init__()
+        self.conv1 = block.conv1
+        self.bn1 = block.bn1
+        self.relu1 = nn.ReLU()
+        self.conv2 = block.conv2
+        self.bn2 = block.bn2
+        self.downsample = block.downsample
+        self.relu2 = nn.ReLU()
+        # New modules start in training mode; fusion needs the block's mode throughout
+        self.train(block.training)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        identity = x if self.downsample is None else self.downsample(x)
+        out = self.relu1(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        return self.relu2(out + identity)
+
+def fuse_resnet(model: ResNet) -> nn.Module:
+    """
+    Fuse the conv + batch norm (+ ReLU) groups of an eval-mode torchvision ResNet.
+
+    Args:
+        model: ResNet built from BasicBlocks (modified in place)
+
+    Returns:
+        The fused model
+    """
+    groups = [['conv1', 'bn1', 'relu']]
+    for layer_name in ('layer1', 'layer2', 'layer3', 'layer4'):
+        layer = getattr(model, layer_name)
+        for i, block in enumerate(layer):
+            if not isinstance(block, BasicBlock):
+                raise ValueError(f"Unsupported ResNet block: {type(block).__name__}")
+            layer[i] = _FusableBasicBlock(block)
+            prefix = f'{layer_name}.{i}'
+            groups.append([f'{prefix}.conv1', f'{prefix}.bn1', f'{prefix}.relu1'])
+            groups.append([f'{prefix}.conv2', f'{prefix}.bn2'])
+            if block.downsample is not None:
+                groups.append([f'{prefix}.downsample.0', f'{prefix}.downsample.1'])
+    return fuse_modules(model, groups)
+
+def quantize_model(model: nn.Module,
+                   calibration_loader: DataLoader,
+                   prepare_batch: Callable[[torch.Tensor], torch.Tensor],
+                   backend: str = 'x86',
+                   num_batches: int = 32) -> nn.Module:
+    """
+    Statically quantize a model to INT8.
+
+    Args:
+        model: fp32 model (left unchanged)
+        calibration_loader: Loader yielding (images, labels) batches
+        prepare_batch: Turns a loader batch into a normalized float model input
+        backend: Quantized engine ('x86' or 'fbgemm')
+        num_batches: Number of batches used to calibrate the observers
+
+    Returns:
+        Quantized model
+    """
+    if backend not in QUANTIZATION_BACKENDS:
+        raise ValueError(f"Unknown quantization backend: {backend}")
+    torch.backends.quantized.engine = backend
+
+    model = copy.deepcopy(model).cpu().eval()
+    example, _ = next(iter(calibration_loader))
+    example_inputs = (prepare_batch(example),)
+
+    # Fuse conv/bn/relu blocks, then insert observers
+    fused = fuse_resnet(model) if isinstance(model, ResNet) else fuse_fx(model)
+    prepared = prepare_fx(fused, get_default_qconfig_mapping(backend), example_inputs)
+
+    with torch.inference_mode():
+        for i, (images, _) in enumerate(calibration_loader):
+            if i >= num_batches:
+                break
+            prepared(prepare_batch(images))
+
+    return convert_fx(prepared)
+
+def model_size_bytes(model: nn.Module) -> int:
+    """Size of a model's serialized state dict in bytes."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+def accuracy_report(fp32_model: nn.Module,
+                    int8_model: nn.Module,
+                    loader: DataLoader,
+                    prepare_batch: Callable[[torch.Tensor], torch.Tensor]) -> Dict[str, float]:
+    """
+    Compare a quantized model against its fp32 original.
+
+    Args:
+        fp32_model: Original model
+        int8_model: Quantized model
+        loader: Loader yielding (images, multi-hot labels) batches
+        prepare_batch: Turns a loader batch into a normalized float model input
+
+    Returns:
+        Exact-match accuracy of both models, their difference, the fraction
+        of predicted labels the models agree on, the mean absolute
+        probability difference, throughput and serialized sizes
+    """
+    fp32_model = fp32_model.cpu().eval()
+    correct = {'fp32': 0, 'int8': 0}
+    elapsed = {'fp32': 0.0, 'int8': 0.0}
+    agreement = 0.0
+    prob_diff = 0.0
+    total = 0
+
+    with torch.inference_mode():
+        for images, labels in loader:
+            inputs = prepare_batch(images)
+            labels = labels.bool()
+            predictions = {}
+            for name, model in [('fp32', fp32_model), ('int8', int8_model)]:
+                start = time.perf_counter()
+                probabilities = torch.sigmoid(model(inputs))
+                elapsed[name] += time.perf_counter() - start
+                predictions[name] = probabilities
+                correct[name] += ((probabilities > 0.5) == labels).all(dim=1).sum().item()
+
+            agreement += ((predictions['fp32'] > 0.5) == (predictions['int8'] > 0.5)).float().mean(dim=1).sum().item()
+            prob_diff += (predictions['fp32'] - predictions['int8']).abs().mean(dim=1).sum().item()
+            total += len(images)
+
+    return {
+        'fp32_accuracy': 100. * correct['fp32'] / total,
+        'int8_accuracy': 100. * correct['int8'] / total,
+        'accuracy_delta': 100. * (correct['int8'] - correct['fp32']) / total,
+        'label_agreement': agreement / total,
+        'mean_abs_probability_diff': prob_diff / total,
+        'fp32_samples_per_sec': total / elapsed['fp32'] if elapsed['fp32'] > 0 else 0.0,
+        'int8_samples_per_sec': total / elapsed['int8'] if elapsed['int8'] > 0 else 0.0,
+        'fp32_size_bytes': model_size_bytes(fp32_model),
+        'int8_size_bytes': model_size_bytes(int8_model),
+        'num_samples': total
+    }
+
+def quantize_checkpoint(checkpoint_path: str,
+                        data_dir: str,
+                        backend: str = 'x86',
+                        num_calibration_samples: int = 512,
+                        num_eval_samples: Optional[int] = 2048,
+                        batch_size: int = 32) -> Dict[str, float]:
+    """
+    Quantize a checkpoint saved by ModelTrainer.save_model.
+
+    Calibrates on a sample of the sharded training split, reports the
+    accuracy delta on the test split, and writes the quantized TorchScript
+    model and the report next to the checkpoint.
+
+    Args:
+        checkpoint_path: Path to the training checkpoint
+        data_dir: Directory with the sharded train/test splits
+        backend: Quantized engine ('x86' or 'fbgemm')
+        num_calibration_samples: Training samples used for calibration
+        num_eval_samples: Test samples used for the report (None: all)
+        batch_size: Batch size for calibration and evaluation
+
+    Returns:
+        The accuracy report
+    """
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    model = create_model(checkpoint['model_name'], checkpoint['num_classes'],
+                         input_channels=checkpoint['input_channels'], pretrained=False)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+
+    normalizer = Normalizer.from_dict(checkpoint['normalization']) if checkpoint.get('normalization') else None
+
+    def prepare_batch(images: torch.Tensor) -> torch.Tensor:
+        if normalizer is not None:
+            return normalizer(images)
+        return images.float().div_(255.0) if images.dtype == torch.uint8 else images.float()
+
+    # Calibrate on a random sample of the training split
+    train_dataset = ShardedDataset(os.path.join(data_dir, 'train'))
+    generator = torch.Generator().manual_seed(0)
+    calibration_indices = torch.randperm(len(train_dataset), generator=generator)[:num_calibration_samples]
+    calibration_loader = DataLoader(Subset(train_dataset, calibration_indices.tolist()), batch_size=batch_size)
+    quantized = quantize_model(model, calibration_loader, prepare_batch, backend=backend,
+                               num_batches=len(calibration_loader))
+
+    test_dataset = ShardedDataset(os.path.join(data_dir, 'test'))
+    if num_eval_samples is not None:
+        test_dataset = Subset(test_dataset, range(min(num_eval_samples, len(test_dataset))))
+    report = accuracy_report(model, quantized, DataLoader(test_dataset, batch_size=batch_size), prepare_batch)
+    report['backend'] = backend
+
+    # Save the quantized model as TorchScript and the report beside it
+    example, _ = next(iter(calibration_loader))
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(quantized, prepare_batch(example)))
+    int8_path = artifact_path(checkpoint_path, 'int8')
+    torch.jit.save(scripted, str(int8_path))
+    with open(Path(int8_path).with_suffix('.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(f"Saved INT8 model to {int8_path}: accuracy delta {report['accuracy_delta']:+.2f} points, "
+                f"{report['fp32_size_bytes'] / max(report['int8_size_bytes'], 1):.1f}x smaller, "
+                f"{report['int8_samples_per_sec'] / max(report['fp32_samples_per_sec'], 1e-9):.1f}x throughput")
+    return report
+
+def main():
+    """Quantize the checkpoint given by MODEL_PATH."""
+    logging.basicConfig(level=logging.INFO)
+    quantize_checkpoint(
+        os.environ['MODEL_PATH'],
+        os.getenv('PREPROCESSED_DATA_DIR', 'data/preprocessing'),
+        backend=os.getenv('QUANTIZATION_BACKEND', 'x86'),
+        num_calibration_samples=int(os.getenv('CALIBRATION_SAMPLES', '512'))
+    )
+
+if __name__ == "__main__":
+    main()
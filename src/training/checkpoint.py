@@ -0,0 +1,247 @@
+"""
+Preemption-Safe Training Checkpoints
+
+Spot nodes can be reclaimed at any time. This module writes step-level
+training checkpoints from a background thread, finds the latest one to
+resume from, and turns SIGTERM into a request to stop at the next step so
+a final checkpoint can be flushed before the node goes away.
+"""
+
+import os
+import re
+import json
+import random
+import signal
+import threading
+import numpy as np
+import torch
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATTERN = re.compile(r'checkpoint_(\d+)\.pt$')
+
+# Written in place of the step checkpoints once a run has finished
+COMPLETE_MARKER = 'complete.json'
+
+def to_cpu(state: Any) -> Any:
+    """
+    Copy every tensor in a (nested) state dict to host memory.
+
+    The copy is what makes asynchronous saving safe: training keeps
+    updating the live parameters while the snapshot is being written.
+
+    Args:
+        state: Tensor, or dict/list/tuple containing tensors
+
+    Returns:
+        The same structure with detached CPU copies of all tensors
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to('cpu', copy=True)
+    if isinstance(state, dict):
+        return {key: to_cpu(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(to_cpu(value) for value in state)
+    return state
+
+def capture_rng_state() -> Dict[str, Any]:
+    """Capture the Python, NumPy and torch random number generator states."""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state()
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def restore_rng_state(state: Dict[str, Any]):
+    """
+    Restore random number generator states captured by capture_rng_state().
+
+    Args:
+        state: Captured generator states
+    """
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+def set_sampler_epoch(sampler: Any, epoch: int, seed: int = 42):
+    """
+    Make the sample order of an epoch a function of the epoch number.
+
+    Distributed samplers already derive their order from set_epoch();
+    generator-driven samplers are reseeded. Either way, the order of an
+    interrupted epoch can be reproduced on resume.
+
+    Args:
+        sampler: Training sampler
+        epoch: Epoch number
+        seed: Base seed of the generator
+    """
+    if hasattr(sampler, 'set_epoch'):
+        sampler.set_epoch(epoch)
+    elif getattr(sampler, 'generator', None) is not None:
+        sampler.generator.manual_seed(seed + epoch)
+
+class CheckpointManager:
+    """
+    Write numbered training checkpoints asynchronously and keep the latest few.
+
+    save() snapshots the state to host memory on the calling thread and
+    hands the snapshot to a single writer thread, so the training loop only
+    pays for the device-to-host copy. Files are written under a temporary
+    name and renamed into place, so a checkpoint is either complete or absent.
+    """
+
+    def __init__(self, checkpoint_dir: str, keep: int = 2):
+        """
+        Initialize the checkpoint manager.
+
+        Args:
+            checkpoint_dir: Directory holding the checkpoints
+            keep: Number of most recent checkpoints to retain
+        """
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.keep = keep
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._pending: Optional[Future] = None
+
+    def path(self, step: int) -> Path:
+        """Path of the checkpoint for a global step."""
+        return self.checkpoint_dir / f'checkpoint_{step:08d}.pt'
+
+    def checkpoints(self) -> List[Path]:
+        """Complete checkpoints, oldest first."""
+        paths = [p for p in self.checkpoint_dir.iterdir() if CHECKPOINT_PATTERN.match(p.name)]
+        return sorted(paths, key=lambda p: int(CHECKPOINT_PATTERN.match(p.name).group(1)))
+
+    def latest(self) -> Optional[Path]:
+        """Path of the most recent checkpoint, or None."""
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def load_latest(self, map_location: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Load the most recent checkpoint.
+
+        Args:
+            map_location: Device to map the loaded tensors to
+
+        Returns:
+            The checkpoint state, or None if there is no checkpoint
+        """
+        path = self.latest()
+        if path is None:
+            return None
+        logger.info(f"Resuming from checkpoint {path}")
+        return torch.load(path, map_location=map_location, weights_only=False)
+
+    def save(self, state: Dict[str, Any], step: int, blocking: bool = False):
+        """
+        Save a checkpoint for a global step.
+
+        At most one write is in flight: a new save first waits for the
+        previous one, which bounds the host memory held by snapshots.
+
+        Args:
+            state: Training state (tensors may live on any device)
+            step: Global training step, used to order checkpoints
+            blocking: Wait until the checkpoint is on disk
+        """
+        snapshot = to_cpu(state)
+        self.wait()
+        self._pending = self._executor.submit(self._write, snapshot, step)
+        if blocking:
+            self.wait()
+
+    def mark_complete(self, info: Dict[str, Any]):
+        """
+        Record that the run finished: drop its step checkpoints, so a later
+        run in the same directory starts fresh, and write a completion marker.
+
+        Args:
+            info: Summary of the finished run stored in the marker
+        """
+        self.wait()
+        for path in self.checkpoints():
+            path.unlink(missing_ok=True)
+        with open(self.checkpoint_dir / COMPLETE_MARKER, 'w') as f:
+            json.dump(info, f, indent=2)
+        logger.info(f"Marked the run in {self.checkpoint_dir} complete")
+
+    def is_complete(self) -> bool:
+        """Whether the last run in the directory finished."""
+        return (self.checkpoint_dir / COMPLETE_MARKER).exists()
+
+    def wait(self):
+        """Wait for the in-flight write, re-raising any error it hit."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def close(self):
+        """Flush the in-flight write and stop the writer thread."""
+        self.wait()
+        self._executor.shutdown()
+
+    def _write(self, snapshot: Dict[str, Any], step: int):
+        path = self.path(step)
+        tmp_path = path.with_name(path.name + '.tmp')
+        torch.save(snapshot, tmp_path)
+        os.replace(tmp_path, path)
+        (self.checkpoint_dir / COMPLETE_MARKER).unlink(missing_ok=True)
+        logger.info(f"Saved checkpoint {path}")
+
+        for old in self.checkpoints()[:-self.keep]:
+            old.unlink(missing_ok=True)
+
+class PreemptionHandler:
+    """
+    Record SIGTERM instead of dying, so training can checkpoint and exit cleanly.
+
+    Slurm and the spot interruption notice both deliver SIGTERM ahead of the
+    hard kill. Used as a context manager, the handler is installed on entry
+    and the previous one restored on exit.
+    """
+
+    def __init__(self, signals: tuple = (signal.SIGTERM,)):
+        """
+        Initialize the handler.
+
+        Args:
+            signals: Signals that request a stop
+        """
+        self.signals = signals
+        self._event = threading.Event()
+        self._previous = {}
+
+    @property
+    def requested(self) -> bool:
+        """Whether a stop was requested."""
+        return self._event.is_set()
+
+    def request(self, signum: Optional[int] = None, frame: Any = None):
+        """Request a stop; also the signal handler."""
+        if signum is not None:
+            logger.warning(f"Received signal {signum}, stopping after the current step")
+        self._event.set()
+
+    def __enter__(self) -> 'PreemptionHandler':
+        # Signal handlers can only be installed from the main thread
+        if threading.current_thread() is threading.main_thread():
+            for signum in self.signals:
+                self._previous[signum] = signal.signal(signum, self.request)
+        return self
+
+    def __exit__(self, *exc_info):
+        for signum, handler in self._previous.items():
+            signal.signal(signum, handler)
+        self._previous.clear()
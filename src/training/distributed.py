@@ -0,0 +1,153 @@
+"""
+Distributed Data-Parallel Helpers for Slurm Clusters
+
+This module reads the process layout from the Slurm environment (or the
+torchrun-style RANK/WORLD_SIZE variables), initializes the process group,
+and provides the samplers and reductions ModelTrainer needs to train one
+replica per task across the cluster's nodes.
+"""
+
+import os
+import re
+import math
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.utils.data import Sampler
+from typing import Dict, Iterator, Optional
+import logging
+
+from src.data.sampling import compute_sample_weights
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MASTER_PORT = '29500'
+
+def get_dist_env() -> Dict[str, int]:
+    """
+    Read the rank layout of the current process from the environment.
+
+    Slurm variables take precedence over the torchrun-style ones, so the same
+    code runs under ``srun`` and ``torchrun``.
+
+    Returns:
+        Dictionary with rank, world_size and local_rank
+    """
+    return {
+        'rank': int(os.getenv('SLURM_PROCID', os.getenv('RANK', '0'))),
+        'world_size': int(os.getenv('SLURM_NTASKS', os.getenv('WORLD_SIZE', '1'))),
+        'local_rank': int(os.getenv('SLURM_LOCALID', os.getenv('LOCAL_RANK', '0')))
+    }
+
+def first_host(nodelist: str) -> str:
+    """
+    Return the first host of a Slurm node list, e.g. 'gpu-[3-5,7]' -> 'gpu-3'.
+
+    Args:
+        nodelist: Compressed Slurm node list
+
+    Returns:
+        Hostname of the first node
+    """
+    prefix, ranges = re.match(r'([^\[,]+)(?:\[([^\]]+)\])?', nodelist).groups()
+    if ranges is None:
+        return prefix
+    return prefix + ranges.split(',')[0].split('-')[0]
+
+def init_distributed(backend: Optional[str] = None) -> Dict[str, int]:
+    """
+    Initialize the default process group from the environment.
+
+    The rendezvous address defaults to the first node of the Slurm job,
+    so the launcher only has to start one task per replica.
+
+    Args:
+        backend: Process group backend (default: nccl on GPU, gloo on CPU)
+
+    Returns:
+        Dictionary with rank, world_size and local_rank
+    """
+    env = get_dist_env()
+    if dist.is_initialized():
+        return env
+
+    if 'MASTER_ADDR' not in os.environ:
+        nodelist = os.getenv('SLURM_JOB_NODELIST', os.getenv('SLURM_NODELIST'))
+        os.environ['MASTER_ADDR'] = first_host(nodelist) if nodelist else '127.0.0.1'
+    os.environ.setdefault('MASTER_PORT', DEFAULT_MASTER_PORT)
+
+    backend = backend or ('nccl' if torch.cuda.is_available() else 'gloo')
+    dist.init_process_group(backend, rank=env['rank'], world_size=env['world_size'])
+    logger.info(f"Initialized {backend} process group: rank {env['rank']}/{env['world_size']} "
+                f"via {os.environ['MASTER_ADDR']}:{os.environ['MASTER_PORT']}")
+
+    return env
+
+def cleanup_distributed():
+    """Destroy the default process group, if one was initialized."""
+    if dist.is_initialized():
+        dist.destroy_process_group()
+
+def is_main_process() -> bool:
+    """Whether this process is rank 0 (always true without a process group)."""
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+def all_reduce_sum(tensor: torch.Tensor) -> torch.Tensor:
+    """
+    Sum a tensor across all processes in place.
+
+    Args:
+        tensor: Tensor to reduce
+
+    Returns:
+        The reduced tensor (unchanged without a process group)
+    """
+    if dist.is_initialized() and dist.get_world_size() > 1:
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+class DistributedWeightedSampler(Sampler):
+    """
+    Class-balanced sampling, sharded across distributed replicas.
+
+    Every replica draws the same weighted sample of indices from a generator
+    seeded by (seed, epoch) and keeps every world_size-th index, so the
+    replicas see disjoint parts of one balanced epoch.
+    """
+
+    def __init__(self,
+                 labels: np.ndarray,
+                 num_replicas: Optional[int] = None,
+                 rank: Optional[int] = None,
+                 power: float = 1.0,
+                 seed: int = 42):
+        """
+        Initialize the sampler.
+
+        Args:
+            labels: Multi-hot array of shape (num_samples, num_classes)
+            num_replicas: Number of processes (default: process group size)
+            rank: Rank of the current process (default: process group rank)
+            power: Exponent applied to the inverse class frequencies
+            seed: Seed shared by all replicas
+        """
+        self.num_replicas = num_replicas if num_replicas is not None else dist.get_world_size()
+        self.rank = rank if rank is not None else dist.get_rank()
+        self.weights = torch.from_numpy(compute_sample_weights(labels, power=power))
+        self.num_samples = math.ceil(len(self.weights) / self.num_replicas)
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """Set the epoch, so each epoch draws a different sample."""
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[int]:
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        indices = torch.multinomial(self.weights, self.num_samples * self.num_replicas,
+                                    replacement=True, generator=generator)
+        return iter(indices[self.rank::self.num_replicas].tolist())
+
+    def __len__(self) -> int:
+        return self.num_samples
@@ -0,0 +1,139 @@
+"""
+Best-Model Tracking and Early Stopping
+
+``BestStateTracker`` keeps a host-memory copy of the best weights seen so
+far, so an improvement costs a device-to-host copy rather than a file
+write; the best state is written once, when asked to, at the end.
+``EarlyStopping`` ends training once the monitored metric has not improved
+for a number of epochs.
+"""
+
+import torch
+import torch.nn as nn
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+from src.training.checkpoint import to_cpu
+
+logger = logging.getLogger(__name__)
+
+def is_improvement(score: float, best: Optional[float], mode: str = 'max', min_delta: float = 0.0) -> bool:
+    """
+    Whether a score improves on the best one by more than min_delta.
+
+    Args:
+        score: New score
+        best: Best score so far (None if there is none yet)
+        mode: 'max' if higher scores are better, 'min' if lower ones are
+        min_delta: Minimum change that counts as an improvement
+
+    Returns:
+        True if the score is an improvement
+    """
+    if mode not in ('max', 'min'):
+        raise ValueError(f"Unknown mode: {mode}")
+    if best is None:
+        return True
+    return score > best + min_delta if mode == 'max' else score < best - min_delta
+
+class BestStateTracker:
+    """
+    Keep the weights of the best epoch in host memory.
+    """
+
+    def __init__(self, mode: str = 'max', min_delta: float = 0.0):
+        """
+        Initialize the tracker.
+
+        Args:
+            mode: 'max' if higher scores are better, 'min' if lower ones are
+            min_delta: Minimum change that counts as an improvement
+        """
+        self.mode = mode
+        self.min_delta = min_delta
+        self.best_score: Optional[float] = None
+        self.best_epoch: Optional[int] = None
+        self.best_state: Optional[Dict[str, Any]] = None
+        self.num_improvements = 0
+
+    def update(self, model: nn.Module, score: float, epoch: int) -> bool:
+        """
+        Snapshot the model's weights if the score is the best so far.
+
+        Args:
+            model: Model being trained
+            score: Validation score of the epoch
+            epoch: Epoch number
+
+        Returns:
+            True if the snapshot was taken
+        """
+        if not is_improvement(score, self.best_score, self.mode, self.min_delta):
+            return False
+        self.best_score = score
+        self.best_epoch = epoch
+        self.best_state = to_cpu(model.state_dict())
+        self.num_improvements += 1
+        return True
+
+    def restore(self, model: nn.Module) -> nn.Module:
+        """Load the best weights into a model (left unchanged if nothing was tracked)."""
+        if self.best_state is not None:
+            model.load_state_dict(self.best_state)
+        return model
+
+    def save(self, path: str) -> Path:
+        """
+        Write the best weights to disk.
+
+        Args:
+            path: Output file
+
+        Returns:
+            Path of the written file
+        """
+        if self.best_state is None:
+            raise RuntimeError("No best state to save")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        torch.save(self.best_state, path)
+        logger.info(f"Saved best weights of epoch {self.best_epoch} ({self.best_score:.4f}) to {path}")
+        return path
+
+class EarlyStopping:
+    """
+    Stop training once the monitored score has not improved for `patience` epochs.
+    """
+
+    def __init__(self, patience: int = 5, mode: str = 'max', min_delta: float = 0.0):
+        """
+        Initialize early stopping.
+
+        Args:
+            patience: Number of epochs without improvement before stopping
+            mode: 'max' if higher scores are better, 'min' if lower ones are
+            min_delta: Minimum change that counts as an improvement
+        """
+        self.patience = patience
+        self.mode = mode
+        self.min_delta = min_delta
+        self.best_score: Optional[float] = None
+        self.num_bad_epochs = 0
+
+    def step(self, score: float) -> bool:
+        """
+        Record an epoch's score.
+
+        Args:
+            score: Validation score of the epoch
+
+        Returns:
+            True if training should stop
+        """
+        if is_improvement(score, self.best_score, self.mode, self.min_delta):
+            self.best_score = score
+            self.num_bad_epochs = 0
+        else:
+            self.num_bad_epochs += 1
+        return self.num_bad_epochs >= self.patience
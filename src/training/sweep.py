@@ -0,0 +1,459 @@
+"""
+Hyperparameter Sweeps with Successive Halving
+
+Configurations are sampled over the model architectures and trainer
+hyperparameters and trained with ModelTrainer in rungs of growing epoch
+budgets (min_epochs, min_epochs * eta, ... max_epochs). After each rung
+only the best 1/eta of the trials by an intermediate validation metric are
+promoted; the rest are pruned. Promoted trials resume from their own
+checkpoint, so no epoch is trained twice.
+
+The trials of a rung run concurrently, either in local worker processes
+that split the node's cores and GPUs or as the tasks of a Slurm job array. The
+whole sweep is recorded as one MLflow parent run with a nested run per
+trial.
+
+    <sweep_dir>/
+        trial_0000/
+            checkpoint_*.pt       # resumable training state
+            result_0001.json      # metrics after the 1-epoch rung
+            result_0003.json
+        ...
+        rung_0003_tasks.json      # tasks of a rung, read by Slurm array tasks
+"""
+
+import os
+import json
+import math
+import sys
+import random
+import signal
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import torch
+import mlflow
+from mlflow.tracking import MlflowClient
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+
+from src.training.checkpoint import PreemptionHandler
+from src.training.train import ModelTrainer
+from src.utils.tracking import BufferedMLflowLogger
+
+logger = logging.getLogger(__name__)
+
+# Lists are choices; ('log' | 'uniform', low, high) tuples are continuous ranges
+DEFAULT_SEARCH_SPACE = {
+    'model_name': ['lightweight', 'resnet18'],
+    'learning_rate': ('log', 1e-4, 1e-2),
+    'batch_size': [16, 32, 64]
+}
+
+def sample_configs(search_space: Dict[str, Any], num_trials: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Draw random configurations from a search space.
+
+    Args:
+        search_space: Choices or ranges per ModelTrainer argument
+        num_trials: Number of configurations
+        seed: Random seed
+
+    Returns:
+        List of configurations
+    """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(num_trials):
+        config = {}
+        for name, space in search_space.items():
+            if isinstance(space, list):
+                config[name] = rng.choice(space)
+            elif isinstance(space, tuple) and space[0] == 'log':
+                config[name] = math.exp(rng.uniform(math.log(space[1]), math.log(space[2])))
+            elif isinstance(space, tuple) and space[0] == 'uniform':
+                config[name] = rng.uniform(space[1], space[2])
+            else:
+                raise ValueError(f"Unsupported search space for {name}: {space}")
+        configs.append(config)
+    return configs
+
+def rung_budgets(min_epochs: int, max_epochs: int, eta: int) -> List[int]:
+    """
+    Epoch budgets of the successive halving rungs.
+
+    Args:
+        min_epochs: Budget of the first rung
+        max_epochs: Budget of the last rung
+        eta: Growth factor of the budget (and pruning factor of the trials)
+
+    Returns:
+        Increasing budgets ending at max_epochs
+    """
+    budgets = []
+    budget = min_epochs
+    while budget < max_epochs:
+        budgets.append(budget)
+        budget *= eta
+    return budgets + [max_epochs]
+
+def result_path(trial_dir: str, num_epochs: int) -> Path:
+    """Path of a trial's metrics after training to a budget."""
+    return Path(trial_dir) / f'result_{num_epochs:04d}.json'
+
+def run_trial(task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Train one trial up to its rung budget, resuming from its last checkpoint.
+
+    Epochs are run by ModelTrainer.run_epoch, so a trial interrupted mid-epoch
+    continues at the batch it stopped at. On SIGTERM the trial checkpoints
+    after the current step and returns without writing a result.
+
+    Args:
+        task: Dictionary with 'trial_id', 'config', 'num_epochs', 'data_dir',
+            'trial_dir', 'metric' and the fixed 'trainer_kwargs'
+
+    Returns:
+        The trial's result: per-epoch history of the epochs trained by this
+        call and the score at the budget, or None if the trial was preempted
+    """
+    trainer = ModelTrainer(
+        num_epochs=task['num_epochs'],
+        checkpoint_dir=task['trial_dir'],
+        **task['trainer_kwargs'],
+        **task['config']
+    )
+    train_loader, val_loader = trainer.load_data(task['data_dir'])
+    trainer.resume_from_checkpoint()
+
+    history = []
+    with PreemptionHandler() as trainer.preemption:
+        for epoch in range(trainer.epoch, task['num_epochs'] + 1):
+            metrics = trainer.run_epoch(train_loader, val_loader, epoch)
+            if metrics is None:
+                break
+            history.append({'epoch': epoch, **metrics})
+            logger.info(f"Trial {task['trial_id']} epoch {epoch}/{task['num_epochs']}: "
+                        f"{task['metric']} {metrics[task['metric']]:.4f}")
+    trainer.preemption = None
+    if trainer.preempted:
+        trainer.checkpoints.close()
+        return None
+
+    # Checkpoint at the rung boundary so a promotion continues from here
+    trainer.epoch = task['num_epochs'] + 1
+    trainer.batch_in_epoch = 0
+    trainer.save_checkpoint(blocking=True)
+    trainer.checkpoints.close()
+
+    # A trial checkpointed at its budget but without a result only needs scoring
+    final_metrics = history[-1] if history else trainer.validate(val_loader)
+    result = {
+        'trial_id': task['trial_id'],
+        'num_epochs': task['num_epochs'],
+        'history': history,
+        'score': final_metrics[task['metric']]
+    }
+    with open(result_path(task['trial_dir'], task['num_epochs']), 'w') as f:
+        json.dump(result, f, indent=2)
+    return result
+
+def _worker_devices(num_workers: int) -> Optional[List[str]]:
+    """
+    CUDA_VISIBLE_DEVICES values that spread local workers over the visible GPUs.
+
+    Args:
+        num_workers: Number of worker processes
+
+    Returns:
+        One GPU id per worker, round-robin, or None without GPUs
+    """
+    num_gpus = torch.cuda.device_count()
+    if not num_gpus:
+        return None
+    visible = os.getenv('CUDA_VISIBLE_DEVICES')
+    gpu_ids = visible.split(',')[:num_gpus] if visible else [str(i) for i in range(num_gpus)]
+    return [gpu_ids[i % num_gpus] for i in range(num_workers)]
+
+def _init_worker(num_threads: int, devices: Optional[Any] = None):
+    """Give each trial process its own share of the node's cores and, on GPU nodes, its own GPU."""
+    torch.set_num_threads(num_threads)
+    if devices is not None:
+        # Set before CUDA is initialized, so 'cuda' in this process is the assigned GPU
+        os.environ['CUDA_VISIBLE_DEVICES'] = devices.get()
+
+class LocalExecutor:
+    """
+    Run the trials of a rung in local worker processes.
+
+    On a GPU node each worker sees only the GPU it was assigned, so trials
+    should leave the trainer device at its default.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the executor.
+
+        Args:
+            max_workers: Number of concurrent trials (default: number of GPUs, or 4 on CPU)
+        """
+        self.max_workers = max_workers or torch.cuda.device_count() or 4
+
+    def run(self, tasks: List[Dict[str, Any]], rung_dir: Path) -> List[Dict[str, Any]]:
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            results = [run_trial(task) for task in tasks]
+        else:
+            num_workers = min(self.max_workers, len(tasks))
+            num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+            context = mp.get_context('spawn')
+            # Each worker takes one GPU id from the queue as it starts
+            devices = None
+            gpu_ids = _worker_devices(num_workers)
+            if gpu_ids:
+                devices = context.Queue()
+                for gpu_id in gpu_ids:
+                    devices.put(gpu_id)
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(num_threads, devices)) as executor:
+                results = list(executor.map(run_trial, tasks))
+        for task, result in zip(tasks, results):
+            if result is None:
+                raise RuntimeError(f"Trial {task['trial_id']} was preempted; rerun the sweep to resume it")
+        return results
+
+class SlurmExecutor:
+    """Run the trials of a rung as the tasks of a Slurm job array and wait for it."""
+
+    def __init__(self, sbatch_args: Sequence[str] = ()):
+        """
+        Initialize the executor.
+
+        Args:
+            sbatch_args: Extra sbatch options, e.g. ('--gres=gpu:1', '--time=4:00:00')
+        """
+        self.sbatch_args = list(sbatch_args)
+
+    def run(self, tasks: List[Dict[str, Any]], rung_dir: Path) -> List[Dict[str, Any]]:
+        tasks_file = rung_dir / f"rung_{tasks[0]['num_epochs']:04d}_tasks.json"
+        with open(tasks_file, 'w') as f:
+            json.dump(tasks, f, indent=2)
+
+        # One array task per trial; --wait returns once the whole array has finished
+        command = [
+            'sbatch', '--wait', '--parsable',
+            f'--array=0-{len(tasks) - 1}',
+            '--job-name=drug_discovery_sweep',
+            f'--output={rung_dir}/sweep_%A_%a.log',
+            f'--export=ALL,SWEEP_STAGE=trial,SWEEP_TASKS={tasks_file}',
+            # Preempted tasks checkpoint on SIGTERM and are requeued into the same array
+            '--requeue', '--signal=TERM@120',
+            *self.sbatch_args,
+            '--wrap=python3 -m src.training.sweep'
+        ]
+        subprocess.run(command, check=False)
+
+        results = []
+        for task in tasks:
+            path = result_path(task['trial_dir'], task['num_epochs'])
+            if not path.exists():
+                raise RuntimeError(f"Trial {task['trial_id']} did not finish its {task['num_epochs']}-epoch rung")
+            with open(path) as f:
+                results.append(json.load(f))
+        return results
+
+class SuccessiveHalvingSweep:
+    """
+    Sweep configurations with synchronous successive halving.
+    """
+
+    def __init__(self,
+                 data_dir: str,
+                 configs: List[Dict[str, Any]],
+                 sweep_dir: str = 'sweeps/default',
+                 min_epochs: int = 1,
+                 max_epochs: int = 9,
+                 eta: int = 3,
+                 metric: str = 'val_f1_macro',
+                 mode: str = 'max',
+                 executor=None,
+                 trainer_kwargs: Optional[Dict[str, Any]] = None,
+                 run_name: str = 'hyperparameter_sweep'):
+        """
+        Initialize the sweep.
+
+        Args:
+            data_dir: Preprocessed dataset passed to ModelTrainer.load_data
+            configs: ModelTrainer arguments per trial, e.g. from sample_configs
+            sweep_dir: Directory of the trial checkpoints and results
+            min_epochs: Epoch budget of the first rung
+            max_epochs: Epoch budget of the last rung
+            eta: Fraction 1/eta of the trials is promoted to an eta times larger budget
+            metric: Validation metric the trials are ranked by
+            mode: 'max' if higher metric values are better, 'min' if lower ones are
+            executor: LocalExecutor (default) or SlurmExecutor
+            trainer_kwargs: ModelTrainer arguments shared by all trials
+            run_name: Name of the MLflow parent run
+        """
+        if mode not in ('max', 'min'):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.data_dir = data_dir
+        self.configs = configs
+        self.sweep_dir = Path(sweep_dir)
+        self.budgets = rung_budgets(min_epochs, max_epochs, eta)
+        self.eta = eta
+        self.metric = metric
+        self.mode = mode
+        self.executor = executor or LocalExecutor()
+        self.trainer_kwargs = {'num_classes': 28, 'input_channels': 4, **(trainer_kwargs or {})}
+        self.run_name = run_name
+
+    def _task(self, trial_id: int, num_epochs: int) -> Dict[str, Any]:
+        return {
+            'trial_id': trial_id,
+            'config': self.configs[trial_id],
+            'num_epochs': num_epochs,
+            'data_dir': self.data_dir,
+            'trial_dir': str(self.sweep_dir / f'trial_{trial_id:04d}'),
+            'metric': self.metric,
+            'trainer_kwargs': self.trainer_kwargs
+        }
+
+    def _run_rung(self, trial_ids: List[int], num_epochs: int) -> Dict[int, Dict[str, Any]]:
+        """Train the trials to a budget, reusing results of an interrupted sweep."""
+        results = {}
+        pending = []
+        for trial_id in trial_ids:
+            task = self._task(trial_id, num_epochs)
+            path = result_path(task['trial_dir'], num_epochs)
+            if path.exists():
+                with open(path) as f:
+                    results[trial_id] = json.load(f)
+            else:
+                pending.append(task)
+        if pending:
+            for result in self.executor.run(pending, self.sweep_dir):
+                results[result['trial_id']] = result
+        return results
+
+    def run(self) -> List[Dict[str, Any]]:
+        """
+        Run the sweep.
+
+        Returns:
+            Leaderboard of all trials, best first, with each trial's config,
+            the budget it reached and its score there
+        """
+        self.sweep_dir.mkdir(parents=True, exist_ok=True)
+        client = MlflowClient()
+        leaderboard = {i: {'trial_id': i, 'config': config, 'num_epochs': 0, 'score': None}
+                       for i, config in enumerate(self.configs)}
+        epochs_trained = 0
+
+        with mlflow.start_run(run_name=self.run_name) as parent:
+            parent_logger = BufferedMLflowLogger(run_id=parent.info.run_id)
+            parent_logger.log_params({
+                'num_trials': len(self.configs),
+                'rung_budgets': ','.join(map(str, self.budgets)),
+                'eta': self.eta,
+                'metric': self.metric,
+                **{f'fixed_{k}': v for k, v in self.trainer_kwargs.items()}
+            })
+
+            # One nested run per trial, tagged with the sweep it belongs to
+            trial_runs = {}
+            for trial_id, config in enumerate(self.configs):
+                with mlflow.start_run(run_name=f'trial_{trial_id:04d}', nested=True) as run:
+                    trial_runs[trial_id] = run.info.run_id
+                trial_logger = BufferedMLflowLogger(run_id=trial_runs[trial_id])
+                trial_logger.log_params(config)
+                trial_logger.close()
+
+            survivors = list(range(len(self.configs)))
+            for rung, num_epochs in enumerate(self.budgets):
+                logger.info(f"Rung {rung}: training {len(survivors)} trials to {num_epochs} epochs")
+                results = self._run_rung(survivors, num_epochs)
+
+                for trial_id, result in results.items():
+                    trial_logger = BufferedMLflowLogger(run_id=trial_runs[trial_id])
+                    for entry in result['history']:
+                        trial_logger.log_metrics({k: v for k, v in entry.items() if k != 'epoch'},
+                                                 step=entry['epoch'])
+                    trial_logger.log_metrics({'rung': rung}, step=num_epochs)
+                    trial_logger.close()
+                    epochs_trained += len(result['history'])
+                    leaderboard[trial_id].update(num_epochs=num_epochs, score=result['score'])
+
+                # Promote the best 1/eta of the rung
+                ranked = sorted(survivors, key=lambda i: results[i]['score'], reverse=self.mode == 'max')
+                if rung < len(self.budgets) - 1:
+                    survivors = ranked[:max(1, len(ranked) // self.eta)]
+                    for trial_id in ranked[len(survivors):]:
+                        client.set_terminated(trial_runs[trial_id], status='KILLED')
+                    logger.info(f"Rung {rung}: promoted trials {survivors}")
+                parent_logger.log_metrics({'rung_best_score': results[ranked[0]]['score'],
+                                           'rung_trials': len(ranked)}, step=rung)
+
+            for trial_id in survivors:
+                client.set_terminated(trial_runs[trial_id], status='FINISHED')
+
+            ordered = sorted(leaderboard.values(),
+                             key=lambda t: (t['num_epochs'], t['score'] if self.mode == 'max' else -t['score']),
+                             reverse=True)
+            best = ordered[0]
+            parent_logger.log_params({f'best_{k}': v for k, v in best['config'].items()})
+            parent_logger.log_metrics({
+                'best_score': best['score'],
+                'best_trial': best['trial_id'],
+                'epochs_trained': epochs_trained,
+                # Share of the epochs a full grid over the same trials would have used
+                'budget_fraction': epochs_trained / (len(self.configs) * self.budgets[-1])
+            })
+            parent_logger.close()
+            with open(self.sweep_dir / 'leaderboard.json', 'w') as f:
+                json.dump(ordered, f, indent=2)
+
+        logger.info(f"Best trial {best['trial_id']}: {self.metric} {best['score']:.4f} with {best['config']} "
+                    f"({epochs_trained} epochs trained)")
+        return ordered
+
+def main():
+    """
+    Run a sweep, or, with SWEEP_STAGE=trial, one trial of a Slurm array rung.
+    """
+    logging.basicConfig(level=logging.INFO)
+    if os.getenv('SWEEP_STAGE') == 'trial':
+        with open(os.environ['SWEEP_TASKS']) as f:
+            tasks = json.load(f)
+        task_id = int(os.getenv('SLURM_ARRAY_TASK_ID', '0')) - int(os.getenv('SLURM_ARRAY_TASK_MIN', '0'))
+        if run_trial(tasks[task_id]) is None:
+            # Exit like a SIGTERM-killed process, so Slurm treats the task as preempted
+            sys.exit(128 + signal.SIGTERM)
+        return
+
+    search_space = json.loads(os.environ['SWEEP_SEARCH_SPACE']) if os.getenv('SWEEP_SEARCH_SPACE') else None
+    if search_space:
+        # JSON has no tuples; ranges are given as ["log", low, high]
+        search_space = {k: tuple(v) if v and v[0] in ('log', 'uniform') else v for k, v in search_space.items()}
+    configs = sample_configs(search_space or DEFAULT_SEARCH_SPACE,
+                             num_trials=int(os.getenv('SWEEP_TRIALS', '27')),
+                             seed=int(os.getenv('SWEEP_SEED', '0')))
+
+    executor = (SlurmExecutor(os.getenv('SWEEP_SBATCH_ARGS', '').split())
+                if os.getenv('SWEEP_EXECUTOR', 'local') == 'slurm'
+                else LocalExecutor(int(os.getenv('SWEEP_WORKERS', '0')) or None))
+
+    SuccessiveHalvingSweep(
+        os.getenv('PREPROCESSED_DATA_DIR', 'data/preprocessing'),
+        configs,
+        sweep_dir=os.getenv('SWEEP_DIR', 'sweeps/default'),
+        min_epochs=int(os.getenv('SWEEP_MIN_EPOCHS', '1')),
+        max_epochs=int(os.getenv('SWEEP_MAX_EPOCHS', '9')),
+        eta=int(os.getenv('SWEEP_ETA', '3')),
+        metric=os.getenv('SWEEP_METRIC', 'val_f1_macro'),
+        mode=os.getenv('SWEEP_MODE', 'max'),
+        executor=executor
+    ).run()
+
+if __name__ == "__main__":
+    main()
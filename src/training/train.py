@@ -6,18 +6,34 @@ for protein atlas classification, with MLflow integration for experiment trackin
 """
 
 import os
+import sys
+import time
+import signal
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, TensorDataset
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import (DataLoader, Dataset, DistributedSampler, IterableDataset,
+                              RandomSampler, TensorDataset)
 import numpy as np
 from typing import Dict, Tuple, Optional
 import mlflow
 import logging
 from pathlib import Path
 from datetime import datetime
+from contextlib import nullcontext
 
+from src.evaluation.metrics import MultiLabelMetrics
+from src.models.export import export_checkpoint
 from src.models.models import create_model
+from src.data.sharded_dataset import ShardedDataset, is_sharded_dataset
+from src.data.tar_shards import TarShardDataset, is_tar_dataset, load_tar_normalizer
+from src.data.sampling import make_balanced_sampler
+from src.training.checkpoint import (CheckpointManager, PreemptionHandler, capture_rng_state,
+                                     restore_rng_state, set_sampler_epoch)
+from src.training.distributed import (DistributedWeightedSampler, all_reduce_sum,
+                                      cleanup_distributed, get_dist_env, init_distributed)
+from src.utils.normalization import Normalizer, load_normalizer
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -30,7 +46,16 @@ class ModelTrainer:
                  batch_size: int = 32,
                  learning_rate: float = 0.001,
                  num_epochs: int = 10,
-                 device: Optional[str] = None):
+                 device: Optional[str] = None,
+                 input_channels: int = 3,
+                 class_balancing: bool = False,
+                 mixed_precision: bool = False,
+                 channels_last: bool = False,
+                 distributed: bool = False,
+                 checkpoint_dir: Optional[str] = None,
+                 checkpoint_interval: int = 500,
+                 export_formats: Tuple[str, ...] = (),
+                 image_size: int = 224):
         """
         Initialize the model trainer.
         
@@ -41,29 +66,90 @@ class ModelTrainer:
             learning_rate: Learning rate for optimization
             num_epochs: Number of training epochs
             device: Device to use for training ('cuda' or 'cpu')
+            input_channels: Number of image channels (4 for RGBY HPA samples)
+            class_balancing: Draw training samples with inverse class-frequency weights
+            mixed_precision: Run forward passes under autocast (bf16 on CPU,
+                fp16 with gradient scaling on CUDA)
+            channels_last: Use the NHWC memory format for the model and inputs
+            distributed: Train one data-parallel replica per process, with the
+                rank layout read from the Slurm (or torchrun) environment
+            checkpoint_dir: Directory for resumable step-level checkpoints
+                (None disables checkpointing and resuming)
+            checkpoint_interval: Number of training steps between checkpoints
+            export_formats: Deployment artifacts ('torchscript', 'onnx') to
+                export next to the best checkpoint after training
+            image_size: Size images are decoded to when streaming packed tar shards
         """
         self.model_name = model_name
         self.num_classes = num_classes
         self.batch_size = batch_size
         self.learning_rate = learning_rate
         self.num_epochs = num_epochs
+        self.input_channels = input_channels
+        self.class_balancing = class_balancing
+        self.mixed_precision = mixed_precision
+        self.channels_last = channels_last
+        self.distributed = distributed
+        self.export_formats = tuple(export_formats)
+        self.image_size = image_size
+        
+        # Join the process group; each rank drives the GPU matching its local rank
+        dist_env = init_distributed() if distributed else get_dist_env()
+        self.rank = dist_env['rank'] if distributed else 0
+        self.world_size = dist_env['world_size'] if distributed else 1
+        self.is_main = self.rank == 0
         
         # Set device
-        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        if device is None and torch.cuda.is_available():
+            device = f"cuda:{dist_env['local_rank']}" if distributed else 'cuda'
+        self.device = device or 'cpu'
         logger.info(f"Using device: {self.device}")
         
         # Create model
-        self.model = create_model(model_name, num_classes)
+        self.model = create_model(model_name, num_classes, input_channels=input_channels)
         self.model.to(self.device)
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        if channels_last:
+            self.model.to(memory_format=torch.channels_last)
+        if distributed:
+            self.model = DistributedDataParallel(
+                self.model,
+                device_ids=[torch.device(self.device).index] if self.device.startswith('cuda') else None
+            )
+        
+        # Mixed precision: bf16 needs no loss scaling, fp16 does
+        self.device_type = torch.device(self.device).type
+        self.amp_dtype = torch.float16 if self.device_type == 'cuda' else torch.bfloat16
+        self.scaler = torch.amp.GradScaler(
+            self.device_type,
+            enabled=mixed_precision and self.amp_dtype == torch.float16
+        )
+        if mixed_precision:
+            logger.info(f"Using mixed precision with {self.amp_dtype}")
         
         # Set up loss function and optimizer for multi-label classification
         self.criterion = nn.BCEWithLogitsLoss()
         self.optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
         
+        # Input normalization statistics saved with the dataset, set by load_data
+        self.normalizer: Optional[Normalizer] = None
+        
         # Initialize best model tracking
         self.best_val_loss = float('inf')
         self.best_model_path = None
         
+        # Training position, saved with checkpoints so a run can resume mid-epoch
+        self.epoch = 1
+        self.batch_in_epoch = 0
+        self.global_step = 0
+        self.mlflow_run_id: Optional[str] = None
+        
+        # Step-level checkpoints; every rank resumes from them, rank 0 writes them
+        self.checkpoints = CheckpointManager(checkpoint_dir) if checkpoint_dir else None
+        self.checkpoint_interval = checkpoint_interval
+        self.preemption: Optional[PreemptionHandler] = None
+        self.preempted = False
+        
     def load_data(self, data_dir: str) -> Tuple[DataLoader, DataLoader]:
         """
         Load and prepare the dataset.
@@ -74,7 +160,20 @@ class ModelTrainer:
         Returns:
             Tuple of (train_loader, val_loader)
         """
-        # Load preprocessed data
+        # Stream packed tar shards sequentially, from local disk, FSx or S3
+        if data_dir.startswith('s3://') or is_tar_dataset(os.path.join(data_dir, 'train')):
+            return self._make_streaming_loaders(data_dir)
+        
+        # Prefer the sharded, memory-mapped format written by the preprocessor
+        if is_sharded_dataset(os.path.join(data_dir, 'train')):
+            train_dataset = ShardedDataset(os.path.join(data_dir, 'train'))
+            test_dataset = ShardedDataset(os.path.join(data_dir, 'test'))
+            logger.info(f"Loaded sharded dataset: {len(train_dataset)} train, "
+                        f"{len(test_dataset)} test samples")
+            self.set_normalizer(load_normalizer(data_dir))
+            return self._make_loaders(train_dataset, test_dataset, train_dataset.labels())
+        
+        # Fall back to the legacy single-file format
         X_train = np.load(os.path.join(data_dir, 'X_train.npy'))
         X_test = np.load(os.path.join(data_dir, 'X_test.npy'))
         y_train = np.load(os.path.join(data_dir, 'y_train.npy'))
@@ -90,62 +189,222 @@ class ModelTrainer:
         train_dataset = TensorDataset(X_train, y_train)
         test_dataset = TensorDataset(X_test, y_test)
         
+        return self._make_loaders(train_dataset, test_dataset, y_train.numpy())
+    
+    def _make_loaders(self,
+                      train_dataset: Dataset,
+                      test_dataset: Dataset,
+                      train_labels: np.ndarray) -> Tuple[DataLoader, DataLoader]:
+        """
+        Wrap the train and test datasets in data loaders.
+        
+        Args:
+            train_dataset: Training dataset
+            test_dataset: Test dataset
+            train_labels: Multi-hot training labels, used for class balancing
+            
+        Returns:
+            Tuple of (train_loader, test_loader)
+        """
+        # Rebalance classes by sampling rather than by synthesizing samples,
+        # and give each distributed replica its own share of the data
+        train_sampler = None
+        test_sampler = None
+        if self.distributed:
+            if self.class_balancing:
+                train_sampler = DistributedWeightedSampler(train_labels)
+            else:
+                train_sampler = DistributedSampler(train_dataset, shuffle=True)
+            test_sampler = DistributedSampler(test_dataset, shuffle=False)
+        elif self.class_balancing:
+            train_sampler = make_balanced_sampler(train_labels)
+        else:
+            # A sampler-owned generator makes each epoch's order reproducible on resume
+            train_sampler = RandomSampler(train_dataset, generator=torch.Generator())
+        
+        # Pinned host memory lets batches be copied to the GPU asynchronously
+        pin_memory = self.device_type == 'cuda'
+        
         # Create data loaders
         train_loader = DataLoader(
             train_dataset,
             batch_size=self.batch_size,
-            shuffle=True,
-            num_workers=4
+            shuffle=False,
+            sampler=train_sampler,
+            num_workers=4,
+            pin_memory=pin_memory
         )
         
         test_loader = DataLoader(
             test_dataset,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=4
+            sampler=test_sampler,
+            num_workers=4,
+            pin_memory=pin_memory
         )
         
         return train_loader, test_loader
     
-    def train_epoch(self, train_loader: DataLoader) -> Dict[str, float]:
+    def _make_streaming_loaders(self, data_dir: str) -> Tuple[DataLoader, DataLoader]:
+        """
+        Create loaders streaming the packed tar shards of the train and test splits.
+        
+        Shards are dealt to replicas and loader workers, so the order comes
+        from the datasets rather than a sampler, and class balancing relies
+        on the shuffled packing order instead of weighted sampling.
+        
+        Args:
+            data_dir: Directory or s3:// prefix with the 'train' and 'test' splits
+            
+        Returns:
+            Tuple of (train_loader, test_loader)
+        """
+        datasets = {
+            split: TarShardDataset(f"{data_dir.rstrip('/')}/{split}",
+                                   image_size=self.image_size,
+                                   shuffle=split == 'train',
+                                   rank=self.rank,
+                                   world_size=self.world_size)
+            for split in ('train', 'test')
+        }
+        for split, dataset in datasets.items():
+            # Every worker needs at least one shard on every replica
+            num_shards = len(dataset.index['shards'])
+            if num_shards < self.world_size:
+                raise ValueError(f"The {split} split has {num_shards} shards, fewer than the "
+                                 f"{self.world_size} replicas; repack it with smaller shards")
+            dataset.num_workers = min(4, num_shards // self.world_size)
+        if self.class_balancing:
+            logger.warning("Class balancing is not applied to streamed tar shards")
+        self.set_normalizer(load_tar_normalizer(data_dir))
+        logger.info(f"Streaming tar shards: {datasets['train'].index['num_samples']} train, "
+                    f"{datasets['test'].index['num_samples']} test samples")
+        
+        loaders = [
+            DataLoader(
+                dataset,
+                batch_size=self.batch_size,
+                num_workers=dataset.num_workers,
+                pin_memory=self.device_type == 'cuda'
+            )
+            for dataset in datasets.values()
+        ]
+        
+        return loaders[0], loaders[1]
+    
+    def set_normalizer(self, normalizer: Optional[Normalizer]):
+        """
+        Set the statistics used to normalize batches before the forward pass.
+        
+        Args:
+            normalizer: Normalizer fitted during preprocessing, or None
+        """
+        self.normalizer = normalizer.to(self.device) if normalizer is not None else None
+        if normalizer is not None:
+            logger.info(f"Using {normalizer.mode} input normalization")
+    
+    def _prepare_batch(self,
+                       data: torch.Tensor,
+                       target: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Move a batch to the device, normalizing uint8 images on the fly.
+        
+        uint8 batches are transferred as-is, which moves 4x fewer bytes than
+        float32, and are converted and normalized on the device with the
+        statistics saved during preprocessing.
+        
+        Args:
+            data: Input batch
+            target: Target batch
+            
+        Returns:
+            Tuple of (normalized data, target) on the training device
+        """
+        # Copies from pinned memory overlap with compute on CUDA
+        data = data.to(self.device, non_blocking=True)
+        target = target.to(self.device, non_blocking=True)
+        
+        if self.normalizer is not None:
+            data = self.normalizer(data)
+        elif data.dtype == torch.uint8:
+            data = data.float().div_(255.0)
+        
+        if self.channels_last:
+            data = data.contiguous(memory_format=self.memory_format)
+        
+        return data, target
+    
+    def _autocast(self) -> torch.autocast:
+        """Autocast context for forward passes, a no-op unless mixed precision is enabled."""
+        return torch.autocast(self.device_type, dtype=self.amp_dtype, enabled=self.mixed_precision)
+    
+    def train_epoch(self, train_loader: DataLoader, start_batch: int = 0) -> Dict[str, float]:
         """
         Train for one epoch.
         
+        Writes a checkpoint every checkpoint_interval steps, and stops early
+        with a final checkpoint when preemption is requested.
+        
         Args:
             train_loader: DataLoader for training data
+            start_batch: Number of batches of this epoch already trained
+                before a resume
             
         Returns:
             Dictionary of training metrics
         """
         self.model.train()
-        total_loss = 0
-        correct = 0
+        # Accumulate on the device; reading values back forces a synchronization
+        total_loss = torch.zeros((), device=self.device)
+        metrics = MultiLabelMetrics(self.num_classes, device=self.device)
         total = 0
+        start_time = time.perf_counter()
         
         for batch_idx, (data, target) in enumerate(train_loader):
-            data, target = data.to(self.device), target.to(self.device)
+            data, target = self._prepare_batch(data, target)
             
             self.optimizer.zero_grad()
-            output = self.model(data)
-            loss = self.criterion(output, target)
+            with self._autocast():
+                output = self.model(data)
+                loss = self.criterion(output, target)
             
-            loss.backward()
-            self.optimizer.step()
+            self.scaler.scale(loss).backward()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
             
-            total_loss += loss.item()
+            total_loss += loss.detach()
             # Multi-label prediction (threshold at 0.5)
-            predicted = (output > 0.0).float()
-            correct += (predicted == target).all(dim=1).sum().item()
+            metrics.update(output.detach(), target)
             total += target.size(0)
             
+            self.global_step += 1
+            self.batch_in_epoch = start_batch + batch_idx + 1
+            if self._stop_requested(batch_idx):
+                self.preempted = True
+                self.save_checkpoint(blocking=True)
+                break
+            if self.checkpoints is not None and self.global_step % self.checkpoint_interval == 0:
+                self.save_checkpoint()
+            
             if batch_idx % 10 == 0:
                 logger.info(f'Train Batch: {batch_idx}/{len(train_loader)} '
                           f'Loss: {loss.item():.4f} '
-                          f'Acc: {100.*correct/total:.2f}%')
+                          f'Acc: {100.*metrics.totals[0].item()/total:.2f}% '
+                          f'Throughput: {total / (time.perf_counter() - start_time):.1f} samples/s')
+        
+        # Combine the replicas' partial sums
+        sums = all_reduce_sum(torch.stack([total_loss, torch.tensor(float(total), device=self.device)]))
+        total_loss, total = sums.tolist()
+        metrics.all_reduce()
+        scores = metrics.compute()
         
+        # A resumed epoch can have no batches left before validation
         return {
-            'train_loss': total_loss / len(train_loader),
-            'train_acc': 100. * correct / total
+            'train_loss': total_loss / max(len(train_loader) * self.world_size, 1),
+            'train_acc': 100. * scores['accuracy'],
+            'train_f1_macro': scores['f1_macro'],
+            'train_samples_per_sec': total / (time.perf_counter() - start_time)
         }
     
     def validate(self, val_loader: DataLoader) -> Dict[str, float]:
@@ -156,38 +415,46 @@ class ModelTrainer:
             val_loader: DataLoader for validation data
             
         Returns:
-            Dictionary of validation metrics
+            Dictionary of validation metrics: loss, exact-match accuracy, and
+            macro/micro F1, precision and recall
         """
         self.model.eval()
-        total_loss = 0
-        correct = 0
-        total = 0
+        total_loss = torch.zeros((), device=self.device)
+        metrics = MultiLabelMetrics(self.num_classes, device=self.device)
         
         with torch.no_grad():
             for data, target in val_loader:
-                data, target = data.to(self.device), target.to(self.device)
-                output = self.model(data)
-                loss = self.criterion(output, target)
+                data, target = self._prepare_batch(data, target)
+                with self._autocast():
+                    output = self.model(data)
+                    loss = self.criterion(output, target)
                 
-                total_loss += loss.item()
-                _, predicted = output.max(1)
-                total += target.size(0)
-                correct += predicted.eq(target).sum().item()
+                total_loss += loss
+                metrics.update(output, target)
+        
+        total_loss = all_reduce_sum(total_loss).item()
+        metrics.all_reduce()
+        scores = metrics.compute()
         
         return {
-            'val_loss': total_loss / len(val_loader),
-            'val_acc': 100. * correct / total
+            'val_loss': total_loss / (len(val_loader) * self.world_size),
+            'val_acc': 100. * scores['accuracy'],
+            **{f'val_{name}_{average}': scores[f'{name}_{average}']
+               for name in ('f1', 'precision', 'recall') for average in ('macro', 'micro')}
         }
     
     def save_model(self, epoch: int, metrics: Dict[str, float]):
         """
         Save the best model based on validation loss.
         
+        Only rank 0 writes checkpoints; validation metrics are reduced across
+        replicas, so every rank agrees on which epoch is the best.
+        
         Args:
             epoch: Current epoch number
             metrics: Dictionary of current metrics
         """
-        if metrics['val_loss'] < self.best_val_loss:
+        if metrics['val_loss'] < self.best_val_loss and self.is_main:
             self.best_val_loss = metrics['val_loss']
             
             # Create models directory if it doesn't exist
@@ -199,13 +466,169 @@ class ModelTrainer:
             self.best_model_path = models_dir / f'{self.model_name}_{timestamp}.pt'
             torch.save({
                 'epoch': epoch,
-                'model_state_dict': self.model.state_dict(),
+                'model_state_dict': self.unwrapped_model.state_dict(),
                 'optimizer_state_dict': self.optimizer.state_dict(),
                 'metrics': metrics,
+                'model_name': self.model_name,
+                'num_classes': self.num_classes,
+                'input_channels': self.input_channels,
+                'normalization': self.normalizer.to_dict() if self.normalizer else None,
             }, self.best_model_path)
             
             logger.info(f"Saved best model to {self.best_model_path}")
     
+    def _stop_requested(self, batch_idx: int) -> bool:
+        """
+        Whether training should stop for a preemption after the current step.
+        
+        Distributed replicas agree on the decision every 10 steps, alongside
+        the periodic log, so they all stop at the same step.
+        """
+        if self.preemption is None:
+            return False
+        if not self.distributed:
+            return self.preemption.requested
+        if batch_idx % 10 != 0:
+            return False
+        flag = torch.tensor([float(self.preemption.requested)], device=self.device)
+        return all_reduce_sum(flag).item() > 0
+    
+    def _resume_loader(self, train_loader: DataLoader, start_batch: int) -> DataLoader:
+        """
+        Build a loader over the batches of the current epoch not yet trained.
+        
+        The epoch's sample order is drawn from the (reseeded) sampler and the
+        first start_batch batches are dropped by index, so they are not loaded.
+        
+        Args:
+            train_loader: Training loader
+            start_batch: Number of batches already trained
+            
+        Returns:
+            Loader over the remaining batches
+        """
+        if isinstance(train_loader.dataset, IterableDataset):
+            return DataLoader(
+                train_loader.dataset.resume(start_batch, self.batch_size),
+                batch_size=self.batch_size,
+                num_workers=train_loader.num_workers,
+                pin_memory=train_loader.pin_memory
+            )
+        
+        indices = list(train_loader.sampler)[start_batch * self.batch_size:]
+        return DataLoader(
+            train_loader.dataset,
+            batch_size=self.batch_size,
+            sampler=indices,
+            num_workers=train_loader.num_workers,
+            pin_memory=train_loader.pin_memory
+        )
+    
+    def save_checkpoint(self, blocking: bool = False):
+        """
+        Save a resumable checkpoint of the full training state (rank 0 only).
+        
+        Args:
+            blocking: Wait until the checkpoint is on disk
+        """
+        if self.checkpoints is None or not self.is_main:
+            return
+        
+        active_run = mlflow.active_run()
+        self.checkpoints.save({
+            'epoch': self.epoch,
+            'batch_in_epoch': self.batch_in_epoch,
+            'global_step': self.global_step,
+            'model_state_dict': self.unwrapped_model.state_dict(),
+            'optimizer_state_dict': self.optimizer.state_dict(),
+            'scaler_state_dict': self.scaler.state_dict(),
+            'best_val_loss': self.best_val_loss,
+            'best_model_path': str(self.best_model_path) if self.best_model_path else None,
+            'rng_state': capture_rng_state(),
+            'mlflow_run_id': active_run.info.run_id if active_run else None,
+            'model_name': self.model_name,
+            'num_classes': self.num_classes,
+            'input_channels': self.input_channels
+        }, self.global_step, blocking=blocking)
+    
+    def resume_from_checkpoint(self) -> bool:
+        """
+        Restore the training state from the latest checkpoint, if there is one.
+        
+        Returns:
+            Whether a checkpoint was restored
+        """
+        if self.checkpoints is None:
+            return False
+        state = self.checkpoints.load_latest(map_location='cpu')
+        if state is None:
+            return False
+        
+        # A checkpoint of another configuration belongs to another run
+        for key in ('model_name', 'num_classes', 'input_channels'):
+            if key in state and state[key] != getattr(self, key):
+                raise ValueError(f"Checkpoint {self.checkpoints.latest()} has {key}={state[key]!r}, "
+                                 f"this run {getattr(self, key)!r}; use a separate checkpoint directory")
+        
+        self.unwrapped_model.load_state_dict(state['model_state_dict'])
+        self.optimizer.load_state_dict(state['optimizer_state_dict'])
+        self.scaler.load_state_dict(state['scaler_state_dict'])
+        restore_rng_state(state['rng_state'])
+        self.epoch = state['epoch']
+        self.batch_in_epoch = state['batch_in_epoch']
+        self.global_step = state['global_step']
+        self.best_val_loss = state['best_val_loss']
+        self.best_model_path = Path(state['best_model_path']) if state['best_model_path'] else None
+        self.mlflow_run_id = state['mlflow_run_id']
+        
+        logger.info(f"Resumed at epoch {self.epoch}, batch {self.batch_in_epoch} "
+                    f"(step {self.global_step})")
+        return True
+    
+    @property
+    def unwrapped_model(self) -> nn.Module:
+        """The model without its DistributedDataParallel wrapper."""
+        if isinstance(self.model, DistributedDataParallel):
+            return self.model.module
+        return self.model
+    
+    def run_epoch(self,
+                  train_loader: DataLoader,
+                  val_loader: DataLoader,
+                  epoch: int) -> Optional[Dict[str, float]]:
+        """
+        Train and validate one epoch, continuing a resumed epoch where it stopped.
+        
+        Args:
+            train_loader: DataLoader for training data
+            val_loader: DataLoader for validation data
+            epoch: Epoch number, which seeds the epoch's sample order
+            
+        Returns:
+            Combined training and validation metrics, or None if training was
+            preempted during the epoch (a checkpoint for resuming has been saved)
+        """
+        self.epoch = epoch
+        
+        # Reshuffle every epoch, reproducibly so a resume sees the same order
+        set_sampler_epoch(train_loader.sampler, epoch)
+        if hasattr(train_loader.dataset, 'set_epoch'):
+            train_loader.dataset.set_epoch(epoch)
+        
+        # Train, skipping the batches trained before a resume
+        loader = self._resume_loader(train_loader, self.batch_in_epoch) if self.batch_in_epoch else train_loader
+        train_metrics = self.train_epoch(loader, start_batch=self.batch_in_epoch)
+        if self.preempted:
+            logger.warning(f"Preempted at epoch {epoch}, step {self.global_step}; "
+                           f"checkpoint saved for resume")
+            return None
+        self.batch_in_epoch = 0
+        
+        # Validate
+        val_metrics = self.validate(val_loader)
+        
+        return {**train_metrics, **val_metrics}
+    
     def train(self, data_dir: str):
         """
         Train the model.
@@ -216,33 +639,42 @@ class ModelTrainer:
         # Load data
         train_loader, val_loader = self.load_data(data_dir)
         
-        # Start MLflow run
-        with mlflow.start_run(run_name=f'{self.model_name}_training'):
+        # Pick up where a preempted run left off
+        resumed = self.resume_from_checkpoint()
+        
+        # Start (or continue) the MLflow run (rank 0 only)
+        run = mlflow.start_run(run_id=self.mlflow_run_id,
+                               run_name=f'{self.model_name}_training') if self.is_main else nullcontext()
+        with run, PreemptionHandler() as self.preemption:
+            if self.is_main:
+                self.mlflow_run_id = mlflow.active_run().info.run_id
+            
             # Log parameters
-            mlflow.log_params({
-                'model_name': self.model_name,
-                'num_classes': self.num_classes,
-                'batch_size': self.batch_size,
-                'learning_rate': self.learning_rate,
-                'num_epochs': self.num_epochs,
-                'device': self.device
-            })
+            if self.is_main and not resumed:
+                mlflow.log_params({
+                    'model_name': self.model_name,
+                    'num_classes': self.num_classes,
+                    'batch_size': self.batch_size,
+                    'learning_rate': self.learning_rate,
+                    'num_epochs': self.num_epochs,
+                    'input_channels': self.input_channels,
+                    'class_balancing': self.class_balancing,
+                    'mixed_precision': self.mixed_precision,
+                    'channels_last': self.channels_last,
+                    'world_size': self.world_size,
+                    'device': self.device
+                })
             
             # Training loop
-            for epoch in range(1, self.num_epochs + 1):
+            for epoch in range(self.epoch, self.num_epochs + 1):
                 logger.info(f"\nEpoch {epoch}/{self.num_epochs}")
-                
-                # Train
-                train_metrics = self.train_epoch(train_loader)
-                
-                # Validate
-                val_metrics = self.validate(val_loader)
-                
-                # Combine metrics
-                metrics = {**train_metrics, **val_metrics}
+                metrics = self.run_epoch(train_loader, val_loader, epoch)
+                if metrics is None:
+                    break
                 
                 # Log metrics
-                mlflow.log_metrics(metrics, step=epoch)
+                if self.is_main:
+                    mlflow.log_metrics(metrics, step=epoch)
                 
                 # Save best model
                 self.save_model(epoch, metrics)
@@ -252,11 +684,30 @@ class ModelTrainer:
                           f"Train Loss: {metrics['train_loss']:.4f}, "
                           f"Train Acc: {metrics['train_acc']:.2f}%, "
                           f"Val Loss: {metrics['val_loss']:.4f}, "
-                          f"Val Acc: {metrics['val_acc']:.2f}%")
+                          f"Val Acc: {metrics['val_acc']:.2f}%, "
+                          f"Val F1 (macro): {metrics['val_f1_macro']:.4f}, "
+                          f"Throughput: {metrics['train_samples_per_sec']:.1f} samples/s")
             
-            # Log best model
-            if self.best_model_path:
+            # Log best model and its deployment artifacts
+            if self.best_model_path and self.is_main and not self.preempted:
                 mlflow.log_artifact(str(self.best_model_path))
+                if self.export_formats:
+                    exported = export_checkpoint(str(self.best_model_path), self.export_formats)
+                    for path in exported.values():
+                        mlflow.log_artifact(str(path))
+        
+        self.preemption = None
+        if self.checkpoints is not None:
+            # A finished run must not be resumed by the next one
+            if self.is_main and not self.preempted:
+                self.checkpoints.mark_complete({
+                    'model_name': self.model_name,
+                    'num_epochs': self.num_epochs,
+                    'global_step': self.global_step,
+                    'best_model_path': str(self.best_model_path) if self.best_model_path else None,
+                    'mlflow_run_id': self.mlflow_run_id
+                })
+            self.checkpoints.close()
 
 def main():
     """Main function to run training."""
@@ -266,6 +717,18 @@ def main():
     batch_size = int(os.getenv('BATCH_SIZE', '32'))
     learning_rate = float(os.getenv('LEARNING_RATE', '0.001'))
     num_epochs = int(os.getenv('NUM_EPOCHS', '10'))
+    input_channels = int(os.getenv('INPUT_CHANNELS', '4'))  # RGBY stains
+    class_balancing = os.getenv('CLASS_BALANCING', 'true').lower() == 'true'
+    mixed_precision = os.getenv('MIXED_PRECISION', 'false').lower() == 'true'
+    channels_last = os.getenv('CHANNELS_LAST', 'false').lower() == 'true'
+    # Distributed by default when launched as several Slurm/torchrun tasks
+    distributed = os.getenv('DISTRIBUTED', str(get_dist_env()['world_size'] > 1)).lower() == 'true'
+    # One directory per model and job, so unrelated runs never resume each other
+    checkpoint_dir = os.getenv('CHECKPOINT_DIR',
+                               os.path.join('checkpoints', f"{model_name}_{os.getenv('SLURM_JOB_ID', 'local')}"))
+    checkpoint_interval = int(os.getenv('CHECKPOINT_INTERVAL', '500'))
+    export_formats = tuple(f for f in os.getenv('EXPORT_FORMATS', 'torchscript,onnx').split(',') if f)
+    image_size = int(os.getenv('IMAGE_SIZE', '224'))
     
     # Create trainer
     trainer = ModelTrainer(
@@ -273,11 +736,27 @@ def main():
         num_classes=num_classes,
         batch_size=batch_size,
         learning_rate=learning_rate,
-        num_epochs=num_epochs
+        num_epochs=num_epochs,
+        input_channels=input_channels,
+        class_balancing=class_balancing,
+        mixed_precision=mixed_precision,
+        channels_last=channels_last,
+        distributed=distributed,
+        checkpoint_dir=checkpoint_dir,
+        checkpoint_interval=checkpoint_interval,
+        export_formats=export_formats,
+        image_size=image_size
     )
     
     # Train model
-    trainer.train(os.getenv('PREPROCESSED_DATA_DIR', 'data/preprocessing'))
+    try:
+        trainer.train(os.getenv('PREPROCESSED_DATA_DIR', 'data/preprocessing'))
+    finally:
+        cleanup_distributed()
+    
+    # Exit like a SIGTERM-killed process, so Slurm treats the job as preempted
+    if trainer.preempted:
+        sys.exit(128 + signal.SIGTERM)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
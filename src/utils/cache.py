@@ -0,0 +1,158 @@
+"""
+Content-Addressed Cache for Preprocessed Images
+
+Preprocessed images are stored as ``.npy`` files keyed by a hash of the
+source file contents and the preprocessing parameters, so re-running
+preprocessing with a different sample size or split only decodes images
+that have not been seen with the same settings before. Entries are evicted
+least-recently-used first once the cache grows beyond its size bound.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the preprocessing code changes in a way that invalidates cached entries
+CACHE_VERSION = 1
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 digest of a file's contents.
+
+    Args:
+        path: Path to the file
+        block_size: Read size in bytes
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PreprocessingCache:
+    """
+    Persistent, size-bounded LRU cache of preprocessed images.
+
+    Entries are plain files, so the cache can be shared by the worker
+    processes of a preprocessing pool: writes are atomic renames, a hit
+    refreshes the entry's modification time, and prune() evicts the least
+    recently used entries.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 50 * 1024 ** 3):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding the cache entries
+            max_bytes: Size bound enforced by prune()
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, source_files: List[str], params: Dict) -> str:
+        """
+        Compute the cache key of a preprocessed image.
+
+        Args:
+            source_files: Files the image is decoded from
+            params: Preprocessing parameters that affect the output
+
+        Returns:
+            Hex digest identifying the preprocessed image
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({'version': CACHE_VERSION, **params}, sort_keys=True).encode())
+        for path in source_files:
+            digest.update(hash_file(path).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f'{key}.npy'
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up a preprocessed image.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached array, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            array = np.load(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, EOFError):
+            return None
+        return array
+
+    def put(self, key: str, array: np.ndarray):
+        """
+        Store a preprocessed image.
+
+        Args:
+            key: Cache key
+            array: Preprocessed image
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def size(self) -> int:
+        """Total size of the cache entries in bytes."""
+        return sum(path.stat().st_size for path in self.cache_dir.glob('*/*.npy'))
+
+    def prune(self) -> int:
+        """
+        Evict least recently used entries until the cache fits its size bound.
+
+        Returns:
+            Number of evicted entries
+        """
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob('*/*.npy'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        evicted = 0
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+
+        if evicted:
+            logger.info(f"Evicted {evicted} cache entries, {total / 1024 ** 2:.1f} MB remaining")
+
+        return evicted
@@ -0,0 +1,227 @@
+"""
+Streaming Normalization Statistics
+
+This module computes per-channel or per-feature mean/variance in bounded
+memory (Welford's algorithm with Chan et al.'s parallel merge), persists
+them next to the preprocessed dataset, and applies them to batches of
+images in the training and inference input paths.
+"""
+
+import json
+import numpy as np
+import torch
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+NORMALIZATION_FILE = 'normalization.json'
+
+# Supported normalization modes
+NORMALIZATION_MODES = ('channel', 'feature')
+
+class RunningStats:
+    """
+    Streaming mean and variance over batches of samples.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], max_elements: int = 1 << 24):
+        """
+        Initialize the running statistics.
+
+        Args:
+            shape: Shape of a single sample the statistics are computed over
+            max_elements: Number of elements reduced at once, bounding temporary memory
+        """
+        self.shape = tuple(shape)
+        self.max_rows = max(1, max_elements // int(np.prod(self.shape)))
+        self.count = 0
+        self.mean = np.zeros(self.shape, dtype=np.float64)
+        self.m2 = np.zeros(self.shape, dtype=np.float64)
+
+    def update(self, batch: np.ndarray):
+        """
+        Add a batch of samples of shape (n, *shape).
+
+        Args:
+            batch: Batch of samples
+        """
+        batch = np.asarray(batch).reshape(-1, *self.shape)
+        for i in range(0, len(batch), self.max_rows):
+            rows = batch[i:i + self.max_rows]
+            batch_mean = rows.mean(axis=0, dtype=np.float64)
+            deviation = rows - batch_mean.astype(np.float32)
+            batch_m2 = np.square(deviation, dtype=np.float32).sum(axis=0, dtype=np.float64)
+            self._merge(len(rows), batch_mean, batch_m2)
+
+    def merge(self, other: 'RunningStats'):
+        """
+        Merge statistics computed over another partition of the data.
+
+        Args:
+            other: Statistics of the other partition
+        """
+        if other.shape != self.shape:
+            raise ValueError(f"Cannot merge statistics of shape {other.shape} into {self.shape}")
+        self._merge(other.count, other.mean, other.m2)
+
+    def _merge(self, count: int, mean: np.ndarray, m2: np.ndarray):
+        """Combine the current moments with those of another partition."""
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + np.square(delta) * (self.count * count / total)
+        self.count = total
+
+    @property
+    def var(self) -> np.ndarray:
+        """Population variance."""
+        if self.count == 0:
+            return np.zeros(self.shape, dtype=np.float64)
+        return self.m2 / self.count
+
+    @property
+    def std(self) -> np.ndarray:
+        """Population standard deviation, with constant features mapped to 1."""
+        std = np.sqrt(self.var)
+        std[std < 1e-8] = 1.0
+        return std
+
+class Normalizer:
+    """
+    Apply persisted normalization statistics to NCHW batches of images.
+
+    Statistics are expressed in float pixel units ([0, 1]); uint8 batches are
+    converted on the fly with the 1/255 scale folded into the statistics.
+    """
+
+    def __init__(self,
+                 mean: np.ndarray,
+                 std: np.ndarray,
+                 mode: str = 'channel',
+                 **metadata):
+        """
+        Initialize the normalizer.
+
+        Args:
+            mean: Per-channel (C,) or per-feature (H, W, C) mean
+            std: Standard deviation with the same shape as mean
+            mode: 'channel' or 'feature'
+            **metadata: Preprocessing settings stored alongside the statistics
+                (image_size, channel_layout, storage_dtype, count)
+        """
+        if mode not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode: {mode}")
+
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+        self.mode = mode
+        self.metadata = metadata
+        self.to('cpu')
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'Normalizer':
+        """Create a normalizer from its serialized form."""
+        state = dict(state)
+        return cls(state.pop('mean'), state.pop('std'), mode=state.pop('mode'), **state)
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> 'Normalizer':
+        """
+        Load a normalizer from a JSON file or a dataset directory.
+
+        Args:
+            path: Path to normalization.json, or the directory containing it
+        """
+        path = Path(path)
+        if path.is_dir():
+            path = path / NORMALIZATION_FILE
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self) -> Dict:
+        """Serialize the normalizer to a JSON-compatible dictionary."""
+        return {
+            'mode': self.mode,
+            'mean': self.mean.tolist(),
+            'std': self.std.tolist(),
+            **self.metadata
+        }
+
+    def save(self, path: Union[str, Path]):
+        """
+        Write the normalizer to a JSON file or a dataset directory.
+
+        Args:
+            path: Path to normalization.json, or the directory to write it to
+        """
+        path = Path(path)
+        if path.is_dir():
+            path = path / NORMALIZATION_FILE
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    def to(self, device: Union[str, torch.device]) -> 'Normalizer':
+        """
+        Move the statistics to a device.
+
+        Args:
+            device: Target device
+
+        Returns:
+            The normalizer itself
+        """
+        mean = torch.from_numpy(self.mean)
+        std = torch.from_numpy(self.std)
+        if self.mode == 'channel':
+            mean, std = mean.view(1, -1, 1, 1), std.view(1, -1, 1, 1)
+        else:
+            mean, std = mean.permute(2, 0, 1).unsqueeze(0), std.permute(2, 0, 1).unsqueeze(0)
+
+        self._mean = mean.contiguous().to(device)
+        self._std = std.contiguous().to(device)
+        self._pixel_mean = self._mean * 255.0
+        self._pixel_std = self._std * 255.0
+        return self
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        """
+        Normalize a batch of images.
+
+        Args:
+            batch: Tensor of shape (N, C, H, W), uint8 or float
+
+        Returns:
+            Normalized float tensor
+        """
+        if batch.dtype == torch.uint8:
+            return batch.float().sub_(self._pixel_mean).div_(self._pixel_std)
+        return (batch - self._mean) / self._std
+
+    def apply_numpy(self, samples: np.ndarray, chunk_size: int = 64):
+        """
+        Normalize float samples of shape (n, H, W, C) or (n, H*W*C) in place.
+
+        Args:
+            samples: Float array to normalize
+            chunk_size: Number of samples normalized at once
+        """
+        mean = self.mean.reshape(-1) if self.mode == 'feature' else self.mean
+        std = self.std.reshape(-1) if self.mode == 'feature' else self.std
+        for i in range(0, len(samples), chunk_size):
+            chunk = samples[i:i + chunk_size].reshape(-1, len(mean))
+            chunk -= mean
+            chunk /= std
+
+def load_normalizer(data_dir: str) -> Optional[Normalizer]:
+    """
+    Load the normalizer saved next to a preprocessed dataset, if any.
+
+    Args:
+        data_dir: Directory containing the preprocessed dataset
+
+    Returns:
+        The normalizer, or None if the dataset has no saved statistics
+    """
+    path = Path(data_dir) / NORMALIZATION_FILE
+    return Normalizer.from_file(path) if path.exists() else None
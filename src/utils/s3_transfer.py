@@ -0,0 +1,341 @@
+"""
+Parallel S3 Transfers
+
+A shared transfer manager for moving datasets, models and images between
+local disk and S3. All transfers of a manager go through one pooled boto3
+client and one s3transfer TransferManager, so thousands of small files are
+uploaded concurrently over reused connections and large files are split
+into multipart transfers.
+
+Files whose remote copy already has the same size and ETag are skipped, so
+re-running an upload or download only moves what changed. The ETag of a
+local file is computed the way S3 computes it for an unencrypted object
+uploaded with the manager's TransferConfig (MD5 of the file, or MD5 of the
+part MD5s for multipart uploads). Objects encrypted with SSE-KMS have
+opaque ETags and are always transferred again.
+
+Throttling and connection errors are retried by botocore; transfers that
+still fail are resubmitted with exponential backoff.
+"""
+
+import os
+import time
+import random
+import hashlib
+import boto3
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 ** 2
+
+DEFAULT_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=64 * MB,
+    multipart_chunksize=64 * MB,
+    max_concurrency=32,
+    use_threads=True
+)
+
+# Error codes worth another attempt; anything else (e.g. AccessDenied) fails fast
+RETRYABLE_ERROR_CODES = {
+    'RequestTimeout', 'RequestTimeoutException', 'SlowDown', 'Throttling',
+    'ThrottlingException', 'InternalError', 'ServiceUnavailable', '500', '503'
+}
+
+def create_client(max_pool_connections: int = 64,
+                  max_attempts: int = 10,
+                  region_name: Optional[str] = None):
+    """
+    Create an S3 client that can be shared by many transfer threads.
+
+    Args:
+        max_pool_connections: Size of the HTTP connection pool
+        max_attempts: Attempts per request in botocore's adaptive retry mode
+        region_name: AWS region (default: from the environment)
+
+    Returns:
+        boto3 S3 client
+    """
+    config = Config(
+        max_pool_connections=max_pool_connections,
+        retries={'max_attempts': max_attempts, 'mode': 'adaptive'}
+    )
+    return boto3.client('s3', region_name=region_name, config=config)
+
+def compute_etag(path: str, config: TransferConfig = DEFAULT_TRANSFER_CONFIG) -> str:
+    """
+    Compute the ETag S3 assigns to a file uploaded with a TransferConfig.
+
+    Args:
+        path: Path to the file
+        config: Transfer configuration deciding single-part vs multipart
+
+    Returns:
+        ETag without quotes
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if size < config.multipart_threshold:
+            digest = hashlib.md5()
+            for block in iter(lambda: f.read(8 * MB), b''):
+                digest.update(block)
+            return digest.hexdigest()
+
+        part_digests = [hashlib.md5(part).digest()
+                        for part in iter(lambda: f.read(config.multipart_chunksize), b'')]
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed transfer is worth another attempt."""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in RETRYABLE_ERROR_CODES
+    return isinstance(error, (BotoCoreError, ConnectionError, TimeoutError))
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for a 0-based retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class S3TransferManager:
+    """
+    Concurrent, resumable uploads and downloads over a pooled S3 client.
+    """
+
+    def __init__(self,
+                 client=None,
+                 config: TransferConfig = DEFAULT_TRANSFER_CONFIG,
+                 max_retries: int = 5,
+                 backoff_base: float = 0.5):
+        """
+        Initialize the manager.
+
+        Args:
+            client: boto3 S3 client (default: create_client() sized for the config)
+            config: Multipart thresholds, part size and number of concurrent requests
+            max_retries: Resubmissions of a failed transfer before giving up
+            backoff_base: Delay in seconds before the first resubmission
+        """
+        self.config = config
+        self.client = client or create_client(max_pool_connections=max(config.max_concurrency, 10))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._manager = create_transfer_manager(self.client, config)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Wait for outstanding transfers and release the transfer threads."""
+        self._manager.shutdown()
+
+    def list_objects(self, bucket: str, prefix: str = '') -> Dict[str, dict]:
+        """
+        List the objects under a prefix.
+
+        Args:
+            bucket: Bucket name
+            prefix: Key prefix
+
+        Returns:
+            Mapping of key to {'size', 'etag'}
+        """
+        objects = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = {'size': obj['Size'], 'etag': obj['ETag'].strip('"')}
+        return objects
+
+    def _remote_object(self, bucket: str, key: str) -> Optional[dict]:
+        try:
+            head = self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return {'size': head['ContentLength'], 'etag': head['ETag'].strip('"')}
+
+    def is_unchanged(self, path: str, remote: Optional[dict]) -> bool:
+        """
+        Whether a local file matches a remote object by size and ETag.
+
+        Args:
+            path: Local file
+            remote: Entry of list_objects(), or None if there is no remote object
+
+        Returns:
+            True if the file does not need to be transferred
+        """
+        if remote is None or not os.path.isfile(path):
+            return False
+        if os.path.getsize(path) != remote['size']:
+            return False
+        return compute_etag(path, self.config) == remote['etag']
+
+    def _run(self,
+             transfers: List[Tuple[str, str, str]],
+             submit: Callable,
+             callback: Optional[Callable[[str, str], None]] = None) -> Dict[str, int]:
+        """
+        Run (bucket, key, path) transfers concurrently, resubmitting retryable failures.
+
+        Returns:
+            Counts of transferred and failed files
+        """
+        result = {'transferred': 0, 'failed': 0}
+        pending = transfers
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(backoff_delay(attempt - 1, base=self.backoff_base))
+            futures = [(transfer, submit(*transfer)) for transfer in pending]
+
+            pending = []
+            for transfer, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    if is_retryable(e) and attempt < self.max_retries:
+                        pending.append(transfer)
+                        continue
+                    logger.error(f"Failed to transfer s3://{transfer[0]}/{transfer[1]}: {e}")
+                    result['failed'] += 1
+                    if callback:
+                        callback(transfer[1], 'failed')
+                    continue
+                result['transferred'] += 1
+                if callback:
+                    callback(transfer[1], 'transferred')
+
+            if not pending:
+                break
+            logger.warning(f"Retrying {len(pending)} transfers (attempt {attempt + 1} of {self.max_retries})")
+        return result
+
+    def upload_files(self,
+                     files: Iterable[Tuple[str, str]],
+                     bucket: str,
+                     skip_unchanged: bool = True,
+                     callback: Optional[Callable[[str, str], None]] = None) -> Dict[str, int]:
+        """
+        Upload files concurrently.
+
+        Args:
+            files: (local path, key) pairs
+            bucket: Destination bucket
+            skip_unchanged: Skip files whose object already has the same size and ETag
+            callback: Called with (key, 'transferred' | 'skipped' | 'failed') per file
+
+        Returns:
+            Counts of transferred, skipped and failed files
+        """
+        files = [(str(path), key) for path, key in files]
+        remote = {}
+        if skip_unchanged and files:
+            # One listing of the common prefix instead of a HEAD request per file
+            prefix = os.path.commonprefix([key for _, key in files])
+            remote = self.list_objects(bucket, prefix)
+
+        transfers, skipped = [], 0
+        for path, key in files:
+            if skip_unchanged and self.is_unchanged(path, remote.get(key)):
+                skipped += 1
+                if callback:
+                    callback(key, 'skipped')
+                continue
+            transfers.append((bucket, key, path))
+
+        result = self._run(transfers, lambda b, k, p: self._manager.upload(p, b, k), callback)
+        result['skipped'] = skipped
+        logger.info(f"Uploaded {result['transferred']} files to s3://{bucket} "
+                    f"({skipped} unchanged, {result['failed']} failed)")
+        return result
+
+    def upload_file(self, path: str, bucket: str, key: str, skip_unchanged: bool = True) -> bool:
+        """
+        Upload a single file, as a multipart upload if it is large.
+
+        Args:
+            path: Local file
+            bucket: Destination bucket
+            key: Destination key
+            skip_unchanged: Skip the upload if the object already has the same size and ETag
+
+        Returns:
+            True if the object is up to date
+        """
+        if skip_unchanged and self.is_unchanged(path, self._remote_object(bucket, key)):
+            logger.info(f"s3://{bucket}/{key} is up to date")
+            return True
+        return self._run([(bucket, key, str(path))], lambda b, k, p: self._manager.upload(p, b, k))['failed'] == 0
+
+    def upload_directory(self,
+                         local_dir: str,
+                         bucket: str,
+                         prefix: str = '',
+                         pattern: str = '**/*',
+                         **kwargs) -> Dict[str, int]:
+        """
+        Upload the files of a directory, keyed by their path relative to it.
+
+        Args:
+            local_dir: Directory to upload
+            bucket: Destination bucket
+            prefix: Key prefix
+            pattern: Glob selecting the files to upload
+            **kwargs: Passed to upload_files
+
+        Returns:
+            Counts of transferred, skipped and failed files
+        """
+        local_dir = Path(local_dir)
+        prefix = prefix.rstrip('/')
+        files = [(path, f"{prefix}/{path.relative_to(local_dir).as_posix()}" if prefix
+                  else path.relative_to(local_dir).as_posix())
+                 for path in sorted(local_dir.glob(pattern)) if path.is_file()]
+        return self.upload_files(files, bucket, **kwargs)
+
+    def download_prefix(self,
+                        bucket: str,
+                        prefix: str,
+                        local_dir: str,
+                        skip_unchanged: bool = True,
+                        callback: Optional[Callable[[str, str], None]] = None) -> Dict[str, int]:
+        """
+        Download every object under a prefix, keeping the key layout below it.
+
+        Args:
+            bucket: Source bucket
+            prefix: Key prefix
+            local_dir: Destination directory
+            skip_unchanged: Skip files that already match the object's size and ETag
+            callback: Called with (key, 'transferred' | 'skipped' | 'failed') per file
+
+        Returns:
+            Counts of transferred, skipped and failed files
+        """
+        local_dir = Path(local_dir)
+        transfers, skipped = [], 0
+        for key, remote in self.list_objects(bucket, prefix).items():
+            if key.endswith('/'):
+                continue
+            path = local_dir / key[len(prefix):].lstrip('/')
+            if skip_unchanged and self.is_unchanged(str(path), remote):
+                skipped += 1
+                if callback:
+                    callback(key, 'skipped')
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            transfers.append((bucket, key, str(path)))
+
+        result = self._run(transfers, lambda b, k, p: self._manager.download(b, k, p), callback)
+        result['skipped'] = skipped
+        logger.info(f"Downloaded {result['transferred']} files from s3://{bucket}/{prefix} "
+                    f"({skipped} unchanged, {result['failed']} failed)")
+        return result
@@ -0,0 +1,166 @@
+"""
+Buffered, Non-Blocking MLflow Logging
+
+Every mlflow.log_metric call is a synchronous file or HTTP write, and
+opening a run per batch or per epoch adds several more. BufferedMLflowLogger
+keeps a single long-lived run, queues metrics and params in memory, and
+writes them with log_batch from a background thread, so hot loops never
+wait on the tracking server.
+"""
+
+import os
+import time
+import queue
+import threading
+from mlflow.entities import Metric, Param, RunStatus
+from mlflow.tracking import MlflowClient
+import mlflow
+from typing import Dict, List, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# log_batch limits per request
+MAX_METRICS_PER_BATCH = 1000
+MAX_PARAMS_PER_BATCH = 100
+
+class BufferedMLflowLogger:
+    """
+    Log metrics and params to one MLflow run asynchronously.
+
+    The run is created lazily by the flush thread, so constructing the
+    logger and logging to it never touch the tracking server. When an MLflow
+    run is already active, the logger writes to it and leaves it open.
+    With enabled=False every method is a no-op.
+    """
+
+    def __init__(self,
+                 run_name: Optional[str] = None,
+                 run_id: Optional[str] = None,
+                 experiment_name: Optional[str] = None,
+                 enabled: bool = True,
+                 flush_interval: float = 5.0,
+                 max_queue_size: int = 100000):
+        """
+        Initialize the logger and start its flush thread.
+
+        Args:
+            run_name: Name of the run to create
+            run_id: Existing run to log to (default: the active run, or a new one)
+            experiment_name: Experiment of a new run (default: MLFLOW_EXPERIMENT_ID or 0)
+            enabled: Log anything at all
+            flush_interval: Seconds between flushes
+            max_queue_size: Entries buffered before new ones are dropped
+        """
+        self.enabled = enabled
+        self.run_name = run_name
+        self.experiment_name = experiment_name
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        if not enabled:
+            return
+
+        active_run = mlflow.active_run()
+        self.run_id = run_id or (active_run.info.run_id if active_run else None)
+        self._owns_run = self.run_id is None
+        self._client = MlflowClient()
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='mlflow-logger', daemon=True)
+        self._thread.start()
+
+    def log_metric(self, key: str, value: float, step: Optional[int] = None):
+        """Queue a metric."""
+        self.log_metrics({key: value}, step=step)
+
+    def log_metrics(self, metrics: Dict[str, float], step: Optional[int] = None):
+        """
+        Queue metrics sharing a step and timestamp.
+
+        Args:
+            metrics: Metric values by name
+            step: Training step or batch index
+        """
+        if not self.enabled:
+            return
+        timestamp = int(time.time() * 1000)
+        for key, value in metrics.items():
+            self._put(Metric(key, float(value), timestamp, step or 0))
+
+    def log_params(self, params: Dict[str, Union[str, int, float, bool]]):
+        """
+        Queue params.
+
+        Args:
+            params: Param values by name
+        """
+        if not self.enabled:
+            return
+        for key, value in params.items():
+            self._put(Param(key, str(value)))
+
+    def flush(self):
+        """Write the queued entries with log_batch."""
+        if not self.enabled:
+            return
+        with self._flush_lock:
+            metrics: List[Metric] = []
+            params: List[Param] = []
+            while True:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                (metrics if isinstance(entry, Metric) else params).append(entry)
+            if not metrics and not params:
+                return
+
+            try:
+                self._ensure_run()
+                for i in range(0, len(params), MAX_PARAMS_PER_BATCH):
+                    self._client.log_batch(self.run_id, params=params[i:i + MAX_PARAMS_PER_BATCH])
+                for i in range(0, len(metrics), MAX_METRICS_PER_BATCH):
+                    self._client.log_batch(self.run_id, metrics=metrics[i:i + MAX_METRICS_PER_BATCH])
+            except Exception as e:
+                logger.warning(f"Failed to log {len(metrics)} metrics and {len(params)} params "
+                               f"to MLflow: {e}")
+
+    def close(self):
+        """Stop the flush thread, write the remaining entries and end an owned run."""
+        if not self.enabled or self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        if self._owns_run and self.run_id is not None:
+            self._client.set_terminated(self.run_id, RunStatus.to_string(RunStatus.FINISHED))
+        if self.dropped:
+            logger.warning(f"MLflow logger dropped {self.dropped} entries")
+
+    def __enter__(self) -> 'BufferedMLflowLogger':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _put(self, entry: Union[Metric, Param]):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_run(self):
+        if self.run_id is not None:
+            return
+        if self.experiment_name:
+            experiment = self._client.get_experiment_by_name(self.experiment_name)
+            experiment_id = (experiment.experiment_id if experiment
+                             else self._client.create_experiment(self.experiment_name))
+        else:
+            experiment_id = os.getenv('MLFLOW_EXPERIMENT_ID', '0')
+        self.run_id = self._client.create_run(experiment_id, run_name=self.run_name).info.run_id
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,11 @@
+import mlflow
+import pytest
+
+@pytest.fixture
+def mlflow_tracking(tmp_path, monkeypatch):
+    """Point MLflow at a throwaway local tracking store."""
+    monkeypatch.setenv('MLFLOW_TRACKING_URI', (tmp_path / 'mlruns').as_uri())
+    monkeypatch.setenv('MLFLOW_ALLOW_FILE_STORE', 'true')
+    yield tmp_path / 'mlruns'
+    while mlflow.active_run():
+        mlflow.end_run()
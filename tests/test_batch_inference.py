@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from src.data.sharded_dataset import ShardWriter
+from src.inference.batch_inference import (assigned_shards, iter_predictions, output_shard_path,
+                                           score_shards)
+from src.inference.inference import ModelInference
+
+NUM_CLASSES = 5
+
+@pytest.fixture
+def split_dir(tmp_path):
+    """Write a uint8 RGBY split of 11 samples in shards of 4."""
+    images = np.random.default_rng(0).integers(0, 256, (11, 16, 16, 4), dtype=np.uint8)
+    with ShardWriter(tmp_path / 'test', (16, 16, 4), NUM_CLASSES, dtype='uint8', shard_size=4) as writer:
+        writer.write(images, np.zeros((11, NUM_CLASSES), dtype=np.uint8))
+    return tmp_path / 'test', images
+
+def test_scores_every_shard_and_resumes(split_dir, tmp_path):
+    """Test that predictions match in-memory inference and finished shards are skipped."""
+    split, images = split_dir
+    engine = ModelInference('lightweight', NUM_CLASSES, device='cpu', image_size=16)
+    output_dir = tmp_path / 'predictions'
+    
+    assert score_shards(engine, str(split), str(output_dir), shards=[0], batch_size=3, num_workers=0) == 4
+    assert score_shards(engine, str(split), str(output_dir), batch_size=3, num_workers=0) == 7
+    
+    _, expected = engine.predict(images)
+    np.testing.assert_allclose(np.concatenate(list(iter_predictions(str(output_dir)))), expected,
+                               rtol=1e-5, atol=1e-6)
+    assert output_shard_path(str(output_dir), 2).exists()
+    assert not list(output_dir.glob('*.tmp'))
+
+def test_shards_are_split_across_array_tasks():
+    """Test that array tasks get disjoint round-robin shares of the shard range."""
+    shares = [assigned_shards(10, task_id=t, num_tasks=3, start_shard=1, end_shard=9) for t in range(3)]
+    
+    assert shares == [[3, 6], [1, 4, 7], [2, 5, 8]]
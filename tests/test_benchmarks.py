@@ -0,0 +1,49 @@
+import pytest
+
+from benchmarks.throughput import SUITES, compare_results, run_benchmarks, summarize, time_calls
+
+def _report(**results):
+    return {'environment': {}, 'results': results}
+
+def test_summarize_reports_percentiles_and_throughput():
+    """Test that throughput counts every item of every timed call."""
+    summary = summarize([0.01] * 9 + [0.11], items_per_call=4)
+
+    assert summary['p50_ms'] == pytest.approx(10.0)
+    assert summary['p99_ms'] > 100.0
+    assert summary['items_per_sec'] == pytest.approx(40 / 0.2)
+
+def test_time_calls_runs_warmup_and_minimum_repeats():
+    calls = []
+
+    times = time_calls(lambda: calls.append(1), repeats=4, warmup=2)
+
+    assert len(times) == 4 and len(calls) == 6
+
+def test_compare_results_flags_slowdowns_beyond_tolerance():
+    """Test that lower throughput and higher latency count as regressions, in either direction only."""
+    baseline = _report(
+        loader_sharded={'items_per_sec': 1000.0, 'p50_ms': 10.0, 'p99_ms': 20.0},
+        train_step_resnet18_bs16={'items_per_sec': 100.0, 'p50_ms': 160.0, 'p99_ms': 200.0}
+    )
+    current = _report(
+        loader_sharded={'items_per_sec': 1500.0, 'p50_ms': 6.0, 'p99_ms': 22.0},
+        train_step_resnet18_bs16={'items_per_sec': 80.0, 'p50_ms': 160.0, 'p99_ms': 200.0},
+        predict_lightweight_bs1={'items_per_sec': 50.0, 'p50_ms': 20.0, 'p99_ms': 30.0}
+    )
+
+    regressions = compare_results(current, baseline, tolerance=0.15)
+
+    assert [(r['benchmark'], r['metric']) for r in regressions] == [('train_step_resnet18_bs16', 'items_per_sec')]
+    assert regressions[0]['change'] == pytest.approx(-0.2)
+
+def test_every_suite_runs_at_a_tiny_image_size():
+    """Smoke test that each suite produces summarized results."""
+    report = run_benchmarks(SUITES, image_size=16, min_time=0.0)
+
+    results = report['results']
+    for prefix in ('preprocess_', 'loader_', 'train_step_', 'predict_'):
+        assert any(name.startswith(prefix) for name in results), prefix
+    assert {'predict_lightweight_bs1', 'predict_resnet18_bs32'} <= set(results)
+    assert all(metrics['items_per_sec'] > 0 for metrics in results.values())
+    assert report['environment']['image_size'] == 16
@@ -0,0 +1,35 @@
+import os
+import numpy as np
+
+from src.utils.cache import PreprocessingCache
+
+def test_cache_round_trip_and_key(tmp_path):
+    """Test that entries round-trip and keys depend on content and parameters."""
+    source = tmp_path / 'image.png'
+    source.write_bytes(b'first')
+    cache = PreprocessingCache(tmp_path / 'cache')
+    key = cache.key([str(source)], {'image_size': 8})
+    
+    assert cache.get(key) is None
+    cache.put(key, np.arange(6, dtype=np.uint8).reshape(2, 3))
+    np.testing.assert_array_equal(cache.get(key), np.arange(6).reshape(2, 3))
+    
+    assert cache.key([str(source)], {'image_size': 16}) != key
+    source.write_bytes(b'second')
+    assert cache.key([str(source)], {'image_size': 8}) != key
+
+def test_cache_prune_evicts_least_recently_used(tmp_path):
+    """Test that pruning evicts the least recently used entries first."""
+    cache = PreprocessingCache(tmp_path, max_bytes=0)
+    for i, key in enumerate(['aa01', 'bb02', 'cc03']):
+        cache.put(key, np.zeros(100, dtype=np.uint8))
+        os.utime(cache._path(key), (i, i))
+    entry_size = cache.size() // 3
+    cache.max_bytes = 2 * entry_size
+    
+    cache.get('aa01')  # refreshes the oldest entry
+    
+    assert cache.prune() == 1
+    assert cache.get('bb02') is None
+    assert cache.get('aa01') is not None
+    assert cache.get('cc03') is not None
@@ -0,0 +1,85 @@
+import os
+import signal
+
+import numpy as np
+import pytest
+import torch
+
+from src.data.sharded_dataset import ShardWriter
+from src.training.checkpoint import CheckpointManager, PreemptionHandler
+from src.training.train import ModelTrainer
+
+NUM_CLASSES = 3
+
+def test_checkpoints_are_snapshots_and_pruned(tmp_path):
+    """Test that a save captures the state at call time and only the latest are kept."""
+    manager = CheckpointManager(str(tmp_path), keep=2)
+    weights = torch.zeros(3)
+    
+    for step in range(1, 4):
+        weights += 1
+        manager.save({'weights': weights}, step)
+    manager.close()
+    
+    assert [p.name for p in manager.checkpoints()] == ['checkpoint_00000002.pt', 'checkpoint_00000003.pt']
+    torch.testing.assert_close(manager.load_latest()['weights'], torch.full((3,), 3.0))
+    assert not list(tmp_path.glob('*.tmp'))
+
+def test_sigterm_requests_a_stop():
+    """Test that SIGTERM is recorded rather than terminating the process."""
+    with PreemptionHandler() as preemption:
+        os.kill(os.getpid(), signal.SIGTERM)
+        assert preemption.requested
+    
+    assert signal.getsignal(signal.SIGTERM) is not preemption.request
+
+def _make_trainer(checkpoint_dir):
+    torch.manual_seed(0)
+    return ModelTrainer('lightweight', NUM_CLASSES, batch_size=2, num_epochs=2, device='cpu',
+                        input_channels=4, checkpoint_dir=str(checkpoint_dir), checkpoint_interval=2)
+
+def _write_dataset(data_dir):
+    rng = np.random.default_rng(0)
+    for split, n in [('train', 10), ('test', 4)]:
+        with ShardWriter(data_dir / split, (16, 16, 4), NUM_CLASSES, dtype='uint8') as writer:
+            writer.write(rng.integers(0, 256, (n, 16, 16, 4), dtype=np.uint8),
+                         rng.integers(0, 2, (n, NUM_CLASSES), dtype=np.uint8))
+
+def test_preempted_run_resumes_mid_epoch(tmp_path, mlflow_tracking, monkeypatch):
+    """Test that a preempted run resumes at the saved step and finishes the remaining epochs."""
+    monkeypatch.setenv('MODEL_SAVE_DIR', str(tmp_path / 'models'))
+    _write_dataset(tmp_path / 'data')
+    
+    # Request a stop as soon as the third step of the first epoch is done
+    trainer = _make_trainer(tmp_path / 'checkpoints')
+    monkeypatch.setattr(trainer, '_stop_requested', lambda batch_idx: trainer.global_step == 3)
+    trainer.train(str(tmp_path / 'data'))
+    
+    assert trainer.preempted
+    state = CheckpointManager(str(tmp_path / 'checkpoints')).load_latest()
+    assert (state['epoch'], state['batch_in_epoch'], state['global_step']) == (1, 3, 3)
+    
+    resumed = _make_trainer(tmp_path / 'checkpoints')
+    assert resumed.resume_from_checkpoint()
+    for name, value in resumed.unwrapped_model.state_dict().items():
+        torch.testing.assert_close(value, state['model_state_dict'][name])
+    
+    resumed.train(str(tmp_path / 'data'))
+    
+    assert not resumed.preempted
+    assert resumed.global_step == 10
+    assert resumed.mlflow_run_id == state['mlflow_run_id']
+    
+    # The finished run leaves nothing for the next run to resume
+    manager = CheckpointManager(str(tmp_path / 'checkpoints'))
+    assert manager.is_complete() and manager.latest() is None
+    assert not _make_trainer(tmp_path / 'checkpoints').resume_from_checkpoint()
+
+def test_checkpoint_of_another_model_is_not_resumed(tmp_path):
+    """Test that resuming refuses a checkpoint written for a different model configuration."""
+    _make_trainer(tmp_path).save_checkpoint(blocking=True)
+    
+    other = ModelTrainer('lightweight', NUM_CLASSES + 1, device='cpu', input_channels=4,
+                         checkpoint_dir=str(tmp_path))
+    with pytest.raises(ValueError, match='num_classes'):
+        other.resume_from_checkpoint()
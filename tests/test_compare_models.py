@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import torch
+
+from src.evaluation.compare_models import ModelEvaluator, gather_results, save_result
+
+@pytest.fixture
+def protein_data():
+    """A small separable 3-class problem."""
+    rng = np.random.default_rng(0)
+    y = np.repeat(np.arange(3), 16)
+    X = rng.normal(size=(len(y), 32)).astype(np.float32)
+    X[:, :3] += 3 * np.eye(3)[y]
+    return X[::2], X[1::2], y[::2], y[1::2]
+
+def test_candidates_train_in_parallel_processes(protein_data, mlflow_tracking, monkeypatch, tmp_path):
+    """Test that each candidate is trained in a worker process and reported like a sequential run."""
+    monkeypatch.chdir(tmp_path)
+    evaluator = ModelEvaluator(32, 3, torch.device('cpu'), max_epochs=6, patience=2,
+                               checkpoint_dir=str(tmp_path / 'checkpoints'))
+    
+    results = evaluator.train_and_evaluate(*protein_data, max_workers=2)
+    
+    assert list(results) == ['Lightweight CNN', 'ResNet']
+    for metrics in results.values():
+        assert 0.0 <= metrics['f1_score'] <= 1.0
+        assert metrics['training_time'] > 0
+        assert metrics['confusion_matrix'].shape == (3, 2, 2)
+        assert metrics['confusion_matrix'][:, 1].sum() == 24
+        assert metrics['epochs_run'] + metrics['epochs_saved'] == 6
+        assert 1 <= metrics['best_epoch'] <= metrics['epochs_run']
+    assert (tmp_path / 'checkpoints' / 'best_model_resnet.pth').exists()
+    assert not list(tmp_path.glob('*.pth'))
+    
+    evaluator.plot_results(results, str(tmp_path / 'evaluation'))
+    evaluator.generate_report(results, str(tmp_path / 'evaluation'))
+    assert (tmp_path / 'evaluation' / 'evaluation_report.md').exists()
+
+def test_array_task_results_are_gathered(tmp_path):
+    """Test that results saved by separate tasks are gathered in candidate order."""
+    save_result(str(tmp_path), 'ResNet', {'f1_score': 0.5, 'confusion_matrix': np.zeros((3, 2, 2))})
+    
+    with pytest.raises(FileNotFoundError):
+        gather_results(str(tmp_path), ['Lightweight CNN', 'ResNet'])
+    
+    save_result(str(tmp_path), 'Lightweight CNN', {'f1_score': 0.75, 'confusion_matrix': np.ones((3, 2, 2))})
+    results = gather_results(str(tmp_path), ['Lightweight CNN', 'ResNet'])
+    
+    assert list(results) == ['Lightweight CNN', 'ResNet']
+    assert results['Lightweight CNN']['f1_score'] == 0.75
+    np.testing.assert_array_equal(results['ResNet']['confusion_matrix'], np.zeros((3, 2, 2)))
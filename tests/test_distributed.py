@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from src.training.distributed import (DistributedWeightedSampler, all_reduce_sum, first_host,
+                                      get_dist_env, init_distributed)
+
+@pytest.mark.parametrize('nodelist, host', [('gpu-1', 'gpu-1'),
+                                            ('gpu-[3-5,7]', 'gpu-3'),
+                                            ('compute-dy-g4dn-[12,14]', 'compute-dy-g4dn-12')])
+def test_first_host_of_slurm_nodelist(nodelist, host):
+    """Test that the rendezvous host is the first node of the Slurm allocation."""
+    assert first_host(nodelist) == host
+
+def test_slurm_environment_takes_precedence(monkeypatch):
+    """Test that Slurm variables override the torchrun-style ones."""
+    monkeypatch.setenv('RANK', '0')
+    monkeypatch.setenv('WORLD_SIZE', '2')
+    monkeypatch.setenv('SLURM_PROCID', '3')
+    monkeypatch.setenv('SLURM_NTASKS', '4')
+    monkeypatch.setenv('SLURM_LOCALID', '1')
+    
+    assert get_dist_env() == {'rank': 3, 'world_size': 4, 'local_rank': 1}
+
+def test_weighted_sampler_shards_one_balanced_epoch():
+    """Test that replicas draw disjoint slices of the same weighted sample."""
+    labels = np.zeros((10, 2), dtype=np.uint8)
+    labels[:8, 0] = 1
+    labels[8:, 1] = 1
+    samplers = [DistributedWeightedSampler(labels, num_replicas=2, rank=rank, seed=0) for rank in range(2)]
+    
+    shards = [list(sampler) for sampler in samplers]
+    single = DistributedWeightedSampler(labels, num_replicas=1, rank=0, seed=0)
+    
+    assert [len(shard) for shard in shards] == [5, 5]
+    assert sorted(shards[0] + shards[1]) == sorted(single)
+    samplers[0].set_epoch(1)
+    assert list(samplers[0]) != shards[0]
+
+def _all_reduce_worker(rank, world_size, port, results):
+    import os
+    os.environ.update({'SLURM_PROCID': str(rank), 'SLURM_NTASKS': str(world_size),
+                       'SLURM_LOCALID': str(rank), 'MASTER_ADDR': '127.0.0.1', 'MASTER_PORT': str(port)})
+    env = init_distributed(backend='gloo')
+    results[rank] = all_reduce_sum(torch.tensor([float(env['rank'] + 1)])).item()
+    dist.destroy_process_group()
+
+def test_gloo_all_reduce_across_processes():
+    """Test that two local CPU processes join a gloo group and sum their tensors."""
+    results = mp.Manager().dict()
+    
+    mp.spawn(_all_reduce_worker, args=(2, 29517, results), nprocs=2)
+    
+    assert dict(results) == {0: 3.0, 1: 3.0}
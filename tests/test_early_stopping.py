@@ -0,0 +1,39 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from src.training.early_stopping import BestStateTracker, EarlyStopping, is_improvement
+
+def test_tracker_keeps_an_independent_copy_of_the_best_weights(tmp_path):
+    """Test that later updates to the model do not leak into the tracked best state."""
+    model = nn.Linear(3, 2)
+    tracker = BestStateTracker(mode='max')
+    
+    assert tracker.update(model, 0.5, epoch=1)
+    best_weight = model.weight.detach().clone()
+    with torch.no_grad():
+        model.weight.add_(1.0)
+    assert not tracker.update(model, 0.4, epoch=2)
+    
+    tracker.restore(model)
+    torch.testing.assert_close(model.weight.detach(), best_weight)
+    assert (tracker.best_epoch, tracker.best_score, tracker.num_improvements) == (1, 0.5, 1)
+    
+    path = tracker.save(str(tmp_path / 'best.pth'))
+    torch.testing.assert_close(torch.load(path)['weight'], best_weight)
+
+def test_early_stopping_waits_for_patience():
+    """Test that training stops after `patience` epochs without a large enough improvement."""
+    stopper = EarlyStopping(patience=2, mode='max', min_delta=0.01)
+    
+    assert [stopper.step(score) for score in [0.50, 0.60, 0.605, 0.70, 0.70, 0.69]] == \
+        [False, False, False, False, False, True]
+    assert stopper.best_score == 0.70
+
+def test_is_improvement_modes():
+    """Test both optimization directions."""
+    assert is_improvement(0.3, None, mode='min')
+    assert is_improvement(0.3, 0.5, mode='min')
+    assert not is_improvement(0.5, 0.3, mode='min')
+    with pytest.raises(ValueError):
+        is_improvement(0.5, 0.3, mode='best')
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from src.inference.inference import ModelInference
+from src.models.export import artifact_path, export_checkpoint
+from src.training.train import ModelTrainer
+from src.utils.normalization import Normalizer
+
+NUM_CLASSES = 5
+
+@pytest.fixture
+def checkpoint(tmp_path, monkeypatch):
+    """Save a lightweight RGBY checkpoint with 32x32 normalization statistics."""
+    monkeypatch.setenv('MODEL_SAVE_DIR', str(tmp_path))
+    trainer = ModelTrainer('lightweight', NUM_CLASSES, device='cpu', input_channels=4)
+    trainer.set_normalizer(Normalizer([0.1, 0.2, 0.3, 0.4], [0.5, 0.5, 0.25, 0.25],
+                                      image_size=32, storage_dtype='uint8'))
+    trainer.save_model(1, {'val_loss': 0.5})
+    return str(trainer.best_model_path)
+
+def test_export_writes_artifacts_next_to_checkpoint(checkpoint):
+    """Test that both artifacts are written beside the .pt checkpoint."""
+    pytest.importorskip('onnx')
+    
+    paths = export_checkpoint(checkpoint)
+    
+    assert paths == {'torchscript': artifact_path(checkpoint, 'torchscript'),
+                     'onnx': artifact_path(checkpoint, 'onnx')}
+    assert all(path.exists() for path in paths.values())
+
+@pytest.mark.parametrize('backend', ['torchscript', 'onnx'])
+def test_backend_parity_with_eager(backend, checkpoint):
+    """Test that compiled backends match eager outputs within tolerance."""
+    if backend == 'onnx':
+        pytest.importorskip('onnxruntime')
+    images = np.random.default_rng(0).integers(0, 256, (3, 32, 32, 4), dtype=np.uint8)
+    
+    _, expected = ModelInference('lightweight', NUM_CLASSES, model_path=checkpoint, device='cpu').predict(images)
+    _, probabilities = ModelInference('lightweight', NUM_CLASSES, model_path=checkpoint, device='cpu',
+                                      backend=backend).predict(images)
+    
+    np.testing.assert_allclose(probabilities, expected, rtol=1e-4, atol=1e-5)
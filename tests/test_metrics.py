@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from infrastructure.ml.utils.metrics import MAX_METRICS_PER_REQUEST, InMemorySink, MetricSink, MetricsEmitter
+
+def test_datapoints_are_aggregated_per_metric():
+    """Test that each flush sends one StatisticValues entry per metric and dimension set."""
+    sink = InMemorySink()
+    emitter = MetricsEmitter('Test', sink=sink, flush_interval=3600)
+    
+    for value in [1.0, 2.0, 6.0]:
+        emitter.put('Loss', value)
+    emitter.put('Latency', 5.0, 'Milliseconds', {'Model': 'resnet18'})
+    emitter.close()
+    
+    by_name = {entry['MetricName']: entry for entry in sink.metric_data}
+    assert by_name['Loss']['StatisticValues'] == {'SampleCount': 3, 'Sum': 9.0, 'Minimum': 1.0, 'Maximum': 6.0}
+    assert by_name['Latency']['Dimensions'] == [{'Name': 'Model', 'Value': 'resnet18'}]
+    assert emitter.sent == 4
+
+def test_batches_respect_request_limit():
+    """Test that a flush is split into PutMetricData-sized batches."""
+    sink = InMemorySink()
+    emitter = MetricsEmitter('Test', sink=sink, flush_interval=3600, max_queue_size=5000)
+    
+    for i in range(MAX_METRICS_PER_REQUEST + 1):
+        emitter.put(f'Metric{i}', i)
+    emitter.close()
+    
+    assert [len(batch['MetricData']) for batch in sink.batches] == [MAX_METRICS_PER_REQUEST, 1]
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test that datapoints beyond the queue bound are counted as dropped."""
+    sink = InMemorySink()
+    emitter = MetricsEmitter('Test', sink=sink, flush_interval=3600, max_queue_size=2)
+    
+    for value in range(5):
+        emitter.put('Loss', value)
+    emitter.close()
+    
+    assert (emitter.sent, emitter.dropped) == (2, 3)
+
+def test_drops_from_concurrent_producers_are_all_counted():
+    """Test that the dropped counter does not lose updates from concurrent producer threads."""
+    emitter = MetricsEmitter('Test', sink=InMemorySink(), flush_interval=3600, max_queue_size=1)
+    
+    threads = [threading.Thread(target=lambda: [emitter.put('Loss', 1.0) for _ in range(1000)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    emitter.close()
+    
+    assert emitter.sent + emitter.dropped == 8000
+
+def test_sink_without_write_fails_on_creation():
+    """Test that a sink missing its write method cannot be created."""
+    class IncompleteSink(MetricSink):
+        pass
+    
+    with pytest.raises(TypeError):
+        IncompleteSink()
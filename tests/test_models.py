@@ -0,0 +1,33 @@
+import pytest
+import torch
+import torchvision
+
+from src.models.models import create_model
+
+@pytest.fixture(autouse=True)
+def no_weight_download(monkeypatch):
+    """Build ResNet18 with random weights instead of downloading pretrained ones."""
+    resnet18 = torchvision.models.resnet18
+    monkeypatch.setattr(torchvision.models, 'resnet18', lambda pretrained=False: resnet18())
+
+@pytest.mark.parametrize('model_name', ['lightweight', 'resnet18'])
+@pytest.mark.parametrize('input_channels', [3, 4])
+def test_create_model_accepts_input_channels(model_name, input_channels):
+    """Test that both architectures run end to end on RGB and RGBY input."""
+    model = create_model(model_name, num_classes=28, input_channels=input_channels).eval()
+    
+    with torch.no_grad():
+        output = model(torch.randn(2, input_channels, 64, 64))
+    
+    assert output.shape == (2, 28)
+
+def test_checkpoint_loading_skips_the_weight_download(monkeypatch):
+    """Test that pretrained=False builds ResNet18 without requesting ImageNet weights."""
+    requested = []
+    resnet18 = torchvision.models.resnet18
+    monkeypatch.setattr(torchvision.models, 'resnet18',
+                        lambda pretrained=False: requested.append(pretrained) or resnet18())
+    
+    create_model('resnet18', num_classes=28, input_channels=4, pretrained=False)
+    
+    assert requested == [False]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import torch
+from sklearn.metrics import accuracy_score, f1_score, multilabel_confusion_matrix, precision_score, recall_score
+
+from src.evaluation.metrics import MultiLabelMetrics
+
+def test_streaming_counts_match_sklearn():
+    """Test that metrics accumulated over batches equal sklearn's on the full predictions."""
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(100, 7, generator=generator)
+    targets = (torch.rand(100, 7, generator=generator) > 0.7).float()
+    targets[:, 6] = 0  # a class without support
+    
+    metrics = MultiLabelMetrics(7)
+    for i in range(0, 100, 16):
+        metrics.update(logits[i:i + 16], targets[i:i + 16])
+    scores = metrics.compute()
+    
+    y_true, y_pred = targets.numpy().astype(int), (logits > 0).numpy().astype(int)
+    assert scores['accuracy'] == pytest.approx(accuracy_score(y_true, y_pred))
+    for average in ('macro', 'micro', 'weighted'):
+        assert scores[f'f1_{average}'] == pytest.approx(f1_score(y_true, y_pred, average=average, zero_division=0))
+        assert scores[f'precision_{average}'] == pytest.approx(
+            precision_score(y_true, y_pred, average=average, zero_division=0))
+        assert scores[f'recall_{average}'] == pytest.approx(
+            recall_score(y_true, y_pred, average=average, zero_division=0))
+    np.testing.assert_array_equal(metrics.confusion_matrices(), multilabel_confusion_matrix(y_true, y_pred))
+    np.testing.assert_allclose(metrics.per_class()['f1'], f1_score(y_true, y_pred, average=None, zero_division=0))
+
+def test_class_index_targets_use_argmax():
+    """Test that single-label targets are scored like sklearn's multi-class metrics."""
+    logits = torch.tensor([[2.0, 1.0, 0.0], [0.0, 3.0, 1.0], [0.0, 1.0, 2.0], [5.0, 0.0, 0.0]])
+    labels = torch.tensor([0, 2, 2, 1])
+    
+    metrics = MultiLabelMetrics(3)
+    metrics.update(logits, labels)
+    scores = metrics.compute()
+    
+    y_pred = logits.argmax(dim=1).numpy()
+    assert scores['accuracy'] == pytest.approx(0.5)
+    assert scores['f1_weighted'] == pytest.approx(f1_score(labels.numpy(), y_pred, average='weighted'))
+    assert scores['f1_micro'] == pytest.approx(0.5)
+
+def test_reset_and_threshold():
+    """Test that the decision threshold is applied to probabilities and reset clears the counts."""
+    metrics = MultiLabelMetrics(2, threshold=0.8)
+    logits = torch.logit(torch.tensor([[0.9, 0.7]]))
+    metrics.update(logits, torch.tensor([[1.0, 1.0]]))
+    
+    assert metrics.counts.tolist() == [[1, 0], [0, 0], [0, 1]]
+    metrics.reset()
+    assert metrics.counts.sum().item() == 0 and metrics.totals.sum().item() == 0
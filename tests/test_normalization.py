@@ -0,0 +1,40 @@
+import numpy as np
+import torch
+
+from src.utils.normalization import Normalizer, RunningStats
+
+def test_running_stats_match_numpy_across_chunks():
+    """Test that streaming and merged statistics match a single numpy pass."""
+    rng = np.random.default_rng(0)
+    data = rng.normal(3.0, 2.0, size=(1000, 4)).astype(np.float32)
+    
+    streamed = RunningStats((4,), max_elements=40)
+    for i in range(0, 600, 64):
+        streamed.update(data[i:min(i + 64, 600)])
+    other = RunningStats((4,))
+    other.update(data[600:])
+    streamed.merge(other)
+    
+    assert streamed.count == 1000
+    np.testing.assert_allclose(streamed.mean, data.mean(axis=0, dtype=np.float64), rtol=1e-6)
+    np.testing.assert_allclose(streamed.var, data.var(axis=0, dtype=np.float64), rtol=1e-5)
+
+def test_normalizer_round_trip_and_uint8_folding(tmp_path):
+    """Test that a saved normalizer treats uint8 and float batches consistently."""
+    Normalizer([0.2, 0.4], [0.5, 0.25], image_size=4).save(tmp_path)
+    normalizer = Normalizer.from_file(tmp_path)
+    batch = torch.randint(0, 256, (3, 2, 4, 4), dtype=torch.uint8)
+    
+    torch.testing.assert_close(normalizer(batch), normalizer(batch.float() / 255.0))
+    assert normalizer.metadata == {'image_size': 4}
+
+def test_feature_normalizer_numpy_matches_torch():
+    """Test that per-feature statistics apply identically to HWC arrays and NCHW tensors."""
+    rng = np.random.default_rng(0)
+    normalizer = Normalizer(rng.random((2, 2, 3)), rng.random((2, 2, 3)) + 0.5, mode='feature')
+    samples = rng.random((5, 2, 2, 3)).astype(np.float32)
+    
+    expected = normalizer(torch.from_numpy(samples).permute(0, 3, 1, 2))
+    normalizer.apply_numpy(samples)
+    
+    torch.testing.assert_close(torch.from_numpy(samples).permute(0, 3, 1, 2), expected)
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import cv2
+import pytest
+import torch
+
+from src.data.sharded_dataset import ShardedDataset
+from src.utils.cache import PreprocessingCache
+from src.utils.normalization import Normalizer
+from src.utils.preprocessing import CHANNEL_COLORS, ProteinAtlasPreprocessor
+
+@pytest.fixture
+def image_paths(tmp_path):
+    """Write a handful of small synthetic images and return their paths."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(10):
+        path = tmp_path / f'img_{i}.png'
+        cv2.imwrite(str(path), rng.integers(0, 256, (20, 20, 3), dtype=np.uint8))
+        paths.append(str(path))
+    return paths
+
+def test_process_images_parallel_matches_serial(tmp_path, image_paths):
+    """Test that the process pool produces the same features as a serial run."""
+    serial = ProteinAtlasPreprocessor(str(tmp_path), image_size=8, num_workers=1, chunk_size=3)
+    parallel = ProteinAtlasPreprocessor(str(tmp_path), image_size=8, num_workers=2, chunk_size=3)
+    
+    X_serial, kept_serial = serial.process_images(image_paths)
+    X_parallel, kept_parallel = parallel.process_images(image_paths)
+    
+    assert X_parallel.shape == (10, 8 * 8 * 3)
+    assert X_parallel.dtype == np.float32
+    np.testing.assert_array_equal(kept_parallel, kept_serial)
+    np.testing.assert_array_equal(X_parallel, X_serial)
+
+def test_process_images_skips_unreadable(tmp_path, image_paths):
+    """Test that unreadable images are dropped and the kept indices track the rest."""
+    paths = image_paths[:3] + [str(tmp_path / 'missing.png')] + image_paths[3:5]
+    preprocessor = ProteinAtlasPreprocessor(str(tmp_path), image_size=8, num_workers=2, chunk_size=2)
+    
+    X, kept = preprocessor.process_images(paths)
+    
+    assert X.shape[0] == 5
+    np.testing.assert_array_equal(kept, [0, 1, 2, 4, 5])
+    expected = preprocessor.extract_features(preprocessor.preprocess_image(paths[4]))
+    np.testing.assert_array_equal(X[3], expected)
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Write a small raw dataset with a train.csv and single-file images."""
+    data_dir = tmp_path / 'raw'
+    (data_dir / 'train').mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    ids = [f'img_{i}.png' for i in range(10)]
+    for image_id in ids:
+        cv2.imwrite(str(data_dir / 'train' / image_id), rng.integers(0, 256, (20, 20, 3), dtype=np.uint8))
+    pd.DataFrame({'Id': ids, 'Target': ['0 2', '1'] * 5}).to_csv(data_dir / 'train.csv', index=False)
+    return data_dir
+
+def test_write_dataset_streams_into_shards(tmp_path, data_dir, mlflow_tracking):
+    """Test that the streaming path writes multi-hot labelled shards and their statistics."""
+    preprocessor = ProteinAtlasPreprocessor(str(data_dir), image_size=8, sample_size=1.0,
+                                            num_workers=2, chunk_size=3)
+    counts = preprocessor.write_dataset(tmp_path / 'out', num_classes=3, shard_size=4)
+    
+    assert counts == {'train': 8, 'test': 2}
+    train = ShardedDataset(tmp_path / 'out' / 'train')
+    x, y = train[0]
+    assert x.shape == (3, 8, 8)
+    assert y.tolist() in ([1.0, 0.0, 1.0], [0.0, 1.0, 0.0])
+    X = torch.stack([train[i][0] for i in range(len(train))])
+    normalized = Normalizer.from_file(tmp_path / 'out')(X)
+    np.testing.assert_allclose(normalized.mean(dim=(0, 2, 3)).numpy(), 0.0, atol=1e-4)
+
+def test_load_channels_stacks_rgby(tmp_path):
+    """Test that the four stain files are stacked in red/green/blue/yellow order."""
+    for value, color in enumerate(CHANNEL_COLORS):
+        cv2.imwrite(str(tmp_path / f'sample_{color}.png'), np.full((16, 16), value * 10, dtype=np.uint8))
+    preprocessor = ProteinAtlasPreprocessor(str(tmp_path), image_size=8, channel_layout='rgby')
+    
+    stacked = preprocessor.load_channels(str(tmp_path / 'sample'))
+    
+    assert stacked.shape == (8, 8, 4)
+    assert stacked.dtype == np.uint8
+    assert stacked[0, 0].tolist() == [0, 10, 20, 30]
+    assert preprocessor.feature_dim == 8 * 8 * 4
+    
+    (tmp_path / 'sample_yellow.png').unlink()
+    with pytest.raises(ValueError):
+        preprocessor.load_channels(str(tmp_path / 'sample'))
+
+def test_write_dataset_uint8_records_channel_statistics(tmp_path, data_dir, mlflow_tracking):
+    """Test that uint8 storage keeps raw pixels and records per-channel statistics."""
+    preprocessor = ProteinAtlasPreprocessor(str(data_dir), image_size=8, sample_size=1.0,
+                                            num_workers=1, storage_dtype='uint8')
+    preprocessor.write_dataset(tmp_path / 'out', num_classes=3)
+    
+    train = ShardedDataset(tmp_path / 'out' / 'train')
+    X = np.stack([train[i][0].numpy() for i in range(len(train))])
+    assert X.dtype == np.uint8
+    pixels = X.transpose(0, 2, 3, 1).reshape(-1, 3) / 255.0
+    normalizer = Normalizer.from_file(tmp_path / 'out')
+    np.testing.assert_allclose(normalizer.mean, pixels.mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(normalizer.std, pixels.std(axis=0), rtol=1e-6)
+    assert normalizer.metadata['storage_dtype'] == 'uint8'
+
+def test_process_images_reuses_cache(tmp_path, image_paths, monkeypatch):
+    """Test that a second run is served entirely from the cache."""
+    cache = PreprocessingCache(tmp_path / 'cache')
+    preprocessor = ProteinAtlasPreprocessor(str(tmp_path), image_size=8, num_workers=1, cache=cache)
+    X_first, _ = preprocessor.process_images(image_paths)
+    
+    def fail(image_path):
+        raise AssertionError(f"{image_path} should have been cached")
+    monkeypatch.setattr(preprocessor, '_preprocess_uncached', fail)
+    X_second, kept = preprocessor.process_images(image_paths)
+    
+    assert len(kept) == len(image_paths)
+    np.testing.assert_array_equal(X_second, X_first)
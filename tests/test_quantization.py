@@ -0,0 +1,60 @@
+import copy
+import json
+
+import numpy as np
+import pytest
+import torch
+import torchvision
+
+from src.data.sharded_dataset import ShardWriter
+from src.inference.inference import ModelInference
+from src.models.export import artifact_path
+from src.models.quantization import fuse_resnet, quantize_checkpoint
+from src.training.train import ModelTrainer
+from src.utils.normalization import Normalizer
+
+NUM_CLASSES = 5
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Write a small uint8 RGBY dataset."""
+    rng = np.random.default_rng(0)
+    for split, n in [('train', 16), ('test', 8)]:
+        with ShardWriter(tmp_path / 'data' / split, (32, 32, 4), NUM_CLASSES, dtype='uint8') as writer:
+            writer.write(rng.integers(0, 256, (n, 32, 32, 4), dtype=np.uint8),
+                         rng.integers(0, 2, (n, NUM_CLASSES), dtype=np.uint8))
+    return tmp_path / 'data'
+
+def test_resnet_fusion_preserves_outputs():
+    """Test that explicit conv/bn/relu fusion leaves an eval-mode ResNet's outputs unchanged."""
+    model = torchvision.models.resnet18(num_classes=NUM_CLASSES).eval()
+    images = torch.randn(2, 3, 64, 64)
+    with torch.no_grad():
+        expected = model(images)
+        fused = fuse_resnet(copy.deepcopy(model))
+        torch.testing.assert_close(fused(images), expected, rtol=1e-4, atol=1e-4)
+    assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules())
+
+@pytest.mark.parametrize('model_name', ['lightweight', 'resnet18'])
+def test_quantized_checkpoint_is_smaller_and_close(model_name, data_dir, tmp_path, monkeypatch):
+    """Test that INT8 quantization writes a ~4x smaller model, a report, and a loadable backend."""
+    resnet18 = torchvision.models.resnet18
+    monkeypatch.setattr(torchvision.models, 'resnet18', lambda pretrained=False: resnet18())
+    monkeypatch.setenv('MODEL_SAVE_DIR', str(tmp_path / 'models'))
+    trainer = ModelTrainer(model_name, NUM_CLASSES, device='cpu', input_channels=4)
+    trainer.set_normalizer(Normalizer([0.5] * 4, [0.25] * 4, image_size=32, storage_dtype='uint8'))
+    trainer.save_model(1, {'val_loss': 0.5})
+    checkpoint = str(trainer.best_model_path)
+    
+    report = quantize_checkpoint(checkpoint, str(data_dir), num_calibration_samples=16, batch_size=8)
+    
+    assert report['fp32_size_bytes'] / report['int8_size_bytes'] > 3
+    assert report['num_samples'] == 8
+    with open(artifact_path(checkpoint, 'int8').with_suffix('.json')) as f:
+        assert json.load(f)['accuracy_delta'] == report['accuracy_delta']
+    
+    images = np.random.default_rng(1).integers(0, 256, (4, 32, 32, 4), dtype=np.uint8)
+    _, expected = ModelInference(model_name, NUM_CLASSES, model_path=checkpoint, device='cpu').predict(images)
+    _, probabilities = ModelInference(model_name, NUM_CLASSES, model_path=checkpoint, device='cpu',
+                                      backend='int8').predict(images)
+    np.testing.assert_allclose(probabilities, expected, atol=0.1)
@@ -0,0 +1,58 @@
+import os
+import multiprocessing as mp
+
+import joblib
+import numpy as np
+import torch
+
+from src.inference.registry import ModelRegistry
+from src.training.train import ModelTrainer
+
+def test_checkpoint_is_loaded_once_into_shared_memory(tmp_path, monkeypatch):
+    """Test that repeated lookups return the same warm engine with shared CPU weights."""
+    monkeypatch.setenv('MODEL_SAVE_DIR', str(tmp_path))
+    trainer = ModelTrainer('lightweight', 5, device='cpu', input_channels=4)
+    trainer.save_model(1, {'val_loss': 0.5})
+    registry = ModelRegistry(device='cpu')
+    
+    engine = registry.get('lightweight', 5, model_path=str(trainer.best_model_path))
+    
+    assert registry.get('lightweight', 5, model_path=str(trainer.best_model_path)) is engine
+    assert len(registry) == 1
+    assert all(p.is_shared() for p in engine.model.parameters())
+    for name, value in trainer.model.state_dict().items():
+        torch.testing.assert_close(engine.model.state_dict()[name], value)
+
+def _increment_first_parameter(model):
+    with torch.no_grad():
+        next(model.parameters()).add_(1.0)
+
+def test_preloaded_weights_are_shared_with_forked_workers():
+    """Test that a forked worker writes to the same weight pages the parent reads, not a copy."""
+    registry = ModelRegistry(device='cpu')
+    registry.preload([{'model_name': 'lightweight', 'num_classes': 5, 'input_channels': 4}])
+    engine = registry.get('lightweight', 5, input_channels=4)
+    weights = next(engine.model.parameters())
+    before = weights.detach().clone()
+    
+    child = mp.get_context('fork').Process(target=_increment_first_parameter, args=(engine.model,))
+    child.start()
+    child.join()
+    
+    assert child.exitcode == 0
+    torch.testing.assert_close(weights.detach(), before + 1.0)
+
+def test_replaced_file_is_reloaded(tmp_path):
+    """Test that a file rewritten in place is loaded again, with arrays memory-mapped."""
+    path = tmp_path / 'model.joblib'
+    joblib.dump({'coef': np.arange(1000.0)}, path)
+    registry = ModelRegistry()
+    
+    first = registry.get_joblib(str(path))
+    assert registry.get_joblib(str(path)) is first
+    assert isinstance(first['coef'], np.memmap)
+    
+    joblib.dump({'coef': np.zeros(1000)}, path)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    
+    assert registry.get_joblib(str(path))['coef'].sum() == 0
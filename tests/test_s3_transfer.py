@@ -0,0 +1,66 @@
+import os
+
+import pytest
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+moto = pytest.importorskip('moto')
+
+from src.utils.s3_transfer import S3TransferManager, compute_etag, create_client, is_retryable
+
+BUCKET = 'test-bucket'
+
+@pytest.fixture
+def s3(monkeypatch):
+    """A local S3 stand-in with an empty bucket."""
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = create_client(region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+def test_directory_round_trip_skips_unchanged_files(s3, tmp_path):
+    """Test that a re-run only transfers files whose contents changed."""
+    source = tmp_path / 'source'
+    (source / 'train').mkdir(parents=True)
+    for i in range(20):
+        (source / 'train' / f'{i}.png').write_bytes(os.urandom(100 + i))
+    (source / 'train_subset.csv').write_text('Id,Target\n')
+    
+    with S3TransferManager(s3) as transfer:
+        assert transfer.upload_directory(str(source), BUCKET, 'hpa') == {'transferred': 21, 'failed': 0, 'skipped': 0}
+        
+        (source / 'train' / '3.png').write_bytes(b'changed')
+        assert transfer.upload_directory(str(source), BUCKET, 'hpa') == {'transferred': 1, 'failed': 0, 'skipped': 20}
+        
+        target = tmp_path / 'target'
+        assert transfer.download_prefix(BUCKET, 'hpa', str(target))['transferred'] == 21
+        assert transfer.download_prefix(BUCKET, 'hpa', str(target)) == {'transferred': 0, 'failed': 0, 'skipped': 21}
+    
+    assert (target / 'train' / '3.png').read_bytes() == b'changed'
+    assert (target / 'train_subset.csv').read_text() == 'Id,Target\n'
+
+def test_multipart_etag_matches_s3(s3, tmp_path):
+    """Test that the local ETag of a multipart upload matches the object's ETag."""
+    config = TransferConfig(multipart_threshold=5 * 1024 ** 2, multipart_chunksize=5 * 1024 ** 2)
+    path = tmp_path / 'image.tar'
+    path.write_bytes(os.urandom(11 * 1024 ** 2))
+    
+    with S3TransferManager(s3, config=config) as transfer:
+        assert transfer.upload_file(str(path), BUCKET, 'docker/image.tar')
+        etag = s3.head_object(Bucket=BUCKET, Key='docker/image.tar')['ETag'].strip('"')
+        assert compute_etag(str(path), config) == etag
+        assert etag.endswith('-3')
+        assert transfer.is_unchanged(str(path), transfer.list_objects(BUCKET, 'docker')['docker/image.tar'])
+
+def test_only_transient_errors_are_retried():
+    """Test that throttling is retried while permission errors fail fast."""
+    def error(code):
+        return ClientError({'Error': {'Code': code, 'Message': ''}}, 'PutObject')
+    
+    assert is_retryable(error('SlowDown'))
+    assert is_retryable(error('503'))
+    assert not is_retryable(error('AccessDenied'))
+    assert not is_retryable(ValueError())
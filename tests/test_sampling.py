@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.data.sampling import compute_sample_weights, make_balanced_sampler
+
+def test_sample_weights_follow_rarest_label():
+    """Test that each sample is weighted by the inverse frequency of its rarest label."""
+    labels = np.array([[1, 0, 0],
+                       [1, 0, 0],
+                       [1, 0, 0],
+                       [1, 1, 0],
+                       [0, 0, 0]], dtype=np.uint8)
+    
+    weights = compute_sample_weights(labels)
+    
+    np.testing.assert_allclose(weights, [5 / 4, 5 / 4, 5 / 4, 5 / 1, 5 / 4])
+
+def test_balanced_sampler_oversamples_rare_classes():
+    """Test that a rare class is drawn far more often than its base rate."""
+    labels = np.zeros((1000, 2), dtype=np.uint8)
+    labels[:990, 0] = 1
+    labels[990:, 1] = 1
+    
+    indices = np.fromiter(make_balanced_sampler(labels, seed=0), dtype=np.int64)
+    
+    assert len(indices) == 1000
+    assert 0.4 < (indices >= 990).mean() < 0.6
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import json
+import multiprocessing as mp
+import os
+import signal
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from src.inference.inference import ModelInference
+from src.inference.server import DynamicBatcher, InferenceServer, serve_prefork
+
+NUM_CLASSES = 5
+
+@pytest.fixture
+def engine():
+    return ModelInference('lightweight', NUM_CLASSES, device='cpu', image_size=16)
+
+def test_concurrent_requests_share_forward_passes(engine):
+    """Test that concurrent requests are batched and get their own results back."""
+    images = np.random.default_rng(0).integers(0, 256, (8, 16, 16, 4), dtype=np.uint8)
+    batcher = DynamicBatcher(engine, max_batch_size=4, max_wait_ms=50)
+    
+    async def run():
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(image) for image in images))
+        finally:
+            await batcher.stop()
+    results = asyncio.run(run())
+    
+    _, expected = engine.predict(images)
+    np.testing.assert_allclose(np.concatenate(results), expected, rtol=1e-5, atol=1e-6)
+    assert batcher.stats.batches == 2
+    assert batcher.stats.summary()['p99_latency_ms'] > 0
+
+def test_malformed_request_fails_alone(engine):
+    """Test that a bad request in a micro-batch does not fail the requests batched with it."""
+    rng = np.random.default_rng(0)
+    good = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+    requests = [
+        good,
+        rng.integers(0, 256, (16, 16, 7), dtype=np.uint8),  # too many channels
+        good.astype(np.float64) / 255.0,                     # valid, but a different dtype
+        np.zeros((1, 1, 16, 16, 4), dtype=np.uint8),         # not an image or a batch
+        good
+    ]
+    batcher = DynamicBatcher(engine, max_batch_size=8, max_wait_ms=50)
+    
+    async def run():
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(images) for images in requests),
+                                        return_exceptions=True)
+        finally:
+            await batcher.stop()
+    results = asyncio.run(run())
+    
+    assert isinstance(results[1], ValueError) and isinstance(results[3], ValueError)
+    _, expected = engine.predict(good)
+    for i in (0, 2, 4):
+        np.testing.assert_allclose(results[i], expected, rtol=1e-5, atol=1e-6)
+    assert batcher.stats.batches == 1
+
+def test_predict_endpoint_round_trip(engine):
+    """Test that the HTTP endpoint accepts a serialized image and returns probabilities."""
+    image = np.random.default_rng(0).integers(0, 256, (16, 16, 4), dtype=np.uint8)
+    buffer = io.BytesIO()
+    np.save(buffer, image)
+    body = buffer.getvalue()
+    server = InferenceServer(DynamicBatcher(engine, max_wait_ms=1), host='127.0.0.1', port=0)
+    
+    async def request(raw: bytes) -> dict:
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return json.loads(response.split(b'\r\n\r\n', 1)[1])
+    
+    async def run():
+        await server.start()
+        try:
+            prediction = await request(b'POST /predict HTTP/1.1\r\n'
+                                       + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            stats = await request(b'GET /stats HTTP/1.1\r\n\r\n')
+            return prediction, stats
+        finally:
+            await server.stop()
+    prediction, stats = asyncio.run(run())
+    
+    _, expected = engine.predict(image)
+    np.testing.assert_allclose(prediction['probabilities'], expected, rtol=1e-5, atol=1e-6)
+    assert stats['requests'] == 1
+
+def _get(port: int, path: str) -> dict:
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+        sock.sendall(f'GET {path} HTTP/1.1\r\n\r\n'.encode())
+        response = b''
+        while chunk := sock.recv(65536):
+            response += chunk
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+def test_prefork_workers_serve_from_one_socket(engine):
+    """Test that pre-forked workers accept on the shared socket and stop with the parent."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    parent = mp.get_context('fork').Process(target=serve_prefork, args=(engine, 2),
+                                            kwargs={'host': '127.0.0.1', 'port': port, 'max_wait_ms': 1})
+    parent.start()
+    try:
+        for _ in range(100):
+            try:
+                assert _get(port, '/health') == {'status': 'ok'}
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("Pre-fork server did not start")
+        assert _get(port, '/info')['model_name'] == 'lightweight'
+    finally:
+        os.kill(parent.pid, signal.SIGTERM)
+        parent.join(10)
+    assert parent.exitcode == 0
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import torch
+
+from src.data.sharded_dataset import ShardWriter, ShardedDataset, is_sharded_dataset, read_index
+
+def write_split(split_dir, n, shard_size=4, batch=3):
+    """Write n deterministic samples and return them for comparison."""
+    samples = np.arange(n * 2 * 2 * 3, dtype=np.float32).reshape(n, 2, 2, 3)
+    labels = (np.arange(n * 5).reshape(n, 5) % 2).astype(np.uint8)
+    with ShardWriter(split_dir, (2, 2, 3), num_classes=5, shard_size=shard_size) as writer:
+        for i in range(0, n, batch):
+            writer.write(samples[i:i + batch], labels[i:i + batch])
+    return samples, labels
+
+def test_shard_writer_round_trip(tmp_path):
+    """Test that samples written across shard boundaries read back unchanged."""
+    samples, labels = write_split(tmp_path / 'train', n=10)
+    
+    index = read_index(tmp_path / 'train')
+    assert [shard['num_samples'] for shard in index['shards']] == [4, 4, 2]
+    assert np.load(tmp_path / 'train' / index['shards'][-1]['x']).shape == (2, 2, 2, 3)
+    
+    dataset = ShardedDataset(tmp_path / 'train')
+    assert len(dataset) == 10
+    for i in range(10):
+        x, y = dataset[i]
+        assert x.shape == (3, 2, 2)
+        torch.testing.assert_close(x, torch.from_numpy(samples[i]).permute(2, 0, 1))
+        torch.testing.assert_close(y, torch.from_numpy(labels[i]).float())
+    np.testing.assert_array_equal(dataset.labels(), labels)
+
+def test_sharded_dataset_in_dataloader(tmp_path):
+    """Test that the dataset works with multi-process data loading."""
+    samples, _ = write_split(tmp_path / 'train', n=7)
+    dataset = ShardedDataset(tmp_path / 'train')
+    loader = torch.utils.data.DataLoader(dataset, batch_size=4, num_workers=2)
+    
+    batches = [x for x, _ in loader]
+    
+    assert [len(x) for x in batches] == [4, 3]
+    torch.testing.assert_close(torch.cat(batches), torch.from_numpy(samples).permute(0, 3, 1, 2))
+
+def test_shard_writer_rejects_wrong_shape(tmp_path):
+    """Test that samples of the wrong shape are rejected."""
+    writer = ShardWriter(tmp_path, (2, 2, 3), num_classes=5)
+    with pytest.raises(ValueError):
+        writer.write(np.zeros((1, 2, 2, 4), dtype=np.float32), np.zeros((1, 5), dtype=np.uint8))
+    assert not is_sharded_dataset(tmp_path)
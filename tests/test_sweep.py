@@ -0,0 +1,147 @@
+import json
+import math
+import os
+import queue
+import mlflow
+import numpy as np
+import pytest
+
+import src.training.sweep as sweep
+from src.data.sharded_dataset import ShardWriter
+from src.training.checkpoint import CheckpointManager, PreemptionHandler
+from src.training.sweep import (SuccessiveHalvingSweep, _init_worker, _worker_devices, result_path, rung_budgets,
+                                run_trial, sample_configs)
+
+class FakeExecutor:
+    """Score trials by a 'quality' config value that grows with the epoch budget."""
+
+    def __init__(self):
+        self.rungs = []
+
+    def run(self, tasks, rung_dir):
+        self.rungs.append([(task['trial_id'], task['num_epochs']) for task in tasks])
+        results = []
+        for task in tasks:
+            previous = max([0] + [epochs for rung in self.rungs[:-1] for trial_id, epochs in rung
+                                  if trial_id == task['trial_id']])
+            history = [{'epoch': epoch, 'val_f1_macro': task['config']['quality'] * epoch}
+                       for epoch in range(previous + 1, task['num_epochs'] + 1)]
+            results.append({'trial_id': task['trial_id'], 'num_epochs': task['num_epochs'],
+                            'history': history, 'score': history[-1]['val_f1_macro']})
+        return results
+
+def test_sample_configs_draws_choices_and_log_uniform_ranges():
+    """Test that sampling is reproducible and respects the search space."""
+    space = {'model_name': ['lightweight', 'resnet18'], 'learning_rate': ('log', 1e-4, 1e-2)}
+
+    configs = sample_configs(space, num_trials=50, seed=1)
+
+    assert configs == sample_configs(space, num_trials=50, seed=1)
+    assert {c['model_name'] for c in configs} == {'lightweight', 'resnet18'}
+    assert all(1e-4 <= c['learning_rate'] <= 1e-2 for c in configs)
+    # Log-uniform: roughly half the draws fall below the geometric midpoint
+    assert 15 < sum(c['learning_rate'] < 1e-3 for c in configs) < 35
+    with pytest.raises(ValueError):
+        sample_configs({'learning_rate': (1e-4, 1e-2)}, num_trials=1)
+
+def test_rung_budgets_grow_by_eta_up_to_the_maximum():
+    assert rung_budgets(1, 9, 3) == [1, 3, 9]
+    assert rung_budgets(1, 10, 3) == [1, 3, 9, 10]
+    assert rung_budgets(2, 2, 3) == [2]
+
+def test_local_workers_get_their_own_gpus(monkeypatch):
+    """Test that workers are spread round-robin over the visible GPUs and pin the one they take."""
+    monkeypatch.setattr(sweep.torch.cuda, 'device_count', lambda: 2)
+    monkeypatch.setenv('CUDA_VISIBLE_DEVICES', '4,6')
+    assert _worker_devices(3) == ['4', '6', '4']
+
+    monkeypatch.setattr(sweep.torch, 'set_num_threads', lambda num_threads: None)
+    devices = queue.Queue()
+    devices.put('6')
+    _init_worker(1, devices)
+    assert os.environ['CUDA_VISIBLE_DEVICES'] == '6'
+
+    monkeypatch.setattr(sweep.torch.cuda, 'device_count', lambda: 0)
+    assert _worker_devices(3) is None
+
+def test_successive_halving_promotes_the_best_trials(mlflow_tracking, tmp_path):
+    """Test that each rung keeps the best 1/eta of the trials and logs one parent run."""
+    configs = [{'quality': q} for q in [0.1, 0.9, 0.5, 0.3, 0.8, 0.2, 0.7, 0.4, 0.6]]
+    executor = FakeExecutor()
+
+    leaderboard = SuccessiveHalvingSweep('unused', configs, sweep_dir=str(tmp_path / 'sweep'),
+                                         min_epochs=1, max_epochs=9, eta=3, executor=executor).run()
+
+    assert [sorted(trial_id for trial_id, _ in rung) for rung in executor.rungs] == [list(range(9)), [1, 4, 6], [1]]
+    assert leaderboard[0]['trial_id'] == 1 and leaderboard[0]['num_epochs'] == 9
+    assert math.isclose(leaderboard[0]['score'], 0.9 * 9)
+    assert json.loads((tmp_path / 'sweep' / 'leaderboard.json').read_text())[0]['trial_id'] == 1
+
+    runs = mlflow.search_runs(search_all_experiments=True)
+    parent = runs[runs['tags.mlflow.parentRunId'].isna()]
+    children = runs[runs['tags.mlflow.parentRunId'].notna()]
+    assert len(parent) == 1 and len(children) == 9
+    assert parent['metrics.best_trial'].iloc[0] == 1
+    # 9 trials x 1 epoch + 3 x 2 more + 1 x 6 more, instead of 9 x 9
+    assert parent['metrics.epochs_trained'].iloc[0] == 21
+    assert set(children['status']) == {'FINISHED', 'KILLED'}
+
+def test_interrupted_sweep_reuses_finished_rungs(mlflow_tracking, tmp_path):
+    """Test that trials with a result for a budget are not dispatched again."""
+    sweep_dir = tmp_path / 'sweep'
+    configs = [{'quality': 0.5}, {'quality': 0.7}]
+    path = result_path(str(sweep_dir / 'trial_0000'), 1)
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({'trial_id': 0, 'num_epochs': 1, 'history': [], 'score': 0.5}))
+    executor = FakeExecutor()
+
+    SuccessiveHalvingSweep('unused', configs, sweep_dir=str(sweep_dir), min_epochs=1, max_epochs=2,
+                           eta=2, executor=executor).run()
+
+    assert executor.rungs == [[(1, 1)], [(1, 2)]]
+
+class RequestedPreemption(PreemptionHandler):
+    """A preemption requested before the first step."""
+
+    def __enter__(self):
+        self.request()
+        return super().__enter__()
+
+def make_trial_task(tmp_path):
+    """A lightweight-model trial on 2 train batches of random samples."""
+    rng = np.random.default_rng(0)
+    data_dir = tmp_path / 'data'
+    for split, n in [('train', 8), ('test', 4)]:
+        with ShardWriter(data_dir / split, (16, 16, 4), 5, shard_size=4) as writer:
+            writer.write(rng.random((n, 16, 16, 4), dtype=np.float32),
+                         rng.integers(0, 2, (n, 5), dtype=np.uint8))
+    return {'trial_id': 0, 'config': {'model_name': 'lightweight', 'batch_size': 4}, 'num_epochs': 1,
+            'data_dir': str(data_dir), 'trial_dir': str(tmp_path / 'trial_0000'), 'metric': 'val_f1_macro',
+            'trainer_kwargs': {'num_classes': 5, 'input_channels': 4, 'device': 'cpu'}}
+
+def test_promoted_trial_resumes_from_its_checkpoint(tmp_path):
+    """Test that training to a larger budget continues after the last trained epoch."""
+    task = make_trial_task(tmp_path)
+
+    first = run_trial(task)
+    second = run_trial({**task, 'num_epochs': 3})
+
+    assert [entry['epoch'] for entry in first['history']] == [1]
+    assert [entry['epoch'] for entry in second['history']] == [2, 3]
+    assert result_path(task['trial_dir'], 3).exists()
+
+def test_preempted_trial_resumes_mid_epoch(tmp_path, monkeypatch):
+    """Test that a preempted trial writes no result and its rerun trains only the remaining batch."""
+    task = make_trial_task(tmp_path)
+    monkeypatch.setattr(sweep, 'PreemptionHandler', RequestedPreemption)
+
+    assert run_trial(task) is None
+    assert not result_path(task['trial_dir'], 1).exists()
+    assert CheckpointManager(task['trial_dir']).load_latest()['batch_in_epoch'] == 1
+
+    monkeypatch.undo()
+    result = run_trial(task)
+
+    assert [entry['epoch'] for entry in result['history']] == [1]
+    # 2 batches in the epoch: one before the preemption, one after the resume
+    assert CheckpointManager(task['trial_dir']).load_latest()['global_step'] == 2
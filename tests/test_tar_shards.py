@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from src.data.tar_shards import TarShardDataset, is_tar_dataset, load_tar_normalizer, pack_dataset
+from src.utils.preprocessing import CHANNEL_COLORS, ProteinAtlasPreprocessor
+
+def make_raw_dataset(data_dir, n=24, size=16):
+    """Write n HPA-style samples whose pixels encode the sample number."""
+    (data_dir / 'train').mkdir(parents=True)
+    for i in range(n):
+        for channel, color in enumerate(CHANNEL_COLORS):
+            cv2.imwrite(str(data_dir / 'train' / f'id{i:03d}_{color}.png'),
+                        np.full((size, size), i * 4 + channel, dtype=np.uint8))
+    pd.DataFrame({'Id': [f'id{i:03d}' for i in range(n)],
+                  'Target': [f'{i % 5} {i % 3 + 5}' for i in range(n)]}).to_csv(data_dir / 'train.csv', index=False)
+
+def sample_ids(samples):
+    """Recover the sample numbers from the decoded red channels."""
+    return sorted(int(x[0, 0, 0]) // 4 for x, _ in samples)
+
+@pytest.fixture
+def packed(tmp_path):
+    make_raw_dataset(tmp_path / 'raw')
+    counts = pack_dataset(str(tmp_path / 'raw'), str(tmp_path / 'shards'), num_classes=8,
+                          max_shard_bytes=4096, test_size=0.25, image_size=8)
+    return tmp_path / 'shards', counts
+
+def test_pack_round_trip(packed):
+    """Test that every sample is packed once with its channels and labels."""
+    shards_dir, counts = packed
+    assert counts == {'train': 18, 'test': 6}
+    assert is_tar_dataset(shards_dir / 'train')
+    
+    dataset = TarShardDataset(str(shards_dir / 'train'), image_size=8, shuffle=False)
+    assert len(dataset.index['shards']) > 1
+    assert len(dataset) == 18
+    
+    samples = list(dataset)
+    test_samples = list(TarShardDataset(str(shards_dir / 'test'), image_size=8, shuffle=False))
+    assert sample_ids(samples + test_samples) == list(range(24))
+    for x, y in samples:
+        i = int(x[0, 0, 0]) // 4
+        assert x.shape == (4, 8, 8) and x.dtype == torch.uint8
+        assert x[:, 0, 0].tolist() == [i * 4 + c for c in range(4)]
+        assert y.nonzero().flatten().tolist() == [i % 5, i % 3 + 5]
+
+def test_pack_saves_train_normalization(packed):
+    """Test that packing saves per-channel statistics of the train split in [0, 1] pixel units."""
+    shards_dir, _ = packed
+    pixels = np.stack([x.numpy() for x, _ in TarShardDataset(str(shards_dir / 'train'), image_size=8, shuffle=False)])
+    
+    normalizer = load_tar_normalizer(str(shards_dir))
+    
+    assert normalizer.mode == 'channel' and normalizer.metadata['image_size'] == 8
+    np.testing.assert_allclose(normalizer.mean.flatten(), pixels.mean(axis=(0, 2, 3)) / 255.0, rtol=1e-5)
+    np.testing.assert_allclose(normalizer.std.flatten(), pixels.std(axis=(0, 2, 3)) / 255.0, rtol=1e-5)
+
+def test_decode_resizes_like_the_preprocessor(tmp_path):
+    """Test that streamed samples match the preprocessor's images pixel for pixel."""
+    rng = np.random.default_rng(0)
+    (tmp_path / 'raw' / 'train').mkdir(parents=True)
+    for color in CHANNEL_COLORS:
+        cv2.imwrite(str(tmp_path / 'raw' / 'train' / f'id000_{color}.png'),
+                    rng.integers(0, 256, (37, 37), dtype=np.uint8))
+    pd.DataFrame({'Id': ['id000', 'id001'], 'Target': ['0', '1']}).to_csv(tmp_path / 'raw' / 'train.csv', index=False)
+    for color in CHANNEL_COLORS:
+        (tmp_path / 'raw' / 'train' / f'id001_{color}.png').write_bytes(
+            (tmp_path / 'raw' / 'train' / f'id000_{color}.png').read_bytes())
+    pack_dataset(str(tmp_path / 'raw'), str(tmp_path / 'shards'), num_classes=2, test_size=0.5, image_size=16)
+    
+    streamed = [x.numpy() for split in ('train', 'test')
+                for x, _ in TarShardDataset(str(tmp_path / 'shards' / split), image_size=16, shuffle=False)]
+    expected = ProteinAtlasPreprocessor(str(tmp_path / 'raw'), image_size=16, channel_layout='rgby').load_channels(
+        str(tmp_path / 'raw' / 'train' / 'id000'))
+    
+    for image in streamed:
+        np.testing.assert_array_equal(image.transpose(1, 2, 0), expected)
+
+def test_epochs_reshuffle_reproducibly(packed):
+    """Test that the order changes between epochs but not between runs of the same epoch."""
+    dataset = TarShardDataset(str(packed[0] / 'train'), image_size=8, shuffle_buffer=4)
+    
+    orders = []
+    for epoch in (1, 1, 2):
+        dataset.set_epoch(epoch)
+        orders.append([int(x[0, 0, 0]) for x, _ in dataset])
+    
+    assert orders[0] == orders[1]
+    assert orders[0] != orders[2]
+    assert sorted(orders[0]) == sorted(orders[2])
+
+def test_workers_and_replicas_split_the_shards(packed):
+    """Test that loader workers cover the split once and replicas get equal, disjoint shares."""
+    train_dir = str(packed[0] / 'train')
+    loader = torch.utils.data.DataLoader(TarShardDataset(train_dir, image_size=8), batch_size=4, num_workers=2)
+    assert sample_ids((x, None) for batch, _ in loader for x in batch) == sample_ids(
+        TarShardDataset(train_dir, image_size=8, shuffle=False))
+    
+    replicas = [list(TarShardDataset(train_dir, image_size=8, rank=rank, world_size=2)) for rank in range(2)]
+    assert len(replicas[0]) == len(replicas[1]) > 0
+    assert not set(sample_ids(replicas[0])) & set(sample_ids(replicas[1]))
+
+def test_length_counts_the_samples_of_every_loader_worker(packed):
+    """Test that len() of a replica matches what its loader workers yield together."""
+    train_dir = str(packed[0] / 'train')
+    for num_workers in (1, 2):
+        dataset = TarShardDataset(train_dir, image_size=8, rank=1, world_size=2, num_workers=num_workers)
+        loader = torch.utils.data.DataLoader(dataset, batch_size=1, num_workers=num_workers)
+        assert sum(1 for _ in loader) == len(dataset) > 0
+    
+    with pytest.raises(ValueError):
+        list(torch.utils.data.DataLoader(TarShardDataset(train_dir, image_size=8, rank=0, world_size=2),
+                                         num_workers=2))
+
+def test_resume_skips_trained_batches(packed):
+    """Test that a resumed loader yields exactly the batches not yet trained."""
+    dataset = TarShardDataset(str(packed[0] / 'train'), image_size=8, shuffle_buffer=4)
+    dataset.set_epoch(3)
+    
+    full = [batch for batch, _ in torch.utils.data.DataLoader(dataset, batch_size=4, num_workers=2)]
+    resumed = [batch for batch, _ in torch.utils.data.DataLoader(dataset.resume(3, 4), batch_size=4, num_workers=2)]
+    
+    assert len(resumed) == len(full) - 3
+    for a, b in zip(resumed, full[3:]):
+        torch.testing.assert_close(a, b)
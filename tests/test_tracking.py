@@ -0,0 +1,36 @@
+import mlflow
+from mlflow.tracking import MlflowClient
+
+from src.utils.tracking import BufferedMLflowLogger
+
+def test_metrics_are_batched_into_one_run(mlflow_tracking):
+    """Test that all logged steps land in a single, finished run."""
+    with BufferedMLflowLogger(run_name='inference', flush_interval=3600) as tracker:
+        tracker.log_params({'model_type': 'lightweight'})
+        for step in range(3):
+            tracker.log_metrics({'inference_time': 0.1 * step, 'batch_size': 8}, step=step)
+        assert tracker.run_id is None
+    
+    client = MlflowClient()
+    run = client.get_run(tracker.run_id)
+    assert run.info.status == 'FINISHED'
+    assert run.data.params == {'model_type': 'lightweight'}
+    history = client.get_metric_history(tracker.run_id, 'inference_time')
+    assert [m.step for m in history] == [0, 1, 2]
+
+def test_logs_to_the_active_run_without_ending_it(mlflow_tracking):
+    """Test that an active fluent run is reused and left open."""
+    with mlflow.start_run() as run:
+        with BufferedMLflowLogger(flush_interval=3600) as tracker:
+            tracker.log_metric('loss', 0.5)
+        
+        assert tracker.run_id == run.info.run_id
+        assert mlflow.active_run().info.status == 'RUNNING'
+        assert MlflowClient().get_run(run.info.run_id).data.metrics == {'loss': 0.5}
+
+def test_disabled_logger_is_a_no_op(mlflow_tracking):
+    """Test that a disabled logger creates no run."""
+    with BufferedMLflowLogger(run_name='inference', enabled=False) as tracker:
+        tracker.log_metric('loss', 0.5)
+    
+    assert not mlflow_tracking.exists() or not MlflowClient().search_runs(['0'])
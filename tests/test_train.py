@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+import torch
+import torchvision
+
+from src.data.sharded_dataset import ShardWriter
+from src.inference.inference import ModelInference
+from src.training.train import ModelTrainer
+from src.utils.normalization import Normalizer
+
+NUM_CLASSES = 5
+
+@pytest.fixture
+def uint8_dataset(tmp_path):
+    """Write a small uint8 RGBY dataset with per-channel normalization statistics."""
+    rng = np.random.default_rng(0)
+    for split, n in [('train', 12), ('test', 6)]:
+        with ShardWriter(tmp_path / split, (16, 16, 4), NUM_CLASSES, dtype='uint8', shard_size=5) as writer:
+            writer.write(rng.integers(0, 256, (n, 16, 16, 4), dtype=np.uint8),
+                         rng.integers(0, 2, (n, NUM_CLASSES), dtype=np.uint8))
+    Normalizer([0.1, 0.2, 0.3, 0.4], [0.5, 0.5, 0.25, 0.25],
+               image_size=16, storage_dtype='uint8').save(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def trainer():
+    return ModelTrainer('lightweight', NUM_CLASSES, batch_size=4, device='cpu', input_channels=4)
+
+def test_uint8_batches_are_normalized_on_the_fly(trainer, uint8_dataset):
+    """Test that uint8 batches are converted and normalized per channel."""
+    train_loader, _ = trainer.load_data(str(uint8_dataset))
+    data, target = next(iter(train_loader))
+    assert data.dtype == torch.uint8
+    
+    normalized, _ = trainer._prepare_batch(data, target)
+    
+    mean = torch.tensor([0.1, 0.2, 0.3, 0.4]).view(1, 4, 1, 1)
+    std = torch.tensor([0.5, 0.5, 0.25, 0.25]).view(1, 4, 1, 1)
+    torch.testing.assert_close(normalized, (data.float() / 255.0 - mean) / std)
+
+def test_train_epoch_on_sharded_uint8_dataset(trainer, uint8_dataset):
+    """Test that a full epoch runs on the sharded uint8 dataset."""
+    train_loader, _ = trainer.load_data(str(uint8_dataset))
+    
+    metrics = trainer.train_epoch(train_loader)
+    
+    assert np.isfinite(metrics['train_loss'])
+
+def test_class_balancing_uses_weighted_sampler(uint8_dataset):
+    """Test that class balancing swaps shuffling for a weighted sampler."""
+    trainer = ModelTrainer('lightweight', NUM_CLASSES, batch_size=4, device='cpu',
+                           input_channels=4, class_balancing=True)
+    
+    train_loader, _ = trainer.load_data(str(uint8_dataset))
+    
+    assert isinstance(train_loader.sampler, torch.utils.data.WeightedRandomSampler)
+    assert len(train_loader.sampler) == 12
+
+def test_inference_reproduces_training_normalization(trainer, uint8_dataset, tmp_path, monkeypatch):
+    """Test that a saved checkpoint carries the normalization used in training."""
+    monkeypatch.setenv('MODEL_SAVE_DIR', str(tmp_path / 'models'))
+    train_loader, _ = trainer.load_data(str(uint8_dataset))
+    trainer.save_model(1, {'val_loss': 0.5})
+    data, target = next(iter(train_loader))
+    
+    inference = ModelInference('lightweight', NUM_CLASSES, model_path=str(trainer.best_model_path), device='cpu')
+    _, probabilities = inference.predict(data.permute(0, 2, 3, 1).numpy())
+    
+    trainer.model.eval()
+    with torch.no_grad():
+        expected = torch.sigmoid(trainer.model(trainer._prepare_batch(data, target)[0]))
+    np.testing.assert_allclose(probabilities, expected.numpy(), rtol=1e-5, atol=1e-6)
+
+@pytest.mark.parametrize('model_name', ['lightweight', 'resnet18'])
+def test_mixed_precision_channels_last_epoch(model_name, uint8_dataset, monkeypatch):
+    """Test that a bf16 autocast, channels_last epoch runs and reports throughput on CPU."""
+    resnet18 = torchvision.models.resnet18
+    monkeypatch.setattr(torchvision.models, 'resnet18', lambda pretrained=False: resnet18())
+    trainer = ModelTrainer(model_name, NUM_CLASSES, batch_size=4, device='cpu', input_channels=4,
+                           mixed_precision=True, channels_last=True)
+    train_loader, _ = trainer.load_data(str(uint8_dataset))
+    
+    data, _ = trainer._prepare_batch(*next(iter(train_loader)))
+    assert data.is_contiguous(memory_format=torch.channels_last)
+    assert not trainer.scaler.is_enabled()
+    
+    metrics = trainer.train_epoch(train_loader)
+    
+    assert np.isfinite(metrics['train_loss'])
+    assert metrics['train_samples_per_sec'] > 0
+    assert all(p.dtype == torch.float32 for p in trainer.model.parameters())
+
+def test_validate_accumulates_exact_match_accuracy(trainer, uint8_dataset):
+    """Test that on-device accumulation matches a per-batch host computation."""
+    _, val_loader = trainer.load_data(str(uint8_dataset))
+    
+    metrics = trainer.validate(val_loader)
+    
+    losses, correct = [], 0
+    with torch.no_grad():
+        for data, target in val_loader:
+            data, target = trainer._prepare_batch(data, target)
+            output = trainer.model(data)
+            losses.append(trainer.criterion(output, target).item())
+            correct += ((output > 0.0).float() == target).all(dim=1).sum().item()
+    assert metrics['val_loss'] == pytest.approx(np.mean(losses), rel=1e-5)
+    assert metrics['val_acc'] == pytest.approx(100. * correct / 6)